@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""Benchmarks of the abstraction pipeline.
+
+Random systems and partitions are generated for increasing:
+
+  - state dimension (2 to 6)
+  - number of propositions
+  - grid points per axis
+  - number of PWA subsystems and switching modes
+  - horizon C{N} and C{trans_length}
+
+and the time and memory of C{prop2part}, C{add_grid},
+C{pwa_partition}, C{discretize}, C{discretize_switched}
+and C{get_input} are measured.
+
+Usage::
+
+    python abstraction.py run --quick -o base.json
+    # change code, then
+    python abstraction.py run --quick -o new.json
+    python abstraction.py compare base.json new.json
+    python abstraction.py plot new.json
+
+See C{harness.py} for all options.
+"""
+import functools
+import itertools
+import logging
+
+import numpy as np
+import polytope as pc
+from tulip import abstract, hybrid
+
+from harness import main
+
+
+logging.basicConfig(level=logging.WARNING)
+# each side of the state space
+SIZE = 10.0
+
+
+def box(n, l=0.0, u=SIZE):
+    return pc.box2poly(n * [[l, u]])
+
+
+def random_lti(n, seed, domain=None):
+    """Return LTI system in C{n} dimensions, with C{n} inputs.
+
+    Dynamics are close to integrators,
+    so that cells have transitions to their neighbors.
+    """
+    rng = np.random.RandomState(seed)
+    if domain is None:
+        domain = box(n)
+    A = np.eye(n) + 0.02 * rng.randn(n, n)
+    B = np.eye(n) + 0.1 * rng.randn(n, n)
+    U = box(n, -1.0, 1.0)
+    return hybrid.LtiSysDyn(A, B, Uset=U, domain=domain)
+
+
+def random_pwa(n, num_subsys, seed):
+    """Return PWA system with subsystems on slabs along the first axis."""
+    dom = box(n)
+    w = SIZE / num_subsys
+    subsystems = list()
+    for i in xrange(num_subsys):
+        bounds = [[i * w, (i + 1) * w]] + (n - 1) * [[0.0, SIZE]]
+        subsystems.append(
+            random_lti(n, seed + i, domain=pc.box2poly(bounds)))
+    return hybrid.PwaSysDyn(subsystems, dom)
+
+
+def random_props(n, num_props, seed):
+    """Return C{dict} of random boxes in the state space."""
+    rng = np.random.RandomState(seed)
+    props = dict()
+    for i in xrange(num_props):
+        l = rng.uniform(0.0, 0.8 * SIZE, n)
+        u = np.minimum(l + rng.uniform(0.1, 0.4, n) * SIZE, SIZE)
+        props['p' + str(i)] = pc.box2poly(zip(l, u))
+    return props
+
+
+def random_partition(n, num_props, grid=None, seed=0):
+    ppp = abstract.prop2part(box(n), random_props(n, num_props, seed))
+    if grid is not None:
+        ppp = abstract.add_grid(ppp, num_grid_pnts=grid)
+    return ppp
+
+
+def min_cell_volume(n, grid=3):
+    """Return half the volume of a grid cell.
+
+    Smaller volumes allow much finer refinement,
+    which dominates the time of C{discretize}.
+    """
+    return 0.5 * (SIZE / grid) ** n
+
+
+def random_switched(n, num_modes, seed):
+    """Return switched system with C{num_modes} environment modes."""
+    env_modes = tuple('e' + str(i) for i in xrange(num_modes))
+    dynamics = dict(
+        ((e, 'fly'), random_pwa(n, 2, seed + 10 * i))
+        for i, e in enumerate(env_modes))
+    return hybrid.SwitchedSysDyn(
+        disc_domain_size=(num_modes, 1),
+        dynamics=dynamics,
+        env_labels=env_modes,
+        disc_sys_labels=('fly', ),
+        cts_ss=box(n))
+
+
+def _cases(bench, x, grid, setup, run):
+    """Yield a case for each parameter combination in C{grid}."""
+    keys = sorted(grid)
+    for values in itertools.product(*[grid[k] for k in keys]):
+        params = dict(zip(keys, values))
+        if not _feasible(params):
+            continue
+        yield dict(
+            bench=bench, params=params, x=x,
+            setup=functools.partial(setup, **params), run=run)
+
+
+def _feasible(params):
+    """Skip cases that take too long.
+
+    The number of cells grows exponentially
+    with the number of propositions and grid dimension.
+    """
+    n = params['n']
+    grid = params.get('grid')
+    if grid is not None and grid ** n > 1024:
+        return False
+    num_props = params.get('num_props')
+    if num_props is not None and num_props > max(1, 2 ** (4 - n)):
+        return False
+    return True
+
+
+def cases(quick=False):
+    if quick:
+        dims = [2, 3]
+        small_dims = [2]
+    else:
+        dims = [2, 3, 4, 5, 6]
+        small_dims = [2, 3, 4]
+
+    # prop2part
+    for c in _cases(
+        'prop2part', 'num_props',
+        dict(n=dims, num_props=[1, 2, 4]),
+        lambda n, num_props: (box(n), random_props(n, num_props, 0)),
+        lambda args: abstract.prop2part(*args)
+    ):
+        yield c
+
+    # add_grid
+    for c in _cases(
+        'add_grid', 'grid',
+        dict(n=dims, grid=[2, 4] if quick else [2, 4, 8, 16]),
+        lambda n, grid: (random_partition(n, 1), grid),
+        lambda args: abstract.add_grid(args[0], num_grid_pnts=args[1])
+    ):
+        yield c
+
+    # pwa_partition
+    for c in _cases(
+        'pwa_partition', 'num_subsys',
+        dict(n=small_dims,
+             num_subsys=[2, 4] if quick else [2, 4, 8, 16]),
+        lambda n, num_subsys: (
+            random_pwa(n, num_subsys, 0), random_partition(n, 2)),
+        lambda args: abstract.pwa_partition(*args)
+    ):
+        yield c
+
+    # discretize
+    def setup_discretize(n, N, trans_length):
+        return random_partition(n, 1, grid=3), random_lti(n, 0), dict(
+            N=N, trans_length=trans_length,
+            min_cell_volume=min_cell_volume(n))
+
+    for c in _cases(
+        'discretize', 'N',
+        dict(n=small_dims,
+             N=[1, 2] if quick else [1, 2, 4, 8],
+             trans_length=[1] if quick else [1, 2]),
+        setup_discretize,
+        lambda args: abstract.discretize(args[0], args[1], **args[2])
+    ):
+        yield c
+
+    # discretize_switched
+    def setup_switched(n, num_modes):
+        switched = random_switched(n, num_modes, 0)
+        disc_params = dict(
+            (mode, dict(N=1, trans_length=1,
+                        min_cell_volume=min_cell_volume(n)))
+            for mode in switched.modes)
+        return random_partition(n, 1, grid=3), switched, disc_params
+
+    for c in _cases(
+        'discretize_switched', 'num_modes',
+        dict(n=[2], num_modes=[1, 2] if quick else [1, 2, 4, 8]),
+        setup_switched,
+        lambda args: abstract.discretize_switched(
+            args[0], args[1], disc_params=args[2])
+    ):
+        yield c
+
+    # get_input
+    def setup_get_input(n, N):
+        ppp = random_partition(n, 1, grid=3)
+        ssys = random_lti(n, 0)
+        ab = abstract.discretize(
+            ppp, ssys, N=N, trans_length=1,
+            min_cell_volume=min_cell_volume(n))
+        return ab, _transitions(ab, 20)
+
+    for c in _cases(
+        'get_input', 'N',
+        dict(n=small_dims, N=[1, 2] if quick else [1, 2, 4, 8]),
+        setup_get_input,
+        _run_get_input
+    ):
+        yield c
+
+
+def _transitions(ab, num):
+    """Return up to C{num} transitions between distinct cells."""
+    ts2ppp = dict((s, i) for i, s in enumerate(ab.ppp2ts))
+    pairs = [
+        (ts2ppp[u], ts2ppp[v]) for u, v in ab.ts.edges_iter()
+        if u != v]
+    return pairs[:num]
+
+
+def _run_get_input(args):
+    ab, pairs = args
+    for i, j in pairs:
+        r, xc = pc.cheby_ball(ab.ppp[i])
+        ssys = ab.ppp2sys(i)[1]
+        abstract.get_input(xc.flatten(), ssys, ab, i, j)
+
+
+if __name__ == '__main__':
+    main(cases)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Benchmark of repeated calls to C{abstract.get_input}.
+
+Times the receding-horizon use of C{get_input}:
+the input is recomputed after each step,
+with and without an L{abstract.InputWorkspace}.
+
+Usage::
+
+    python get_input.py [num_runs]
+"""
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+import polytope as pc
+from tulip import abstract, hybrid
+from tulip.abstract import backend
+
+
+def build(N=3):
+    dom = pc.box2poly([[0., 3.], [0., 2.]])
+    U = pc.box2poly([[-1., 1.], [-1., 1.]])
+    U.scale(0.4)
+    sys_dyn = hybrid.LtiSysDyn(
+        np.eye(2), np.eye(2), Uset=U, domain=dom)
+    cont_props = {
+        'left': pc.box2poly([[0., 1.], [0., 2.]]),
+        'right': pc.box2poly([[2., 3.], [0., 2.]])}
+    ppp = abstract.prop2part(dom, cont_props)
+    ab = abstract.discretize(
+        ppp, sys_dyn, N=N, trans_length=1, closed_loop=True,
+        min_cell_volume=0.1)
+    return sys_dyn, ab
+
+
+def transitions(ab, num):
+    """Return C{num} pairs of (start, end) cells with a transition."""
+    ts2ppp = dict((s, i) for i, s in enumerate(ab.ppp2ts))
+    pairs = []
+    for u, v in ab.ts.edges_iter():
+        if u != v:
+            pairs.append((ts2ppp[u], ts2ppp[v]))
+    return pairs[:num]
+
+
+def run(sys_dyn, ab, pairs, workspace_factory):
+    N = ab.disc_params['N']
+    t0 = timer()
+    for start, end in pairs:
+        workspace = workspace_factory()
+        r, xc = pc.cheby_ball(ab.ppp[start])
+        x = xc.flatten()
+        # receding horizon: recompute input after each step
+        for k in xrange(N):
+            u = abstract.get_input(
+                x, sys_dyn, ab, start, end,
+                N=N - k, workspace=workspace)
+            x = sys_dyn.A.dot(x) + sys_dyn.B.dot(u[0, :])
+    return timer() - t0
+
+
+def main():
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    backend.select(route_polytope=True)
+    sys_dyn, ab = build()
+    pairs = transitions(ab, num_runs)
+    print('{n} transitions, N = {N}'.format(
+        n=len(pairs), N=ab.disc_params['N']))
+    for name, factory in [
+        ('no workspace', lambda: None),
+        ('workspace', abstract.InputWorkspace)
+    ]:
+        backend.reset_stats()
+        t = run(sys_dyn, ab, pairs, factory)
+        print('{name}: {t:.3f} sec'.format(name=name, t=t))
+        print(backend.report())
+
+
+if __name__ == '__main__':
+    main()
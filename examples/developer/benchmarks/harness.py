@@ -0,0 +1,243 @@
+"""Common driver of the benchmark scripts in this directory.
+
+A benchmark script defines a function C{cases(quick)}
+that yields C{dict}s with keys:
+
+  - C{'bench'}: name of the function benchmarked
+  - C{'params'}: C{dict} of parameters of the case
+  - C{'x'}: name of the parameter to plot against
+  - C{'setup'}: callable that returns the input, not timed
+  - C{'run'}: callable that takes the input and is timed
+
+and calls C{main(cases)}, which provides the commands::
+
+    run [-o results.json] [--quick] [--only BENCH] [--repeat K]
+    compare baseline.json results.json [--threshold 1.2] [--min-time 0.1]
+    plot results.json [--prefix scaling]
+
+Each case runs in a child process, so that the memory reported,
+the increase of peak resident memory during C{run},
+is not affected by other cases.
+Time is the minimum over C{--repeat} runs.
+
+C{compare} prints the ratio of time and memory of each case
+to the baseline, and exits with status 1 if any time ratio
+exceeds the threshold, so it can be used in review.
+Cases faster than C{--min-time} seconds in both runs
+are not reported as regressions, being dominated by noise.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing as mp
+import platform
+import resource
+import subprocess
+import sys
+from timeit import default_timer as timer
+
+
+def measure(setup, run, repeat=1):
+    """Return time and memory of C{run(setup())}.
+
+    @return: C{dict(time=float, memory=float, error=str)},
+        time in seconds, memory in MiB,
+        error C{None} if C{run} raised no exception
+    """
+    queue = mp.Queue()
+    p = mp.Process(target=_measure, args=(queue, setup, run, repeat))
+    p.start()
+    result = queue.get()
+    p.join()
+    return result
+
+
+def _measure(queue, setup, run, repeat):
+    result = dict(time=None, memory=None, error=None)
+    try:
+        data = setup()
+        rss = _max_rss()
+        times = list()
+        for i in xrange(repeat):
+            t0 = timer()
+            run(data)
+            times.append(timer() - t0)
+        result['time'] = min(times)
+        result['memory'] = _max_rss() - rss
+    except Exception as e:
+        result['error'] = '{t}: {e}'.format(t=type(e).__name__, e=e)
+    queue.put(result)
+
+
+def _max_rss():
+    """Return peak resident memory of this process in MiB."""
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        kb /= 1024.0
+    return kb / 1024.0
+
+
+def run_cases(cases, only=None, repeat=1):
+    """Measure each case and return results.
+
+    @param only: names of benchmarks to run, default all
+    @rtype: C{dict(meta=dict, results=list)}
+    """
+    results = list()
+    for case in cases:
+        if only and case['bench'] not in only:
+            continue
+        r = measure(case['setup'], case['run'], repeat)
+        r.update(bench=case['bench'], params=case['params'], x=case['x'])
+        results.append(r)
+        print(_format_result(r))
+    return dict(meta=_meta(), results=results)
+
+
+def _meta():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(
+        date=datetime.datetime.now().isoformat(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        commit=commit)
+
+
+def _key(r):
+    return (r['bench'], tuple(sorted(r['params'].items())))
+
+
+def _format_params(params):
+    return ', '.join(
+        '{k}={v}'.format(k=k, v=v) for k, v in sorted(params.items()))
+
+
+def _format_result(r):
+    if r['error'] is not None:
+        return '{b:20} {p:45} error: {e}'.format(
+            b=r['bench'], p=_format_params(r['params']), e=r['error'])
+    return '{b:20} {p:45} {t:10.4f} s {m:8.1f} MiB'.format(
+        b=r['bench'], p=_format_params(r['params']),
+        t=r['time'], m=r['memory'])
+
+
+def compare(baseline, results, threshold=1.2, min_time=0.1):
+    """Print ratios of C{results} to C{baseline}, case by case.
+
+    @param threshold: time ratio above which
+        a case is reported as regression
+    @param min_time: cases faster than this in both runs
+        are not reported as regressions [sec]
+    @return: cases that regressed
+    @rtype: C{list} of C{dict}
+    """
+    base = dict((_key(r), r) for r in baseline['results'])
+    regressions = list()
+    print('{b:20} {p:45} {t:>10} {m:>10}'.format(
+        b='benchmark', p='parameters', t='time', m='memory'))
+    for r in results['results']:
+        b = base.get(_key(r))
+        if b is None or r['time'] is None or b['time'] is None:
+            continue
+        t = r['time'] / max(b['time'], 1e-9)
+        m = (r['memory'] + 1.0) / (b['memory'] + 1.0)
+        flag = ''
+        if max(r['time'], b['time']) < min_time:
+            pass
+        elif t > threshold:
+            flag = '  <-- slower'
+            regressions.append(r)
+        elif t < 1.0 / threshold:
+            flag = '  faster'
+        print('{b:20} {p:45} {t:>9.2f}x {m:>9.2f}x{f}'.format(
+            b=r['bench'], p=_format_params(r['params']),
+            t=t, m=m, f=flag))
+    return regressions
+
+
+def plot(results, prefix='scaling'):
+    """Save a log-log plot of time versus C{'x'} per benchmark.
+
+    Cases that differ in other parameters are plotted
+    as separate curves.
+
+    @return: names of files saved
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    curves = dict()
+    for r in results['results']:
+        if r['time'] is None:
+            continue
+        params = dict(r['params'])
+        x = params.pop(r['x'])
+        label = _format_params(params)
+        c = curves.setdefault(r['bench'], dict())
+        c.setdefault(label, list()).append((x, r['time']))
+    fnames = list()
+    for bench, c in sorted(curves.items()):
+        fig, ax = plt.subplots()
+        for label, points in sorted(c.items()):
+            x, t = zip(*sorted(points))
+            ax.loglog(x, t, 'o-', label=label, basex=2)
+        xname = [r['x'] for r in results['results']
+                 if r['bench'] == bench][0]
+        ax.set_xlabel(xname)
+        ax.set_ylabel('time [s]')
+        ax.set_title(bench)
+        ax.legend(loc='best', fontsize='small')
+        fname = '{p}_{b}.png'.format(p=prefix, b=bench)
+        fig.savefig(fname)
+        plt.close(fig)
+        fnames.append(fname)
+    return fnames
+
+
+def main(cases, argv=None):
+    """Command line interface, see module docstring."""
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', help='run benchmarks')
+    p.add_argument('-o', '--output', default='results.json')
+    p.add_argument('--quick', action='store_true',
+                   help='small cases only')
+    p.add_argument('--only', action='append',
+                   help='benchmark to run (repeatable)')
+    p.add_argument('--repeat', type=int, default=1)
+    p = sub.add_parser('compare', help='compare to baseline')
+    p.add_argument('baseline')
+    p.add_argument('results')
+    p.add_argument('--threshold', type=float, default=1.2)
+    p.add_argument('--min-time', type=float, default=0.1)
+    p = sub.add_parser('plot', help='plot scaling curves')
+    p.add_argument('results')
+    p.add_argument('--prefix', default='scaling')
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        results = run_cases(
+            cases(args.quick), only=args.only, repeat=args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('results saved to: ' + args.output)
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.results) as f:
+            results = json.load(f)
+        regressions = compare(
+            baseline, results, args.threshold, args.min_time)
+        if regressions:
+            print('{n} cases slower than threshold'.format(
+                n=len(regressions)))
+            sys.exit(1)
+    elif args.command == 'plot':
+        with open(args.results) as f:
+            results = json.load(f)
+        for fname in plot(results, args.prefix):
+            print('saved: ' + fname)
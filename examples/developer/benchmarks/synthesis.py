@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""Benchmarks of synthesis, except for the solver.
+
+Synthetic transition systems, GR(1) specifications with many variables
+and solver outputs are generated, so that no solver is needed.
+Each stage of C{synth.synthesize} is timed separately:
+
+  - C{sys_to_spec}: transition system to C{GRSpec}
+  - C{parse}: parsing of the formulas
+  - C{str_to_int}: replacing string variables by integers
+  - C{translate_gr1c}, C{translate_jtlv}: input to each solver
+  - C{load_aut_xml}: parsing of C{gr1c} output
+  - C{jtlv_output}: parsing of C{jtlv} output
+  - C{strategy2mealy}: strategy to C{MealyMachine}
+  - C{minimize}: C{machines.minimize} of the C{MealyMachine}
+
+The transition systems have up to 10^5 nodes (see C{cases}),
+and their strategies as many nodes.
+The stages up to translation are timed for each
+C{encoding} of C{sys_to_spec}.
+C{parse_spec} and C{translate_spec} time specifications
+with many variables, not obtained from a transition system.
+
+Usage is as for C{abstraction.py}::
+
+    python synthesis.py run --quick -o base.json
+    python synthesis.py compare base.json new.json
+"""
+import functools
+import logging
+
+import numpy as np
+from tulip import spec, synth
+from tulip.interfaces import gr1c, jtlv
+from tulip.transys import TransitionSystem, machines
+
+from harness import main
+
+
+logging.basicConfig(level=logging.WARNING)
+NODEVAR = 'loc'
+
+
+def random_ts(num_nodes, num_props=4, degree=3, seed=0):
+    """Return transition system with string nodes.
+
+    Each node is labeled with values of Boolean variables
+    C{p0, p1, ...}, and each edge with a value of
+    the environment variable C{e}.
+    """
+    rng = np.random.RandomState(seed)
+    g = TransitionSystem()
+    props = ['p' + str(i) for i in xrange(num_props)]
+    g.vars = dict((p, 'boolean') for p in props)
+    g.vars['e'] = 'boolean'
+    g.env_vars.add('e')
+    nodes = ['s' + str(i) for i in xrange(num_nodes)]
+    values = rng.randint(2, size=(num_nodes, num_props))
+    for u, row in zip(nodes, values):
+        g.add_node(u, **dict((p, bool(v)) for p, v in zip(props, row)))
+    for i, u in enumerate(nodes):
+        # a cycle through all nodes, and random edges
+        succ = [(i + 1) % num_nodes] + list(
+            rng.randint(num_nodes, size=degree - 1))
+        for j in set(succ):
+            g.add_edge(u, nodes[j], e=bool(rng.randint(2)))
+    g.initial_nodes.add(nodes[0])
+    return g
+
+
+def random_spec(num_vars, num_clauses=None, seed=0):
+    """Return C{GRSpec} over C{num_vars} env and sys Boolean variables."""
+    rng = np.random.RandomState(seed)
+    if num_clauses is None:
+        num_clauses = num_vars
+    env = ['x' + str(i) for i in xrange(num_vars)]
+    sys = ['y' + str(i) for i in xrange(num_vars)]
+
+    def clauses(pre, post, fmt):
+        return [
+            fmt.format(a=pre[i], b=post[j], c=post[k])
+            for i, j, k in rng.randint(num_vars, size=(num_clauses, 3))]
+
+    return spec.GRSpec(
+        env_vars=env, sys_vars=sys,
+        env_init=['!' + x for x in env[:2]],
+        sys_init=['!' + y for y in sys[:2]],
+        env_safety=clauses(sys, env, '{a} -> X(!{b} || {c})'),
+        sys_safety=clauses(env, sys, '({a} && X {b}) -> X({c} || !{b})'),
+        env_prog=env[:2],
+        sys_prog=clauses(sys, sys, '{a} && !{b}'))
+
+
+def random_strategy(g, specs, num_nodes, degree=2, seed=0):
+    """Return strategy states consistent with C{g}.
+
+    Node C{0} is initial. Variables are integers,
+    as in the output of solvers.
+
+    @return: C{(states, successors)}, lists indexed by node
+    """
+    rng = np.random.RandomState(seed)
+    locs = specs.sys_vars[NODEVAR]
+    ts_nodes = rng.randint(len(locs), size=num_nodes)
+    ts_nodes[0] = locs.index(next(iter(g.initial_nodes)))
+    states = list()
+    for i in ts_nodes:
+        d = g.node[locs[i]]
+        state = dict((k, int(v)) for k, v in d.iteritems())
+        state[NODEVAR] = int(i)
+        state['e'] = int(rng.randint(2))
+        states.append(state)
+    successors = [
+        sorted(set(rng.randint(num_nodes, size=degree)))
+        for i in xrange(num_nodes)]
+    return states, successors
+
+
+def mode_strategy(states, successors, num_modes=3):
+    """Return strategy with a copy of the nodes per goal.
+
+    As in strategies from C{gr1c}, node C{i} of mode C{k}
+    is a different node with the same values,
+    so minimization merges the copies.
+    Node C{i} of mode C{k} is node C{k * n + i},
+    and moves to the next mode if C{e} is true.
+    Successors with the same values are dropped, but the first,
+    because a strategy reacts to each input in one way.
+
+    @return: C{(states, successors)}, as L{random_strategy}
+    """
+    n = len(states)
+    keys = [tuple(sorted(d.iteritems())) for d in states]
+    det = list()
+    for succ in successors:
+        seen = dict()
+        for j in succ:
+            seen.setdefault(keys[j], j)
+        det.append(sorted(seen.itervalues()))
+    mode_states = list()
+    mode_successors = list()
+    for k in xrange(num_modes):
+        for state, succ in zip(states, det):
+            m = (k + 1) % num_modes if state['e'] else k
+            mode_states.append(dict(state))
+            mode_successors.append([m * n + j for j in succ])
+    return mode_states, mode_successors
+
+
+def gr1c_output(specs, states, successors):
+    """Return C{str} in the XML format output by C{gr1c}."""
+    def var_items(dvars):
+        r = list()
+        for k, dom in sorted(dvars.iteritems()):
+            if isinstance(dom, list):
+                dom = '[0,{n}]'.format(n=len(dom) - 1)
+            elif isinstance(dom, tuple):
+                dom = '[{0},{1}]'.format(*dom)
+            r.append('<item key="{k}" value="{d}" />'.format(k=k, d=dom))
+        return ''.join(r)
+
+    nodes = list()
+    for i, (state, succ) in enumerate(zip(states, successors)):
+        items = ''.join(
+            '<item key="{k}" value="{v}" />'.format(k=k, v=v)
+            for k, v in sorted(state.iteritems()))
+        nodes.append(
+            '<node><id>{i}</id><anno></anno>'
+            '<child_list> {c}</child_list>'
+            '<state>{s}</state></node>'.format(
+                i=i, c=' '.join(str(j) for j in succ), s=items))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<tulipcon xmlns="http://tulip-control.sourceforge.net/ns/1" '
+        'version="1">\n'
+        '<env_vars>{env}</env_vars>\n'
+        '<sys_vars>{sys}</sys_vars>\n'
+        '<spec><env_init></env_init><env_safety></env_safety>'
+        '<env_prog></env_prog><sys_init></sys_init>'
+        '<sys_safety></sys_safety><sys_prog></sys_prog></spec>\n'
+        '<aut type="basic">\n{nodes}\n</aut>\n'
+        '<extra></extra>\n'
+        '</tulipcon>\n').format(
+            env=var_items(specs.env_vars),
+            sys=var_items(specs.sys_vars),
+            nodes='\n'.join(nodes))
+
+
+def jtlv_output(states, successors):
+    """Return C{list} of lines in the format output by C{jtlv}."""
+    lines = list()
+    for i, (state, succ) in enumerate(zip(states, successors)):
+        lines.append('State {i} <{s}>'.format(i=i, s=', '.join(
+            '{k}:{v}'.format(k=k, v=v)
+            for k, v in sorted(state.iteritems()))))
+        lines.append('With successors : {s}'.format(
+            s=', '.join(str(j) for j in succ)))
+        lines.append('-----')
+    return lines
+
+
+# setup of each stage, from the previous ones
+
+def _ts_spec(num_nodes, encoding='flat'):
+    g = random_ts(num_nodes)
+    return g, synth.sys_to_spec(
+        g, NODEVAR, ignore_initial=False, encoding=encoding)
+
+
+def _parsed_spec(num_nodes, encoding):
+    g, specs = _ts_spec(num_nodes, encoding)
+    specs.parse()
+    return specs
+
+
+def _int_spec(num_nodes, encoding):
+    specs = _parsed_spec(num_nodes, encoding)
+    specs.str_to_int()
+    return specs
+
+
+def _strategy(num_nodes):
+    g, specs = _ts_spec(num_nodes)
+    states, successors = random_strategy(g, specs, num_nodes)
+    return specs, states, successors
+
+
+def _gr1c_output(num_nodes):
+    specs, states, successors = _strategy(num_nodes)
+    return gr1c_output(specs, states, successors)
+
+
+def _jtlv_output(num_nodes):
+    specs, states, successors = _strategy(num_nodes)
+    return jtlv_output(states, successors), specs
+
+
+def _mealy_input(num_nodes):
+    specs, states, successors = _strategy(num_nodes)
+    A = gr1c.load_aut_xml(gr1c_output(specs, states, successors))
+    # compile_init is part of strategy2mealy
+    specs = spec.GRSpec(
+        env_vars=specs.env_vars, sys_vars=specs.sys_vars,
+        env_init=specs.env_init, sys_init=specs.sys_init,
+        env_safety=specs.env_safety, sys_safety=specs.sys_safety)
+    return A, specs
+
+
+def _mode_mealy(num_nodes, num_modes=3):
+    specs, states, successors = _strategy(num_nodes // num_modes)
+    states, successors = mode_strategy(states, successors, num_modes)
+    A = gr1c.load_aut_xml(gr1c_output(specs, states, successors))
+    return synth.strategy2mealy(A, specs)
+
+
+def _parsed_random_spec(num_vars):
+    specs = random_spec(num_vars)
+    specs.parse()
+    specs.str_to_int()
+    return specs
+
+
+ENCODINGS = ['flat', 'grouped']
+# stages that depend on the encoding
+SPEC_STAGES = [
+    ('sys_to_spec', lambda n, e: (random_ts(n), e),
+     lambda args: synth.sys_to_spec(
+         args[0], NODEVAR, ignore_initial=False, encoding=args[1])),
+    ('parse', lambda n, e: _ts_spec(n, e)[1], lambda s: s.parse()),
+    ('str_to_int', _parsed_spec, lambda s: s.str_to_int()),
+    ('translate_gr1c', _int_spec, lambda s: spec.translate(s, 'gr1c')),
+    ('translate_jtlv', _int_spec, lambda s: spec.translate(s, 'jtlv')),
+]
+STAGES = [
+    ('load_aut_xml', _gr1c_output, gr1c.load_aut_xml),
+    ('jtlv_output', _jtlv_output,
+     lambda args: jtlv.jtlv_output_to_networkx(*args)),
+    ('strategy2mealy', _mealy_input,
+     lambda args: synth.strategy2mealy(*args)),
+    ('minimize', _mode_mealy, machines.minimize),
+]
+
+
+def cases(quick=False):
+    if quick:
+        sizes = [10, 100, 1000]
+        num_vars = [10, 100]
+    else:
+        sizes = [10, 100, 1000, 10000, 100000]
+        num_vars = [10, 100, 1000]
+    for bench, setup, run in SPEC_STAGES:
+        for e in ENCODINGS:
+            for n in sizes:
+                yield dict(
+                    bench=bench, params=dict(num_nodes=n, encoding=e),
+                    x='num_nodes', setup=functools.partial(setup, n, e),
+                    run=run)
+    for bench, setup, run in STAGES:
+        for n in sizes:
+            yield dict(
+                bench=bench, params=dict(num_nodes=n), x='num_nodes',
+                setup=functools.partial(setup, n), run=run)
+    for n in num_vars:
+        yield dict(
+            bench='parse_spec', params=dict(num_vars=n), x='num_vars',
+            setup=functools.partial(random_spec, n),
+            run=lambda s: s.parse())
+        yield dict(
+            bench='translate_spec', params=dict(num_vars=n), x='num_vars',
+            setup=functools.partial(_parsed_random_spec, n),
+            run=lambda s: spec.translate(s, 'gr1c'))
+
+
+if __name__ == '__main__':
+    main(cases)
@@ -288,7 +288,7 @@ if perform_setup:
         requires = ['numpy', 'scipy', 'polytope', 'ply', 'networkx'],
         install_requires = [
             'numpy >= 1.7',
-            'polytope >= 0.1.0',
+            'polytope >= 0.1.2',
             'ply >= 3.4',
             'networkx >= 1.6',
             'cvxopt'
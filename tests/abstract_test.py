@@ -1,5 +1,8 @@
 """Tests for the abstraction from continuous dynamics to logic"""
 import logging
+import os
+import shutil
+import tempfile
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 # logging.getLogger('tulip').setLevel(logging.ERROR)
@@ -8,7 +11,8 @@ import matplotlib
 # to avoid the need for using: ssh -X when running tests remotely
 matplotlib.use('Agg')
 import numpy as np
-from tulip import abstract, hybrid
+from nose.tools import assert_raises
+from tulip import abstract, hybrid, spec, synth
 import polytope as pc
 
 input_bound = 0.4
@@ -108,6 +112,41 @@ def transition_directions_test():
 transition_directions_test.slow = True
 
 
+def test_discretize_switched_shared_dynamics():
+    dom = pc.box2poly([[0., 3.], [0., 2.]])
+    pwa0 = hybrid.PwaSysDyn([subsys0()], dom)
+    pwa1 = hybrid.PwaSysDyn([subsys1()], dom)
+    env_modes = ('normal', 'refuel', 'gust')
+    dynamics = {('normal', 'fly'): pwa0,
+                ('refuel', 'fly'): pwa1,
+                ('gust', 'fly'): pwa0}
+    switched = hybrid.SwitchedSysDyn(
+        disc_domain_size=(3, 1),
+        dynamics=dynamics,
+        env_labels=env_modes,
+        disc_sys_labels=('fly', ),
+        cts_ss=dom)
+    groups = switched.group_modes()
+    assert len(groups) == 2
+    assert sorted(map(len, groups)) == [1, 2]
+    assert len(switched.all_mode_combs) == 3
+    assert list(switched.iter_mode_combs()) == switched.all_mode_combs
+    cont_props = {'home': pc.box2poly([[0., 1.], [0., 1.]])}
+    ppp = abstract.prop2part(dom, cont_props)
+    ppp, new2old = abstract.part2convex(ppp)
+    disc_params = {mode: {'N': 2, 'trans_length': 1}
+                   for mode in dynamics}
+    swab = abstract.discretize_switched(ppp, switched, disc_params)
+    assert swab.modes[('normal', 'fly')] is swab.modes[('gust', 'fly')]
+    assert (swab.ppp2modes[('normal', 'fly')] ==
+            swab.ppp2modes[('gust', 'fly')])
+    edges = dict()
+    for u, v, d in swab.ts.edges_iter(data=True):
+        edges.setdefault(d["env_mode'"], set()).add((u, v))
+    assert edges['normal'] == edges['gust']
+    assert edges['normal'] != edges.get('refuel', set())
+
+
 def test_transient_regions():
     """drift is too strong, so no self-loop must exist
 
@@ -214,5 +253,521 @@ def test_abstract_the_dynamics():
 test_abstract_the_dynamics.slow = True
 
 
+def test_pwa_partition():
+    dom = pc.box2poly([[0.0, 3.0], [0.0, 3.0]])
+    U = pc.box2poly([[-1.0, 1.0], [-1.0, 1.0]])
+    subsystems = [
+        hybrid.LtiSysDyn(np.eye(2), np.eye(2), Uset=U,
+                         domain=pc.box2poly([[x, x + 1.0], [0.0, 3.0]]))
+        for x in (0.0, 1.0, 2.0)]
+    pwa = hybrid.PwaSysDyn(subsystems, dom)
+    props = {'a': pc.box2poly([[0.5, 2.5], [1.0, 2.0]]),
+             'b': pc.box2poly([[1.0, 2.0], [2.5, 3.0]])}
+    ppp = abstract.prop2part(dom, props)
+    new, subsys, parents = abstract.pwa_partition(pwa, ppp)
+    assert new.is_partition()
+    for r, i, j in zip(new, subsys, parents):
+        assert r <= subsystems[i].domain
+        assert r <= ppp.regions[j]
+        assert r.props == ppp.regions[j].props
+    adj = new.adj.toarray()
+    for i, ri in enumerate(new):
+        for j, rj in enumerate(new):
+            if i == j:
+                continue
+            assert adj[i, j] == int(pc.is_adjacent(ri, rj))
+    new2, subsys2, parents2 = abstract.pwa_partition(pwa, ppp, processes=2)
+    assert subsys2 == subsys
+    assert parents2 == parents
+    assert (new2.adj.toarray() == adj).all()
+
+
+def test_may_be_feasible():
+    sys = subsys0()
+    p0 = pc.box2poly([[0., 0.5], [0., 0.5]])
+    near = pc.box2poly([[0.5, 1.], [0., 0.5]])
+    far = pc.box2poly([[2.5, 3.], [1.5, 2.]])
+    # input_bound 0.4 per step
+    assert abstract.feasible.may_be_feasible(p0, near, sys, N=1)
+    assert not abstract.feasible.may_be_feasible(p0, far, sys, N=1)
+    assert not abstract.is_feasible(p0, far, sys, N=1)
+    assert abstract.feasible.may_be_feasible(
+        p0, far, sys, N=10, trans_set=sys.domain)
+    # intermediate states confined to p0
+    assert not abstract.feasible.may_be_feasible(p0, far, sys, N=10)
+
+
+def test_backend_stats():
+    from tulip.abstract import backend
+    sys = subsys0()
+    p0 = pc.box2poly([[0., 1.], [0., 1.]])
+    p1 = pc.box2poly([[1., 1.5], [0., 1.]])
+    lp, qp = backend.selected()
+    original = pc.polytope.lpsolve
+    assert original is not backend.lpsolve
+    try:
+        backend.select(route_polytope=True)
+        assert pc.polytope.lpsolve is backend.lpsolve
+        backend.select(route_polytope=False)
+        assert pc.polytope.lpsolve is original
+        for solver in ('glpk', 'cvxopt'):
+            backend.select(lp=solver, route_polytope=True)
+            backend.reset_stats()
+            abstract.is_feasible(p0, p1, sys, N=2, trans_set=p0)
+            stats = backend.get_stats()
+            assert stats['solve_feasible']['lp']['count'] > 0
+            assert stats['solve_feasible']['lp']['time'] > 0
+        assert stats['solve_feasible']['lp']['iterations'] > 0
+        assert 'solve_feasible' in backend.report()
+    finally:
+        backend.select(lp=lp, qp=qp, route_polytope=False)
+    assert pc.polytope.lpsolve is original
+    try:
+        backend.select(lp='nonexistent')
+        raise AssertionError('unknown solver should be rejected')
+    except ValueError:
+        pass
+
+
+def test_verify_transitions():
+    dom = pc.box2poly([[0.0, 10.0], [0.0, 20.0]])
+    ppp = define_partition(dom)
+    sys = define_dynamics(dom)
+    ab = abstract.discretize(ppp, sys, N=1, trans_length=1,
+                             min_cell_volume=10.0)
+    for method in ('exact', 'sample'):
+        report = ab.verify_transitions(method=method, seed=0)
+        assert report['num_checked'] == len(ab.ts.edges())
+        assert report['failed'] == []
+    # add infeasible transition
+    u = ab.ppp2ts[0]
+    v = ab.ppp2ts[-1]
+    assert not ab.ts.has_edge(u, v)
+    ab.ts.add_edge(u, v)
+    for method in ('exact', 'sample'):
+        report = ab.verify_transitions(method=method, processes=2, seed=0)
+        assert [(d['from'], d['to']) for d in report['failed']] == [(u, v)]
+        assert report['failed'][0]['ratio'] < 1
+
+
+def test_run_episodes():
+    from tulip import transys
+    from tulip.abstract import execution
+    dom = pc.box2poly([[0.0, 10.0], [0.0, 20.0]])
+    ppp = define_partition(dom)
+    sys = define_dynamics(dom)
+    ab = abstract.discretize(ppp, sys, N=1, trans_length=1,
+                             min_cell_volume=10.0)
+    # controller that follows a path of ab.ts
+    path = [ab.ppp2ts[0]]
+    for i in xrange(3):
+        path.append(min(ab.ts.successors(path[-1])))
+    ctrl = transys.MealyMachine()
+    ctrl.outputs.update({'loc': set(ab.ppp2ts)})
+    ctrl.add_nodes_from(['Sinit'] + range(len(path)))
+    ctrl.initial_nodes.add('Sinit')
+    ctrl.add_edge('Sinit', 0, loc=path[0])
+    for i in xrange(len(path) - 1):
+        ctrl.add_edge(i, i + 1, loc=path[i + 1])
+    r, xc = pc.cheby_ball(ab.ppp[0])
+    x0 = np.tile(xc.flatten(), (3, 1))
+    report = execution.run_episodes(ctrl, ab, x0, num_steps=3, seed=0)
+    assert report['violations'] == []
+    assert report['num_steps'] == 9
+    for e in report['episodes']:
+        assert e['x'].shape == (4, 2)
+        assert e['u'].shape == (3, 2)
+        assert [ab.ppp2ts[i] for i in e['cells']] == path
+    for stage in execution.STAGES:
+        assert report['latency'][stage][50] > 0
+    # start outside the initial cell of the controller
+    r, xc = pc.cheby_ball(ab.ppp[1])
+    e = execution.run_episode(ctrl, ab, xc.flatten(), num_steps=3)
+    assert e['violation'] == (0, 'initial')
+
+
+def test_input_workspace():
+    dom = pc.box2poly([[0.0, 10.0], [0.0, 20.0]])
+    ppp = define_partition(dom)
+    sys = define_dynamics(dom)
+    ab = abstract.discretize(ppp, sys, N=2, trans_length=1,
+                             min_cell_volume=10.0)
+    r, xc = pc.cheby_ball(ab.ppp[0])
+    x0 = xc.flatten()
+    ts2ppp = dict((s, i) for i, s in enumerate(ab.ppp2ts))
+    ends = [ts2ppp[v] for v in ab.ts.successors(ab.ppp2ts[0])]
+    workspace = abstract.InputWorkspace()
+    # N = 1 after N = 2 warm-starts from the shifted solution
+    for end, N in [(end, 2) for end in ends] + [(0, 1)]:
+        R = np.eye(2 * N)
+        Q = np.eye(2 * N)
+        u = abstract.get_input(x0, sys, ab, 0, end, N=N, R=R, Q=Q,
+                               mid_weight=3)
+        u_ws = abstract.get_input(x0, sys, ab, 0, end, N=N, R=R, Q=Q,
+                                  mid_weight=3, workspace=workspace)
+        assert u.shape == (N, 2)
+        assert np.allclose(u, u_ws, atol=1e-4)
+        # caller's cost matrix is not modified
+        assert np.array_equal(R, np.eye(2 * N))
+
+
+def test_receding_horizon_input():
+    from tulip.abstract import backend
+    dom = pc.box2poly([[0.0, 10.0], [0.0, 20.0]])
+    ppp = define_partition(dom)
+    sys = define_dynamics(dom)
+    ab = abstract.discretize(ppp, sys, N=2, trans_length=1,
+                             min_cell_volume=10.0)
+    ts2ppp = dict((s, i) for i, s in enumerate(ab.ppp2ts))
+    end = ts2ppp[max(ab.ts.successors(ab.ppp2ts[0]))]
+    r, xc = pc.cheby_ball(ab.ppp[0])
+    x = xc.flatten()
+    f = abstract.RecedingHorizonInput(sys, ab, 0, end)
+    k = 0
+    while not f.done:
+        backend.reset_stats()
+        u = f(x)
+        # feasible sets reused after first step
+        if k > 0:
+            assert 'solve_feasible' not in backend.get_stats()
+        x = sys.A.dot(x) + sys.B.dot(u) + sys.K.flatten()
+        k += 1
+    assert k == 2
+    assert abstract.find_discrete_state(x, ab.ppp) == end
+
+
+def test_get_input_multiple_targets():
+    from tulip.abstract.feasible import propagate_boxes
+    from tulip.abstract.find_controller import get_input_helper
+    dom = pc.box2poly([[0.0, 10.0], [0.0, 20.0]])
+    ppp = define_partition(dom)
+    sys = define_dynamics(dom)
+    ab = abstract.discretize(ppp, sys, N=2, trans_length=1,
+                             min_cell_volume=10.0)
+    ts2ppp = dict((s, i) for i, s in enumerate(ab.ppp2ts))
+    pairs = [
+        (i, ts2ppp[v]) for i, u in enumerate(ab.ppp2ts)
+        for v in ab.ts.successors(u)
+        if len(ab.ppp.regions[ts2ppp[v]]) > 1]
+    assert pairs
+    # default cost of get_input
+    n = 2
+    Q = np.eye(4)
+    R = np.zeros([4, 4])
+    R[2:, 2:] = 3 * np.eye(n)
+    for start, end in pairs:
+        P1 = ab.ppp2trans(start)[0]
+        if isinstance(P1, pc.Region) and len(P1) == 1:
+            P1 = P1[0]
+        r, xc = pc.cheby_ball(ab.ppp[start])
+        x0 = xc.flatten()
+        # least cost over the target polytopes, one at a time
+        costs = list()
+        for P3, xc3 in zip(ab.ppp.regions[end],
+                           ab.cheby_centers(end)):
+            r3 = np.zeros([4, 1])
+            r3[2:, :] = -3 * xc3.reshape(n, 1)
+            try:
+                u3, cost = get_input_helper(x0, sys, P1, P3, 2, R, r3, Q)
+            except Exception:
+                continue
+            costs.append((cost, u3))
+        if not costs:
+            with assert_raises(Exception):
+                abstract.get_input(x0, sys, ab, start, end)
+            continue
+        u = abstract.get_input(x0, sys, ab, start, end)
+        cost, u_min = min(costs)
+        assert np.allclose(u, u_min, atol=1e-4)
+        # targets are pruned using an over-approximation of reach
+        l, h = propagate_boxes((x0, x0), sys, 2)[-1]
+        x = x0
+        for k in xrange(2):
+            x = sys.A.dot(x) + sys.B.dot(u[k]) + sys.K.flatten()
+        assert np.all(l <= x) and np.all(x <= h)
+
+
+def test_save_load_abstraction():
+    dom = pc.box2poly([[0.0, 10.0], [0.0, 20.0]])
+    ppp = define_partition(dom)
+    sys = define_dynamics(dom)
+    ab = abstract.discretize(ppp, sys, N=1, trans_length=1,
+                             min_cell_volume=10.0)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # partition alone
+        fname = os.path.join(tmpdir, 'ppp.npz')
+        abstract.save_partition(ab.ppp, fname)
+        ppp2 = abstract.load_partition(fname)
+        assert len(ppp2) == len(ab.ppp)
+        assert ppp2.regions.num_loaded == 0
+        r = ppp2.regions[2]
+        assert ppp2.regions.num_loaded == 1
+        assert r == ab.ppp.regions[2]
+        assert r.props == ab.ppp.regions[2].props
+        assert ppp2.prop_regions['a'] == ab.ppp.prop_regions['a']
+        assert (ppp2.adj.toarray() == ab.ppp.adj.toarray()).all()
+        # whole abstraction, compressed
+        fname = os.path.join(tmpdir, 'ab.npz')
+        abstract.save_abstraction(ab, fname, compress=True)
+        ab2 = abstract.load_abstraction(fname)
+        assert ab2.ppp2ts == ab.ppp2ts
+        assert ab2._ppp2pwa == list(ab._ppp2pwa)
+        assert ab2._ppp2orig == list(ab._ppp2orig)
+        assert set(ab2.ts.edges()) == set(ab.ts.edges())
+        for u in ab.ts:
+            assert ab2.ts.node[u] == ab.ts.node[u]
+        for r1, r2 in zip(ab.ppp, ab2.ppp):
+            assert r1 == r2
+            assert r1.props == r2.props
+        assert np.allclose(ab2.pwa.A, sys.A)
+        assert ab2.pwa.Uset == sys.Uset
+        assert ab2.disc_params == ab.disc_params
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_update_abstraction():
+    dom = pc.box2poly([[0.0, 10.0], [0.0, 20.0]])
+    ppp = define_partition(dom)
+    sys = define_dynamics(dom)
+    ab = abstract.discretize(ppp, sys, N=1, trans_length=1,
+                             min_cell_volume=10.0)
+    # move proposition
+    a = pc.box2poly([[0.0, 10.0], [12.0, 18.0]])
+    ab2 = abstract.update_abstraction(ab, changed_props={'a': a})
+    assert ab2.ppp.prop_regions['a'] == a
+    assert ab2.ppp.is_partition()
+    for r in ab2.ppp:
+        assert pc.is_fulldim(r.intersect(a)) == ('a' in r.props)
+    # cells outside the moved proposition are reused
+    assert any(r is s for r in ab.ppp for s in ab2.ppp)
+    # smaller input set
+    U = pc.box2poly([[0.0, 2.0], [-2.0, 2.0]])
+    sys2 = hybrid.LtiSysDyn(sys.A, sys.B, sys.E, sys.K, U, sys.Wset, dom)
+    ab3 = abstract.update_abstraction(ab, changed_subsystems={0: sys2})
+    assert ab3.pwa.Uset == U
+    assert ab3.ppp.is_partition()
+    assert len(ab3.ts) == len(ab3.ppp)
+    # unknown proposition
+    try:
+        abstract.update_abstraction(ab, changed_props={'c': a})
+        raise AssertionError('expected ValueError')
+    except ValueError:
+        pass
+
+
+def pwa_dynamics():
+    """Return domain and PWA system with three vertical strips."""
+    dom = pc.box2poly([[0.0, 3.0], [0.0, 3.0]])
+    U = pc.box2poly([[-0.5, 0.5], [-0.5, 0.5]])
+    subsystems = [
+        hybrid.LtiSysDyn(np.eye(2), np.eye(2), Uset=U,
+                         domain=pc.box2poly([[x, x + 1.0], [0.0, 3.0]]))
+        for x in (0.0, 1.0, 2.0)]
+    return dom, hybrid.PwaSysDyn(subsystems, dom)
+
+
+def assert_update_reuses(ab, ab2, changed):
+    """Assert that cells of C{ab} away from C{changed} are reused."""
+    reused = dict()
+    for i, r in enumerate(ab.ppp):
+        for j, s in enumerate(ab2.ppp):
+            if r is s:
+                reused[i] = j
+    adj = ab.ppp.adj.toarray()
+    affected = [i for i in xrange(len(ab.ppp)) if changed(i)]
+    for i in xrange(len(ab.ppp)):
+        if changed(i):
+            assert i not in reused
+        elif not adj[i, affected].any():
+            assert i in reused
+    assert reused
+    # transitions between reused cells are reused
+    for i, j in reused.iteritems():
+        for k, l in reused.iteritems():
+            assert (ab.ts.has_edge(ab.ppp2ts[i], ab.ppp2ts[k]) ==
+                    ab2.ts.has_edge(ab2.ppp2ts[j], ab2.ppp2ts[l]))
+
+
+def assert_same_maps(ab, fresh):
+    """Assert that overlapping cells map to the same original cells."""
+    conservative = ab.disc_params['conservative']
+    assert ab.orig_ppp.regions == fresh.orig_ppp.regions
+    if conservative:
+        assert ab._ppp2orig == fresh._ppp2orig
+        assert ab._ppp2pwa == fresh._ppp2pwa
+    for i, r in enumerate(ab.ppp):
+        for j, s in enumerate(fresh.ppp):
+            if not pc.is_fulldim(r.intersect(s)):
+                continue
+            assert ab._ppp2sys[i] == fresh._ppp2sys[j]
+            if conservative:
+                continue
+            assert ab._ppp2orig[i] == fresh._ppp2orig[j]
+            assert (ab.pwa_ppp.regions[ab._ppp2pwa[i]] ==
+                    fresh.pwa_ppp.regions[fresh._ppp2pwa[j]])
+
+
+def test_update_abstraction_pwa():
+    dom, pwa = pwa_dynamics()
+    props = {'a': pc.box2poly([[0.5, 2.5], [1.0, 2.0]]),
+             'b': pc.box2poly([[1.0, 2.0], [2.5, 3.0]]),
+             'c': pc.box2poly([[0.0, 3.0], [0.0, 0.5]])}
+    ppp = abstract.prop2part(dom, props)
+    # smaller input set in the outer strips
+    U = pc.box2poly([[-0.2, 0.2], [-0.2, 0.2]])
+    changed = {
+        k: hybrid.LtiSysDyn(np.eye(2), np.eye(2), Uset=U,
+                            domain=pwa.list_subsys[k].domain)
+        for k in (0, 2)}
+    edited = hybrid.PwaSysDyn(
+        [changed.get(k, s) for k, s in enumerate(pwa.list_subsys)], dom)
+    for conservative in (False, True):
+        ab = abstract.discretize(ppp, pwa, N=1, min_cell_volume=0.3,
+                                 conservative=conservative)
+        ab2 = abstract.update_abstraction(ab, changed_subsystems=changed)
+        assert ab2.ppp.is_partition()
+        assert_update_reuses(ab, ab2, lambda i: ab._ppp2sys[i] in changed)
+        fresh = abstract.discretize(ppp, edited, N=1, min_cell_volume=0.3,
+                                    conservative=conservative)
+        assert_same_maps(ab2, fresh)
+    # move a proposition, conservative
+    c = pc.box2poly([[0.0, 3.0], [0.0, 1.0]])
+    ab3 = abstract.update_abstraction(ab, changed_props={'c': c})
+    assert ab3.ppp.is_partition()
+    old_c = props['c']
+    assert_update_reuses(
+        ab, ab3, lambda i: any(
+            pc.is_fulldim(ab.ppp.regions[i].intersect(x))
+            for x in (old_c, c)))
+    props['c'] = c
+    fresh = abstract.discretize(
+        abstract.prop2part(dom, props), pwa, N=1, min_cell_volume=0.3,
+        conservative=True)
+    assert_same_maps(ab3, fresh)
+
+
+def test_discretize_lazy():
+    dom = pc.box2poly([[0.0, 10.0], [0.0, 20.0]])
+    ppp = define_partition(dom)
+    sys = define_dynamics(dom)
+    specs = spec.GRSpec(sys_prog=['a'])
+    assert any('a' in r.props for r in ppp)
+    assert not all('a' in r.props for r in ppp)
+    calls = list()
+
+    def synthesize(option, specs, sys=None, **kw):
+        # states checked so far are those with transitions
+        calls.append([sys.node[u]['a'] for u in sys if sys.successors(u)])
+        if len(calls) == realizable_at:
+            return 'ctrl'
+        return None
+    orig = synth.synthesize
+    synth.synthesize = synthesize
+    try:
+        # stops at success
+        realizable_at = 2
+        ab, ctrl = abstract.discretize_lazy(
+            ppp, sys, specs, N=1, min_cell_volume=10.0, max_rounds=5)
+        assert ctrl == 'ctrl'
+        assert len(calls) == 2
+        first, second = calls
+        # seeds are the cells labeled with 'a'
+        assert first
+        assert all(first), first
+        assert len(second) > len(first)
+        assert not all(second)
+        # stops at max_rounds
+        calls[:] = list()
+        realizable_at = None
+        ab, ctrl = abstract.discretize_lazy(
+            ppp, sys, specs, N=1, min_cell_volume=10.0, max_rounds=1)
+        assert ctrl is None
+        assert len(calls) == 1
+    finally:
+        synth.synthesize = orig
+
+
+def strip_partition(step):
+    """Return four unit cells labeled a, b, c, d from right to left."""
+    dom = pc.box2poly([[0.0, 4.0], [0.0, 1.0]])
+    p = dict()
+    p['a'] = pc.box2poly([[3.0, 4.0], [0.0, 1.0]])
+    p['b'] = pc.box2poly([[2.0, 3.0], [0.0, 1.0]])
+    p['c'] = pc.box2poly([[1.0, 2.0], [0.0, 1.0]])
+    p['d'] = pc.box2poly([[0.0, 1.0], [0.0, 1.0]])
+    ppp = abstract.prop2part(dom, p)
+    # stays or moves leftwards by at most step
+    U = pc.box2poly([[-step, 0.0], [-0.1, 0.1]])
+    sys = hybrid.LtiSysDyn(np.eye(2), np.eye(2), Uset=U, domain=dom)
+    return ppp, sys
+
+
+def checked_props(ab):
+    """Return the propositions of cells with outgoing transitions."""
+    props = set()
+    for u in ab.ts:
+        if ab.ts.successors(u):
+            props.update(ab.ppp[u].props)
+    return props
+
+
+def test_discretize_lazy_unreachable():
+    ppp, sys = strip_partition(0.6)
+    specs = spec.GRSpec(sys_prog=['c'])
+    calls = list()
+
+    def synthesize(option, specs, sys=None, **kw):
+        calls.append(option)
+        return None
+    orig = synth.synthesize
+    synth.synthesize = synthesize
+    try:
+        ab, ctrl = abstract.discretize_lazy(
+            ppp, sys, specs, N=1, min_cell_volume=0.1, max_rounds=5)
+    finally:
+        synth.synthesize = orig
+    assert ctrl is None
+    # c, then d, then nothing more is reachable
+    assert len(calls) == 2, calls
+    assert checked_props(ab) == {'c', 'd'}, checked_props(ab)
+    # c is split where it reaches d, but a and b are
+    # adjacent cells that are never reached, so never refined
+    cells = [r for r in ab.ppp if 'c' in r.props]
+    assert len(cells) > 1, cells
+    for p in ('a', 'b'):
+        cells = [r for r in ab.ppp if p in r.props]
+        assert len(cells) == 1, cells
+        (r,) = cells
+        assert r == ppp.prop_regions[p]
+
+
+def test_discretize_lazy_counterexamples():
+    from tulip.interfaces import jtlv
+    ppp, sys = strip_partition(1.2)
+    specs = spec.GRSpec(sys_prog=['a || c'])
+    # cells are not split, so the indices are those of ppp
+    losing = [i for i, r in enumerate(ppp) if 'c' in r.props]
+    calls = list()
+
+    def synthesize(spec, **kw):
+        calls.append(spec)
+        return [dict(loc=i) for i in losing]
+    orig = jtlv.synthesize
+    jtlv.synthesize = synthesize
+    try:
+        ab, ctrl = abstract.discretize_lazy(
+            ppp, sys, specs, solver='jtlv',
+            N=1, min_cell_volume=10.0, max_rounds=5)
+    finally:
+        jtlv.synthesize = orig
+    assert ctrl is None
+    assert len(ab.ppp) == len(ppp)
+    assert len(calls) == 2, calls
+    # b is reachable from a, but a is not losing
+    assert checked_props(ab) == {'a', 'c', 'd'}, checked_props(ab)
+
+
 if __name__ == '__main__':
     test_abstract_the_dynamics()
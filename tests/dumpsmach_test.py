@@ -2,7 +2,7 @@
 """Tests for the export mechanisms of tulip.dumpsmach."""
 import networkx as nx
 from nose.tools import assert_raises
-from tulip import spec, synth, dumpsmach
+from tulip import spec, synth, transys, dumpsmach
 
 
 class basic_test:
@@ -54,3 +54,58 @@ def test_nx():
     # dead-end
     with assert_raises(Exception):
         m.move(a=1, b=0)
+
+
+def test_nx_table():
+    g = nx.DiGraph()
+    g.inputs = {'a': '...', 'b': '...'}
+    g.outputs = {'c': '...', 'd': '...'}
+    g.add_edge('Sinit', 0, a=0, b=0, c=0, d='on')
+    g.add_edge(0, 1, a=0, b=1, c=0, d='off')
+    g.add_edge(1, 2, a=1, b=0, c=1, d='off')
+    exec dumpsmach.python_table(g, classname='Machine', start='Sinit')
+    m = Machine()
+    out = m.move(a=0, b=0)
+    assert out == dict(c=0, d='on')
+    out['c'] = 1
+    out = m.move(a=0, b=1)
+    assert out == dict(c=0, d='off')
+    with assert_raises(ValueError):
+        m.move(a=1, b=1)
+    out = m.move(a=1, b=0)
+    assert out == dict(c=1, d='off')
+    # dead-end
+    with assert_raises(Exception):
+        m.move(a=1, b=0)
+    # one input and no outputs
+    g = nx.DiGraph()
+    g.inputs = {'a': '...'}
+    g.outputs = dict()
+    g.add_edge(0, 0, a=1)
+    exec dumpsmach.python_table(g, classname='Machine', start=0)
+    assert Machine().move(1) == dict()
+    # every input needs a value
+    g.add_edge(0, 1)
+    with assert_raises(ValueError):
+        dumpsmach.python_table(g)
+
+
+def test_table_as_case():
+    m = transys.MealyMachine()
+    m.inputs.update(x=(0, 3), y=(0, 1))
+    m.outputs.update(z=(0, 2))
+    m.add_nodes_from(['Sinit'] + range(5))
+    m.initial_nodes.add('Sinit')
+    m.add_edge('Sinit', 0, x=0, y=0, z=0)
+    for u in xrange(5):
+        for x in xrange(4):
+            for y in xrange(2):
+                m.add_edge(u, (u + x * y + 1) % 5, x=x, y=y, z=(u + x) % 3)
+    exec dumpsmach.python_case(m, classname='Case')
+    exec dumpsmach.python_table(m, classname='Table')
+    a = Case()
+    b = Table()
+    inputs = [(0, 0), (3, 1), (2, 1), (1, 0), (3, 0), (0, 1), (2, 1)]
+    for x, y in inputs:
+        assert a.move(x=x, y=y) == b.move(x=x, y=y)
+        assert a.state == b.state
@@ -4,6 +4,7 @@ import logging
 logging.basicConfig(level=logging.ERROR)
 logging.getLogger('ltl_parser_log').setLevel(logging.WARNING)
 import nose.tools as nt
+import numpy as np
 from tulip.spec.form import LTL, GRSpec, replace_dependent_vars
 
 
@@ -140,6 +141,26 @@ def test_compile_init():
     assert not eval(code, d)
 
 
+def test_compile_init_vectorized():
+    env_vars = {'x': (0, 3), 'b': 'boolean'}
+    sys_vars = {'w': (0, 3)}
+    env_init = ['(x < 2) & !b']
+    sys_init = ['(w = x + 1) -> b']
+    spc = GRSpec(
+        env_vars=env_vars, sys_vars=sys_vars,
+        env_init=env_init, sys_init=sys_init)
+    code = spc.compile_init(no_str=True, vectorized=True)
+    x = np.array([0, 2, 1, 1])
+    b = np.array([False, False, False, True])
+    w = np.array([1, 3, 0, 2])
+    r = eval(code, {'numpy': np}, dict(x=x, b=b, w=w))
+    assert r.tolist() == [False, True, True, True], r
+    # agrees with the scalar expression
+    code = spc.compile_init(no_str=True)
+    for i, d in enumerate(zip(x.tolist(), b.tolist(), w.tolist())):
+        assert bool(eval(code, dict(zip('xbw', d)))) == r[i]
+
+
 def test_replace_dependent_vars():
     sys_vars = {'a': 'boolean', 'locA': (0, 4)}
     sys_safe = ['!a', 'a & (locA = 3)']
@@ -150,3 +171,45 @@ def test_replace_dependent_vars():
         '[](( ! ( ( locA = 0 ) | ( locA = 2 ) ) )) && '
         '[](( ( ( locA = 0 ) | ( locA = 2 ) ) & ( locA = 3 ) ))')
     assert str(spc) == correct_result
+
+
+def test_ast_clauses():
+    """ASTs are cached, and not parsed again."""
+    from tulip.spec import ast, parser
+    tree = parser.parse('(x = "a") -> X(x = "b")')
+    s = GRSpec(sys_vars={'x': ['a', 'b']}, sys_safety=[tree],
+               sys_init=ast.nodes.Comparator(
+                   '=', ast.nodes.Var('x'), ast.nodes.Str('a')))
+    f = s.sys_safety[0]
+    assert s.ast(f) is tree
+    assert s.sys_init == ['( x = "a" )']
+    # flattened formulas can be parsed again
+    assert parser.parse(f).flatten() == f
+
+    class Parser(object):
+        def parse(self, formula):
+            raise AssertionError('parsed: ' + formula)
+
+    s.parser = Parser()
+    g = s | GRSpec(env_vars={'y'})
+    g.parser = s.parser
+    assert g.ast(f) is tree
+    g.str_to_int()
+    assert g._bool_int[f] == '( ( x = 0 ) -> ( X ( x = 1 ) ) )'
+
+
+def test_ast_clauses_check_identifiers():
+    """ASTs are checked for undefined identifiers."""
+    from tulip.spec import parser
+    tree = parser.parse('x & y')
+    s = GRSpec(sys_vars={'x'}, sys_safety=[tree])
+    with nt.assert_raises(ValueError):
+        s.ast(s.sys_safety[0])
+    # defined in the union
+    g = s | GRSpec(env_vars={'y'})
+    assert g.ast(g.sys_safety[0]) is tree
+    g.str_to_int()
+    s = GRSpec(sys_vars={'x': ['a', 'b']},
+               sys_init=[parser.parse('x = "c"')])
+    with nt.assert_raises(Exception):
+        s.str_to_int()
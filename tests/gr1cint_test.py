@@ -7,6 +7,8 @@ logging.basicConfig(level=logging.DEBUG)
 logging.getLogger('tulip.spec.lexyacc').setLevel(logging.WARNING)
 from nose.tools import raises
 import os
+import StringIO
+import xml.etree.ElementTree as ET
 from tulip.spec import GRSpec, translate
 from tulip.interfaces import gr1c
 
@@ -179,6 +181,19 @@ def test_aut_xml2mealy():
     assert len(g) == 3
 
 
+def test_load_aut_xml_file():
+    # duplicate node is ignored
+    i = REFERENCE_AUTXML.index('    <node>')
+    j = REFERENCE_AUTXML.index('</node>') + len('</node>\n')
+    s = REFERENCE_AUTXML[:j] + REFERENCE_AUTXML[i:]
+    g = gr1c.load_aut_xml(StringIO.StringIO(s))
+    assert len(g) == 3
+    assert g.node[2] == dict(state=dict(x=1, y=1), mode=-1, rgrad=-1)
+    assert set(g.edges()) == {(0, 1), (0, 2), (1, 1), (1, 2), (2, 1), (2, 0)}
+    h = gr1c.load_aut_xml(ET.fromstring(REFERENCE_AUTXML))
+    assert h.nodes(data=True) == g.nodes(data=True)
+
+
 @raises(ValueError)
 def synth_init_illegal_check(init_option):
     spc = GRSpec()
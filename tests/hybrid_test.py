@@ -295,3 +295,80 @@ class SwitchedSysDyn_test:
         assert(switched2.time_semantics == 'sampled')
         assert(switched1.timestep == .1)
         assert(switched2.timestep == .1)
+
+
+class simulate_test:
+    """Test batch simulation of hybrid systems."""
+    def setUp(self):
+        A = np.eye(2)
+        B = np.eye(2)
+        E = np.array([[1.0], [0.0]])
+        K = np.array([[0.0], [1.0]])
+        Uset = pc.box2poly([[-1.0, 1.0], [-1.0, 1.0]])
+        Wset = pc.box2poly([[-0.1, 0.1]])
+        domain0 = pc.box2poly([[0.0, 2.0], [0.0, 2.0]])
+        domain1 = pc.box2poly([[2.0, 4.0], [0.0, 2.0]])
+        self.lti = hybrid.LtiSysDyn(A, B, E, K, Uset, Wset, domain0)
+        lti1 = hybrid.LtiSysDyn(2 * A, B, Uset=Uset, domain=domain1)
+        self.pwa = hybrid.PwaSysDyn([self.lti, lti1],
+                                    domain0.union(domain1))
+
+    def tearDown(self):
+        self.lti = None
+        self.pwa = None
+
+    def test_lti_step(self):
+        x = np.array([[0.5, 0.5], [1.0, 0.0]])
+        u = np.array([[0.1, 0.2], [0.0, 0.0]])
+        d = np.array([[0.05], [-0.1]])
+        x_next = self.lti.step(x, u, d)
+        expected = np.array([[0.65, 1.7], [0.9, 1.0]])
+        assert np.allclose(x_next, expected)
+
+    def test_lti_simulate(self):
+        x0 = np.zeros([5, 2])
+        u = np.zeros([3, 5, 2])
+        x = self.lti.simulate(x0, u, seed=0)
+        assert x.shape == (4, 5, 2)
+        # disturbance acts on first coordinate only
+        assert np.allclose(x[:, :, 1], np.arange(4)[:, np.newaxis])
+        bound = 0.1 * np.arange(1, 4)[:, np.newaxis]
+        assert np.all(np.abs(x[1:, :, 0]) <= bound)
+        x2 = self.lti.simulate(x0, u, seed=0)
+        assert np.allclose(x, x2)
+
+    def test_pwa_find_subsystem(self):
+        x = np.array([[1.0, 1.0], [3.0, 1.0], [5.0, 1.0]])
+        idx = self.pwa.find_subsystem(x)
+        assert list(idx) == [0, 1, -1]
+
+    def test_pwa_step(self):
+        x = np.array([[1.0, 0.5], [3.0, 0.5]])
+        u = np.zeros([2, 2])
+        d = np.zeros([2, 1])
+        x_next, idx = self.pwa.step(x, u, d)
+        assert list(idx) == [0, 1]
+        assert np.allclose(x_next, [[1.0, 1.5], [6.0, 1.0]])
+
+    @raises(ValueError)
+    def test_pwa_step_outside(self):
+        self.pwa.step(np.array([[5.0, 1.0]]), np.zeros([1, 2]))
+
+    def test_switched_simulate(self):
+        lti = hybrid.LtiSysDyn(np.eye(2), np.eye(2),
+                               Uset=self.lti.Uset,
+                               domain=self.pwa.domain)
+        still = hybrid.PwaSysDyn([lti], self.pwa.domain)
+        hyb = hybrid.SwitchedSysDyn(
+            disc_domain_size=(1, 2),
+            dynamics={(0, 0): self.pwa, (0, 1): still},
+            cts_ss=self.pwa.domain)
+        x0 = np.array([[0.5, 0.0], [2.5, 0.0]])
+        u = np.zeros([2, 2, 2])
+        modes = [(0, 1), [(0, 0), (0, 1)]]
+        d = np.zeros([2, 2, 1])
+        x, idx = hyb.simulate(x0, u, modes, d)
+        assert x.shape == (3, 2, 2)
+        assert np.allclose(x[1], x0)
+        assert np.allclose(x[2], [[0.5, 1.0], [2.5, 0.0]])
+        assert idx.tolist() == [[0, 0], [0, 0]]
@@ -0,0 +1,69 @@
+"""
+Tests for the tulip.interfaces.strategy module.
+"""
+from nose.tools import assert_raises
+import networkx as nx
+from tulip.interfaces.strategy import Strategy, StrategyBuilder
+
+
+def graph():
+    g = nx.DiGraph()
+    g.add_node(5, state=dict(x=0, y=1), mode=0)
+    g.add_node(3, state=dict(x=1, y=1), mode=1)
+    g.add_node(7, state=dict(x=1, y=0), mode=0)
+    g.add_edges_from([(5, 3), (5, 7), (3, 3), (7, 5)])
+    g.env_vars = {'x': 'boolean'}
+    g.sys_vars = {'y': 'boolean'}
+    return g
+
+
+def test_view():
+    g = graph()
+    h = Strategy.from_networkx(g)
+    assert len(h) == 3
+    assert h
+    assert 5 in h
+    assert 4 not in h
+    assert 'a' not in h
+    assert set(h) == {3, 5, 7}
+    assert h.variables == ['x', 'y']
+    assert h.states.shape == (3, 2)
+    assert h.node[3] == dict(state=dict(x=1, y=1), mode=1)
+    assert dict(h.nodes(data=True)) == dict(g.nodes(data=True))
+    assert set(h.successors_iter(5)) == {3, 7}
+    assert set(h.edges()) == set(g.edges())
+    assert h.number_of_edges() == 4
+    assert h.has_edge(7, 5)
+    assert not h.has_edge(5, 5)
+    assert h.env_vars == g.env_vars
+    assert_raises(KeyError, h.node.__getitem__, 4)
+    g2 = h.to_networkx()
+    assert dict(g2.nodes(data=True)) == dict(g.nodes(data=True))
+    assert set(g2.edges()) == set(g.edges())
+    assert g2.sys_vars == g.sys_vars
+    # values are python integers
+    assert type(h.node[5]['state']['x']) is int
+    assert all(type(u) is int for u in h)
+
+
+def test_contiguous_ids():
+    b = StrategyBuilder()
+    b.add_node(0, dict(x=2), [1])
+    b.add_node(1, dict(x=3), [0, 1])
+    h = b.build()
+    assert h._rows is None
+    assert h.state(1) == dict(x=3)
+    assert h.successors(1) == [0, 1]
+    assert 2 not in h
+    assert -1 not in h
+
+
+def test_builder_errors():
+    b = StrategyBuilder()
+    b.add_node(0, dict(x=2), [1])
+    assert_raises(ValueError, b.build)
+    assert_raises(ValueError, b.add_node, 1, dict(x=2, y=0), [])
+    h = StrategyBuilder().build()
+    assert not h
+    assert len(h) == 0
+    assert h.edges() == []
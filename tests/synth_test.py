@@ -4,11 +4,16 @@ Tests for the tulip.synth module.
 import logging
 logging.getLogger('tulip').setLevel(logging.ERROR)
 logging.getLogger('tulip.interfaces.gr1c').setLevel(logging.DEBUG)
+import os
+import shutil
+import tempfile
 from nose.tools import assert_raises
 import networkx as nx
 import numpy as np
 from scipy import sparse as sp
 from tulip import spec, synth, transys
+from tulip.interfaces import cache
+from tulip.interfaces.strategy import StrategyBuilder
 from tulip.transys import TransitionSystem as FTS
 
 
@@ -572,6 +577,93 @@ def test_var_name_conflicts():
     conversion_raises(synth.env_to_spec, sys)
 
 
+def _labeled_ts(nodes, owner):
+    ts = FTS()
+    ts.owner = owner
+    ts.vars = dict(p='boolean', e='boolean', s='boolean')
+    ts.env_vars.add('e')
+    a, b, c, d, x, y = nodes
+    ts.add_nodes_from([a, b, c], p=True)
+    ts.add_nodes_from([d, x], p=False)
+    ts.add_node(y)
+    ts.add_edges_from([(a, b), (a, c), (b, b), (b, c)], e=True, s=False)
+    ts.add_edges_from([(c, d), (d, x), (x, d)], s=True)
+    ts.add_edge(c, a, e=False, s=True)
+    ts.add_edge(x, a, e=False, s=True)
+    ts.initial_nodes.update([a, b])
+    return ts
+
+
+def _eval(u, now, nxt):
+    """Evaluate formula tree `u` over valuations of unprimed and
+    primed variables."""
+    if u.type == 'var':
+        return now[u.value]
+    if u.type == 'num':
+        return int(u.value)
+    if u.type in {'str', 'bool'}:
+        return {'True': True, 'False': False}.get(u.value, u.value)
+    if u.operator == 'X':
+        return _eval(u.operands[0], nxt, None)
+    x = [_eval(v, now, nxt) for v in u.operands]
+    return {
+        '!': lambda: not x[0],
+        '&': lambda: x[0] and x[1],
+        '|': lambda: x[0] or x[1],
+        '->': lambda: (not x[0]) or x[1],
+        '<->': lambda: x[0] == x[1],
+        '=': lambda: x[0] == x[1],
+        '<=': lambda: x[0] <= x[1],
+        '>=': lambda: x[0] >= x[1]}[u.operator]()
+
+
+def _valuations(nodes):
+    for loc in nodes:
+        for p, e, s in [(p, e, s) for p in (0, 1)
+                        for e in (0, 1) for s in (0, 1)]:
+            yield dict(loc=loc, p=bool(p), e=bool(e), s=bool(s))
+
+
+def test_sys_to_spec_grouped():
+    """Grouped encoding is equivalent to flat, and smaller."""
+    for nodes in [range(6), ['s' + str(i) for i in xrange(6)]]:
+        for owner in ['sys', 'env']:
+            ts = _labeled_ts(nodes, owner)
+            flat = synth.sys_to_spec(ts, 'loc', False, receptive=True)
+            grouped = synth.sys_to_spec(
+                ts, 'loc', False, receptive=True, encoding='grouped')
+            size = synth.spec_size(grouped)
+            flat_size = synth.spec_size(flat)
+            assert size['sys_safety'][1] <= flat_size['sys_safety'][1]
+            assert flat.sys_vars == grouped.sys_vars
+            assert flat.env_vars == grouped.env_vars
+            for part in ['env_init', 'sys_init']:
+                f, g = [spec.parser.parse(' & '.join(
+                    '({c})'.format(c=c) for c in getattr(x, part)) or
+                    'True') for x in (flat, grouped)]
+                for now in _valuations(nodes):
+                    assert _eval(f, now, None) == _eval(g, now, None)
+            for part in ['env_safety', 'sys_safety']:
+                f, g = [spec.parser.parse(' & '.join(
+                    '({c})'.format(c=c) for c in getattr(x, part)) or
+                    'True') for x in (flat, grouped)]
+                for now in _valuations(nodes):
+                    for nxt in _valuations(nodes):
+                        assert _eval(f, now, nxt) == _eval(g, now, nxt)
+    # ranges of integer nodes
+    ts = _labeled_ts(range(6), 'sys')
+    grouped = synth.sys_to_spec(ts, 'loc', False, encoding='grouped')
+    assert grouped.sys_init[0] == '( loc <= 1 )'
+    assert ('( ( ( X loc ) >= 1 ) & ( ( X loc ) <= 2 ) )' in
+            grouped.sys_safety[0])
+    # no parsing needed
+    for part in grouped._parts:
+        for f in getattr(grouped, part):
+            assert f in grouped._ast
+    assert_raises(ValueError, synth.sys_to_spec, ts, 'loc', False,
+                  encoding='unknown')
+
+
 def test_strategy_to_mealy():
     # strategy
     g = nx.MultiDiGraph()
@@ -591,6 +683,111 @@ def test_strategy_to_mealy():
     assert mealy is not None
 
 
+def test_strategy_to_mealy_init():
+    # nodes 0 and 2 have the same values,
+    # so only node 0 is an initial reaction
+    b = StrategyBuilder()
+    b.add_node(5, dict(x=0, y=1, z=0), [6])
+    b.add_node(6, dict(x=1, y=0, z=1), [5, 7])
+    b.add_node(7, dict(x=0, y=1, z=0), [6])
+    b.add_node(8, dict(x=1, y=1, z=1), [8])
+    g = b.build()
+    spc = spec.GRSpec(
+        env_vars={'x': 'boolean'},
+        sys_vars={'y': (0, 1), 'z': ['a', 'b']},
+        sys_init=['!x & (y = 1) & (z = "a")'])
+    spc.str_to_int()
+    mealy = synth.strategy2mealy(g, spc)
+    assert set(mealy.successors('Sinit')) == {5}, mealy.successors('Sinit')
+    edges = mealy.edges(data=True)
+    assert (5, 6, dict(x=1, y=0, z='b')) in edges, edges
+    assert (6, 7, dict(x=0, y=1, z='a')) in edges, edges
+    assert ('Sinit', 5, dict(x=0, y=1, z='a')) in edges, edges
+    assert len(edges) == 6
+    # same machine from networkx graph
+    h = synth.strategy2mealy(g.to_networkx(), spc)
+    assert set(h.successors('Sinit')) == {5}
+    assert sorted(h.edges(data=True)) == sorted(edges)
+
+
+def test_synthesize_cache():
+    g = nx.DiGraph()
+    g.add_node(0, state=dict(x=0, y=1), mode=0, rgrad=1)
+    g.add_node(1, state=dict(x=1, y=0), mode=0, rgrad=0)
+    g.add_edges_from([(0, 1), (1, 0), (1, 1)])
+    g.env_vars = {'x': (0, 1)}
+    g.sys_vars = {'y': (0, 1)}
+    spc = spec.GRSpec(
+        env_vars={'x': (0, 1)}, sys_vars={'y': (0, 1)},
+        env_init=['x = 0'], sys_init=['y = 1'],
+        sys_safety=['y\' != x\''])
+    path = tempfile.mkdtemp()
+    try:
+        c = cache.SynthesisCache(path)
+        key = c.key('gr1c', spc, operation='synthesize')
+        assert key != c.key('gr1c', spc, operation='realizable')
+        assert key != c.key('jtlv', spc, operation='synthesize')
+        assert_raises(KeyError, c.load, key)
+        c.dump(key, g)
+        h = c.load(key)
+        assert set(h.edges()) == set(g.edges())
+        assert h.node[1] == g.node[1]
+        assert h.env_vars == g.env_vars
+        # hit: gr1c is not called
+        mealy = synth.synthesize('gr1c', spc, cache=c)
+        assert isinstance(mealy, transys.MealyMachine)
+        assert len(mealy) == 3
+        c.dump(c.key('gr1c', spc, operation='realizable'), False)
+        assert synth.is_realizable('gr1c', spc, cache=c) is False
+        assert c.stats['hits'] == 3
+        assert c.stats['misses'] == 1
+        # least recently used is evicted
+        os.utime(c._fname(key), (0, 0))
+        c.max_size = c.size()
+        other = c.key('gr1c', spc, operation='synthesize', init_option=1)
+        c.dump(other, None)
+        assert c.stats['evictions'] == 1
+        assert_raises(KeyError, c.load, key)
+        assert c.load(other) is None
+        c.clear()
+        assert c.size() == 0
+    finally:
+        shutil.rmtree(path)
+
+
+def test_synthesize_cache_miss():
+    from tulip.interfaces import gr1c
+    g = nx.DiGraph()
+    g.add_node(0, state=dict(x=0, y=1))
+    g.add_edge(0, 0)
+    spc = spec.GRSpec(
+        env_vars={'x': (0, 1)}, sys_vars={'y': (0, 1)},
+        env_init=['x = 0'], sys_init=['y = 1'])
+    inputs = list()
+
+    def solver(specs, translated=None):
+        inputs.append(translated.read())
+        return g
+
+    path = tempfile.mkdtemp()
+    f = gr1c.synthesize
+    gr1c.synthesize = solver
+    try:
+        c = cache.SynthesisCache(path)
+        synth.synthesize('gr1c', spc, cache=c)
+        # the input that was hashed is passed to the solver
+        assert inputs == [spec.translate(spc, 'gr1c')]
+        key, x = c.key_and_input('gr1c', spc, operation='synthesize')
+        x.close()
+        assert key == c.key('gr1c', spc, operation='synthesize')
+        synth.synthesize('gr1c', spc, cache=c)
+        assert len(inputs) == 1
+        assert c.stats == dict(hits=1, misses=1, stores=1, evictions=0)
+    finally:
+        gr1c.synthesize = f
+        shutil.rmtree(path)
+
+
 def test_determinize_machine_init():
     mach = transys.MealyMachine()
     mach.add_inputs({'a': {0, 1}})
@@ -1,7 +1,7 @@
 import logging
 logging.basicConfig(level=logging.DEBUG)
 logging.getLogger('tulip.ltl_parser_log').setLevel(logging.ERROR)
-#import nose.tools as nt
+import nose.tools as nt
 #from tulip.spec.parser import parse
 from tulip import spec
 from tulip.spec import translation as ts
@@ -23,3 +23,37 @@ def test_translate_ast_to_gr1c():
     print(r.flatten())
     assert r.flatten() == ("( ( loc = 1 ) -> "
                            "(  ( ( env_alice' = 0 ) & ( env_bob' = 1 ) ) ) )")
+
+
+def test_write():
+    s = spec.GRSpec(env_vars={'x': (0, 3)},
+                    sys_vars={'y': 'boolean'},
+                    env_init=['x = 0'],
+                    env_prog=['x = 3', 'x = 1'],
+                    sys_safety=["y' <-> (x' = 1)"],
+                    sys_prog=['y'])
+    for lang in ('gr1c', 'slugs'):
+        chunks = list()
+        f = _Sink(chunks)
+        ts.write(s, lang, f)
+        assert len(chunks) > 1
+        assert ''.join(chunks) == ts.translate(s, lang)
+    f = _Sink(list())
+    nt.assert_raises(ValueError, ts.write, s, 'jtlv', f)
+
+
+class _Sink(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def write(self, s):
+        self.chunks.append(s)
+
+
+def test_translate_str_to_python():
+    from tulip.spec.parser import parse
+    t = parse('loc = "s2"')
+    r = ts.translate_ast(t, 'python').flatten()
+    assert r == '( loc == "s2" )', r
+    assert eval(r, {'loc': 's2'})
+    assert not eval(r, {'loc': 's0'})
@@ -3,6 +3,8 @@
 import logging
 logging.basicConfig()
 logger = logging.getLogger(__name__)
+import copy
+import nose.tools as nt
 from tulip.transys import machines
 
 
@@ -39,3 +41,88 @@ def test_strip_ports():
         assert u == x
         assert v == y
         assert d == b
+
+
+def _counter(n, copies):
+    """Return machine that outputs parity of ticks, with copies of states."""
+    mealy = machines.MealyMachine()
+    mealy.inputs.update({'tick': {0, 1}})
+    mealy.outputs.update({'odd': {0, 1}})
+    mealy.add_nodes_from(xrange(n * copies))
+    mealy.initial_nodes.add(0)
+    for c in xrange(copies):
+        for i in xrange(n):
+            u = c * n + i
+            # next copy on tick, same copy otherwise
+            v = ((c + 1) % copies) * n + (i + 1) % n
+            mealy.add_edge(u, v, tick=1, odd=(i + 1) % 2)
+            mealy.add_edge(u, u, tick=0, odd=i % 2)
+    return mealy
+
+
+def test_minimize():
+    mealy = _counter(4, 3)
+    m = machines.minimize(mealy)
+    assert len(m) == 2, m.nodes()
+    assert m.initial_nodes == {0}
+    assert len(m.edges()) == 4
+    assert m.inputs == mealy.inputs
+    assert m.outputs == mealy.outputs
+    ticks = [1, 1, 0, 1, 0, 0, 1, 1, 1]
+    _, out = machines.guided_run(mealy, input_sequences=dict(tick=ticks))
+    states, out_m = machines.guided_run(m, input_sequences=dict(tick=ticks))
+    assert out == out_m
+    assert set(states).issubset(m)
+    # state labels are preserved
+    mealy.state_vars.update({'c': {0, 1, 2}})
+    for u in mealy:
+        mealy.node[u]['c'] = u // 4
+    m = machines.minimize(mealy)
+    assert len(m) == 6, m.nodes()
+    # incomplete: an edge missing
+    mealy = _counter(4, 1)
+    mealy.remove_edge(3, 3)
+    m = machines.minimize(mealy)
+    assert len(m) == 4, m.nodes()
+
+
+def test_minimize_nondeterministic():
+    mealy = _counter(2, 1)
+    mealy.add_edge(0, 1, tick=0, odd=0)
+    nt.assert_raises(ValueError, machines.minimize, mealy)
+
+
+def test_reaction_index():
+    mealy = _counter(2, 1)
+    assert mealy.reaction(0, dict(tick=1)) == (1, dict(odd=1))
+    assert mealy.reaction(1, dict(tick=0)) == (1, dict(odd=1))
+    nt.assert_raises(Exception, mealy.reaction, 0, dict(tick=2))
+    nt.assert_raises(Exception, mealy.reaction, 0, dict(tick=1, other=0))
+    # mutation rebuilds the index
+    mealy.remove_edge(0, 1)
+    nt.assert_raises(Exception, mealy.reaction, 0, dict(tick=1))
+    mealy.add_edge(0, 0, tick=1, odd=0)
+    assert mealy.reaction(0, dict(tick=1)) == (0, dict(odd=0))
+    mealy.add_edge(0, 1, tick=1, odd=1)
+    nt.assert_raises(Exception, mealy.reaction, 0, dict(tick=1))
+    mealy.remove_node(1)
+    assert mealy.reaction(0, dict(tick=1)) == (0, dict(odd=0))
+    # outputs changed in place are seen
+    for _, _, d in mealy.edges_iter(data=True):
+        d.pop('odd')
+    assert mealy.reaction(0, dict(tick=1)) == (0, dict())
+    # so are new ports
+    mealy.inputs['reset'] = {0, 1}
+    nt.assert_raises(Exception, mealy.reaction, 0, dict(tick=1, reset=0))
+    assert mealy.reaction(0, dict(tick=1)) == (0, dict())
+    # copies are independent
+    mealy = _counter(2, 1)
+    mealy.reaction(0, dict(tick=1))
+    other = copy.deepcopy(mealy)
+    other.remove_edge(0, 1)
+    assert mealy.reaction(0, dict(tick=1)) == (1, dict(odd=1))
+    nt.assert_raises(Exception, other.reaction, 0, dict(tick=1))
+    states, out = machines.random_run(mealy, N=5)
+    assert len(states) == 5
+    assert out['odd'] == [mealy.reaction(u, dict(tick=0))[1]['odd']
+                          for u in states]
@@ -53,10 +53,11 @@ except ImportError:
 
 # avoid shadowing modules
 from .discretization import (
-    discretize, discretize_switched,
+    discretize, discretize_lazy, update_abstraction,
+    discretize_switched,
     multiproc_discretize_switched
 )
-from .feasible import is_feasible, solve_feasible
+from .feasible import is_feasible, solve_feasible, sample_feasible
 
 from .prop2partition import (
     prop2part, part2convex,
@@ -64,4 +65,11 @@ from .prop2partition import (
     PropPreservingPartition, PPP
 )
 
-from .find_controller import get_input, find_discrete_state
+from .find_controller import (
+    get_input, find_discrete_state,
+    InputWorkspace, RecedingHorizonInput)
+
+from .storage import (
+    save_partition, load_partition,
+    save_abstraction, load_abstraction
+)
@@ -0,0 +1,333 @@
+# Copyright (c) 2014 by California Institute of Technology
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the California Institute of Technology nor
+#    the names of its contributors may be used to endorse or promote
+#    products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL CALTECH
+# OR THE CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+"""
+Selection of LP and QP solvers, with statistics of their use.
+
+The linear programs that TuLiP solves, via L{lpsolve},
+and the quadratic programs of L{find_controller}
+are dispatched to the solvers selected with L{select}.
+The linear programs that C{polytope} solves internally
+(Chebyshev balls, bounding boxes, redundancy removal, ...)
+are dispatched too, only if requested with
+C{select(route_polytope=True)}, because this replaces
+C{polytope.polytope.lpsolve} for the whole process.
+
+Each solve is recorded under the innermost active call site,
+see L{call_site}, so that the cost of, e.g.,
+L{feasible.solve_feasible} and L{find_controller.get_input}
+can be compared across solvers::
+
+    from tulip.abstract import backend
+    backend.select(lp='highs', route_polytope=True)
+    backend.reset_stats()
+    ab = discretize(ppp, sys)
+    print(backend.report())
+
+LP solvers:
+    - C{'glpk'}: GLPK via C{cvxopt.solvers.lp}
+    - C{'cvxopt'}: the interior point solver of C{cvxopt}
+    - C{'highs'}: HiGHS via C{scipy.optimize.linprog},
+      requires C{scipy >= 1.6}
+    - C{'scipy'}: the default method of C{scipy.optimize.linprog}
+
+QP solvers:
+    - C{'cvxopt'}: C{cvxopt.solvers.qp}
+
+Solvers that report the number of iterations
+(C{cvxopt}, C{scipy}) also add to the iteration totals.
+"""
+from __future__ import absolute_import
+import logging
+logger = logging.getLogger(__name__)
+from functools import wraps
+from timeit import default_timer as timer
+
+import numpy as np
+import polytope as pc
+from cvxopt import matrix, solvers
+# inline imports:
+#
+# from scipy import optimize
+
+LP_SOLVERS = ('glpk', 'cvxopt', 'highs', 'scipy')
+QP_SOLVERS = ('cvxopt', )
+
+# `polytope.polytope.lpsolve`, while replaced by `lpsolve`
+_polytope_lpsolve = None
+_lp_solver = 'glpk' if pc.polytope.lp_solver == 'glpk' else 'scipy'
+_qp_solver = 'cvxopt'
+_options = {'lp': dict(), 'qp': dict()}
+_sites = ['other']
+_stats = dict()
+
+
+def select(lp=None, qp=None, lp_options=None, qp_options=None,
+           route_polytope=None):
+    """Select the solvers to use and their options.
+
+    Options are set once here, not on each call.
+    For C{'glpk'} and C{'cvxopt'} they are passed
+    as C{cvxopt.solvers} options, for C{'highs'} and C{'scipy'}
+    as the C{options} of C{scipy.optimize.linprog}.
+
+    @param lp: LP solver, one of L{LP_SOLVERS}
+    @param qp: QP solver, one of L{QP_SOLVERS}
+    @type lp_options: C{dict}
+    @type qp_options: C{dict}
+    @param route_polytope: if C{True}, then replace
+        C{polytope.polytope.lpsolve} with L{lpsolve},
+        so that the LPs of C{polytope} use the selected solver
+        and are recorded. This affects all users of C{polytope}
+        in the process. If C{False}, then restore the original.
+        If C{None}, then leave as is.
+    @type route_polytope: C{bool}
+    """
+    global _lp_solver, _qp_solver, _polytope_lpsolve
+    if lp is not None:
+        if lp not in LP_SOLVERS:
+            raise ValueError(
+                'unknown LP solver "{s}", available: {a}'.format(
+                    s=lp, a=LP_SOLVERS))
+        if lp == 'highs' and not _has_highs():
+            raise ValueError(
+                'LP solver "highs" needs `scipy >= 1.6`')
+        _lp_solver = lp
+    if qp is not None:
+        if qp not in QP_SOLVERS:
+            raise ValueError(
+                'unknown QP solver "{s}", available: {a}'.format(
+                    s=qp, a=QP_SOLVERS))
+        _qp_solver = qp
+    if lp_options is not None:
+        _options['lp'] = dict(lp_options)
+    if qp_options is not None:
+        _options['qp'] = dict(qp_options)
+    if route_polytope and _polytope_lpsolve is None:
+        _polytope_lpsolve = pc.polytope.lpsolve
+        pc.polytope.lpsolve = lpsolve
+    elif route_polytope is False and _polytope_lpsolve is not None:
+        pc.polytope.lpsolve = _polytope_lpsolve
+        _polytope_lpsolve = None
+    logger.info('LP solver: {lp}, QP solver: {qp}'.format(
+        lp=_lp_solver, qp=_qp_solver))
+
+
+def selected():
+    """Return names of the selected LP and QP solvers.
+
+    @rtype: C{(str, str)}
+    """
+    return _lp_solver, _qp_solver
+
+
+def lpsolve(c, G, h):
+    """Solve C{min c'x s.t. G x <= h} with the selected LP solver.
+
+    Has the same signature and return value as
+    C{polytope.polytope.lpsolve}, which it can replace,
+    see L{select}.
+
+    @return: solution with status as in C{scipy.optimize.linprog}
+    @rtype: C{dict(status=int, x=argmin, fun=min_value)}
+    """
+    t0 = timer()
+    if _lp_solver in ('glpk', 'cvxopt'):
+        result, nit = _cvxopt_lp(c, G, h)
+    else:
+        result, nit = _scipy_lp(c, G, h)
+    _record('lp', timer() - t0, nit)
+    return result
+
+
+def qpsolve(P, q, G, h, initvals=None):
+    """Solve C{min 1/2 x'Px + q'x s.t. G x <= h}.
+
+    @param initvals: initial guess of C{x},
+        used to warm-start the solver
+    @type initvals: 1d C{numpy.ndarray}
+
+    @return: solution with status as in C{scipy.optimize.linprog}
+    @rtype: C{dict(status=int, x=argmin, fun=min_value)}
+    """
+    t0 = timer()
+    P, q, G, h = (np.asarray(x, dtype=float) for x in (P, q, G, h))
+    if initvals is not None:
+        x = np.asarray(initvals, dtype=float).reshape(q.size, 1)
+        # slack of G x <= h, kept in the interior of the cone
+        s = np.maximum(h.reshape(h.size, 1) - G.dot(x), _SLACK_MARGIN)
+        initvals = {'x': matrix(x), 's': matrix(s)}
+    sol = solvers.qp(
+        matrix(P), matrix(q), matrix(G), matrix(h),
+        initvals=initvals, options=_cvxopt_options('qp'))
+    result = dict(
+        status=_CVXOPT_STATUS.get(sol['status'], 4),
+        x=np.array(sol['x']).flatten(),
+        fun=sol['primal objective'])
+    _record('qp', timer() - t0, sol.get('iterations'))
+    return result
+
+
+class call_site(object):
+    """Record solves under C{name}.
+
+    Use as a context manager or as a function decorator::
+
+        with backend.call_site('my_loop'):
+            ...
+
+        @backend.call_site('my_function')
+        def my_function():
+            ...
+
+    Call sites nest: each solve is recorded
+    under the innermost active call site only.
+
+    @type name: str
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        _sites.append(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        _sites.pop()
+        return False
+
+    def __call__(self, f):
+        @wraps(f)
+        def wrapper(*args, **kw):
+            with self:
+                return f(*args, **kw)
+        return wrapper
+
+
+def get_stats():
+    """Return statistics of solves, by call site and problem type.
+
+    @return: C{{site: {'lp' or 'qp': stats}}}, where C{stats} is
+        C{dict(count=int, iterations=int, time=float)},
+        with C{time} the total wall time in seconds.
+    @rtype: C{dict}
+    """
+    return {
+        site: {k: dict(v) for k, v in d.iteritems()}
+        for site, d in _stats.iteritems()}
+
+
+def reset_stats():
+    """Clear the statistics recorded so far."""
+    _stats.clear()
+
+
+def report():
+    """Return table of the statistics recorded so far.
+
+    @rtype: str
+    """
+    s = 'LP solver: {lp}, QP solver: {qp}\n'.format(
+        lp=_lp_solver, qp=_qp_solver)
+    s += '{site:30} {k:4} {n:>10} {it:>12} {t:>10} {avg:>10}\n'.format(
+        site='call site', k='', n='count', it='iterations',
+        t='time [s]', avg='avg [ms]')
+    for site in sorted(_stats):
+        for k, d in sorted(_stats[site].iteritems()):
+            s += (
+                '{site:30} {k:4} {n:>10} {it:>12} '
+                '{t:>10.3f} {avg:>10.3f}\n').format(
+                    site=site, k=k, n=d['count'], it=d['iterations'],
+                    t=d['time'], avg=1e3 * d['time'] / d['count'])
+    return s
+
+
+# smallest slack of a warm start
+_SLACK_MARGIN = 1e-3
+
+_CVXOPT_STATUS = {
+    'optimal': 0,
+    'primal infeasible': 2,
+    'dual infeasible': 3}
+
+
+def _record(kind, t, nit):
+    d = _stats.setdefault(_sites[-1], dict())
+    d = d.setdefault(kind, dict(count=0, iterations=0, time=0.))
+    d['count'] += 1
+    d['time'] += t
+    if nit is not None:
+        d['iterations'] += nit
+
+
+def _cvxopt_options(kind):
+    options = dict(show_progress=False)
+    if kind == 'lp' and _lp_solver == 'glpk':
+        options['glpk'] = dict(msg_lev='GLP_MSG_OFF')
+    options.update(_options[kind])
+    return options
+
+
+def _cvxopt_lp(c, G, h):
+    if _lp_solver == 'glpk':
+        solver = 'glpk'
+    else:
+        solver = None
+    c, G, h = (np.asarray(x, dtype=float) for x in (c, G, h))
+    sol = solvers.lp(
+        c=matrix(c), G=matrix(G), h=matrix(h),
+        A=None, b=None, solver=solver,
+        options=_cvxopt_options('lp'))
+    result = dict(
+        status=_CVXOPT_STATUS.get(sol['status'], 4),
+        x=np.squeeze(sol['x']),
+        fun=sol['primal objective'])
+    return result, sol.get('iterations')
+
+
+def _scipy_lp(c, G, h):
+    from scipy import optimize
+    kw = dict()
+    if _lp_solver == 'highs':
+        kw['method'] = 'highs'
+    sol = optimize.linprog(
+        c, G, np.transpose(h), None, None,
+        bounds=(None, None), options=_options['lp'], **kw)
+    result = dict(status=sol.status, x=sol.x, fun=sol.fun)
+    return result, getattr(sol, 'nit', None)
+
+
+def _has_highs():
+    from distutils.version import LooseVersion
+    import scipy
+    return LooseVersion(scipy.__version__) >= LooseVersion('1.6')
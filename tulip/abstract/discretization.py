@@ -54,12 +54,16 @@ import polytope as pc
 
 from polytope.plot import plot_partition, plot_transition_arrow
 from tulip import transys as trs
-from tulip.transys.labeled_graphs import add_adj
+from tulip.transys.labeled_graphs import add_adj, remove_deadends
 from tulip.hybrid import LtiSysDyn, PwaSysDyn
 
 from .prop2partition import (PropPreservingPartition,
-                             pwa_partition, part2convex)
-from .feasible import is_feasible, solve_feasible
+                             prop2part, pwa_partition, part2convex)
+from . import backend
+from .feasible import (
+    is_feasible, solve_feasible, sample_feasible,
+    reachable_boxes, boxes_hit
+)
 from .plot import plot_ts_on_partition
 
 # inline imports:
@@ -280,6 +284,7 @@ class AbstractPwa(object):
         # ppp2pwa -> ppp2pwa_sys
 
         self.disc_params = disc_params
+        self._cheby_centers = dict()
 
     def __str__(self):
         s = str(self.ppp)
@@ -351,6 +356,30 @@ class AbstractPwa(object):
         subsystem = self.pwa.list_subsys[subsystem_idx]
         return (subsystem_idx, subsystem)
 
+    def cheby_centers(self, region_index):
+        """Return Chebyshev centers of polytopes in indexed region.
+
+        Computed once and cached.
+
+        @param region_index: index in C{ppp.regions}.
+
+        @return: one center per row, in the order of the polytopes
+            of the region (a single row if it is a C{Polytope})
+        @rtype: 2d C{numpy.ndarray}
+        """
+        xc = self._cheby_centers.get(region_index)
+        if xc is None:
+            region = self.ppp.regions[region_index]
+            if len(region) > 0:
+                polys = list(region)
+            else:
+                polys = [region]
+            xc = np.vstack([
+                np.asarray(pc.cheby_ball(p)[1]).flatten()
+                for p in polys])
+            self._cheby_centers[region_index] = xc
+        return xc
+
     def ppp2orig(self, region_index):
         """Return index and region of original partition.
 
@@ -402,32 +431,110 @@ class AbstractPwa(object):
                                color_seed)
         return ax
 
-    def verify_transitions(self):
+    def verify_transitions(self, method='exact', processes=1,
+                           num_samples=20, seed=None):
+        """Check that the transitions of C{ts} are feasible.
+
+        The parameters are taken from C{disc_params}.
+
+        @param method:
+            - C{'exact'}: compute the states of each source cell
+              that can reach the target cell with L{solve_feasible},
+              as L{discretize} does.
+            - C{'sample'}: sample states in each source cell and
+              check reachability of the target cell
+              with one LP per sample, see L{sample_feasible}.
+              This is faster, but it misses small failing subsets.
+              For C{N > 1} it checks open-loop reachability,
+              so it can report transitions that are
+              feasible only in closed loop.
+        @type method: C{'exact'} or C{'sample'}
+
+        @param processes: number of worker processes.
+            If C{None}, then use C{multiprocessing.cpu_count()}.
+        @type processes: C{int}
+
+        @param num_samples: states per cell for C{method='sample'}
+        @param seed: seed for C{method='sample'}
+
+        @return: report with keys:
+            - C{'method'}
+            - C{'num_checked'}: number of transitions checked
+            - C{'failed'}: C{list} of C{dict} with keys
+              C{'from'}, C{'to'} (nodes of C{ts}) and
+              C{'ratio'}: fraction of the volume of the source cell
+              (or of the samples, for C{method='sample'})
+              from which the target cell is reachable
+        @rtype: C{dict}
+        """
+        if method not in ('exact', 'sample'):
+            raise ValueError('unknown method: ' + str(method))
         logger.info('verifying transitions...')
-
-        for from_state, to_state in self.ts.edges_iter():
+        params = {'N', 'closed_loop', 'use_all_horizon', 'max_num_poly'}
+        disc_params = {k:v for k,v in self.disc_params.iteritems()
+                       if k in params}
+        conservative = self.disc_params.get('conservative', False)
+
+        edges = list(self.ts.edges_iter())
+        tasks = list()
+        for k, (from_state, to_state) in enumerate(edges):
             i, from_region = self.ts2ppp(from_state)
             j, to_region = self.ts2ppp(to_state)
 
-            trans_set, sys = self.ppp2trans(i)
-
-            params = {'N', 'close_loop', 'use_all_horizon'}
-            disc_params = {k:v for k,v in self.disc_params.iteritems()
-                           if k in params}
-
-            s0 = solve_feasible(from_region, to_region, sys,
-                                trans_set=trans_set, **disc_params)
-
-            msg = str(i) + ' ---> ' + str(j)
-
-            if not from_region <= s0:
-                logger.error('incorrect transition: ' + msg)
-
-                isect = from_region.intersect(s0)
-                ratio = isect.volume /from_region.volume
-                logger.error('intersection volume: ' + str(ratio) + ' %')
+            if conservative:
+                trans_set = None
+                sys = self.ppp2sys(i)[1]
             else:
+                trans_set, sys = self.ppp2trans(i)
+            if method == 'sample':
+                args = dict(N=disc_params.get('N', 1),
+                            num_samples=num_samples,
+                            seed=None if seed is None else seed + k)
+            else:
+                args = disc_params
+            tasks.append(
+                (method, from_region, to_region, sys, trans_set, args))
+        if processes == 1:
+            ratios = map(_verify_transition, tasks)
+        else:
+            pool = mp.Pool(processes)
+            try:
+                ratios = pool.map(_verify_transition, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+        failed = list()
+        for (from_state, to_state), ratio in zip(edges, ratios):
+            msg = str(from_state) + ' ---> ' + str(to_state)
+            if ratio is None:
                 logger.info('correct transition: ' + msg)
+                continue
+            logger.error('incorrect transition: ' + msg)
+            logger.error('reachable from fraction: ' + str(ratio))
+            failed.append({'from': from_state, 'to': to_state,
+                           'ratio': ratio})
+        return {'method': method, 'num_checked': len(edges),
+                'failed': failed}
+
+def _verify_transition(task):
+    """Return C{None} if transition is feasible, else reachable fraction.
+
+    @param task: C{(method, from_region, to_region, sys, trans_set, args)}
+    """
+    method, from_region, to_region, sys, trans_set, args = task
+    if method == 'sample':
+        ratio = sample_feasible(from_region, to_region, sys,
+                                trans_set=trans_set, **args)
+        if ratio is None or ratio == 1.0:
+            return None
+        return ratio
+    s0 = solve_feasible(from_region, to_region, sys,
+                        trans_set=trans_set, **args)
+    if from_region <= s0:
+        return None
+    isect = from_region.intersect(s0)
+    return isect.volume / from_region.volume
 
 def _plot_abstraction(ab, show_ts, only_adjacent, color_seed):
     if ab.ppp is None or ab.ts is None:
@@ -450,12 +557,13 @@ def _plot_abstraction(ab, show_ts, only_adjacent, color_seed):
 
     return ax
 
+@backend.call_site('discretize')
 def discretize(
     part, ssys, N=10, min_cell_volume=0.1,
     closed_loop=True, conservative=False,
     max_num_poly=5, use_all_horizon=False,
     trans_length=1, remove_trans=False,
-    abs_tol=1e-7,
+    abs_tol=1e-7, prefilter=True,
     plotit=False, save_img=False, cont_props=None,
     plot_every=1
 ):
@@ -488,6 +596,12 @@ def discretize(
     @param remove_trans: if True, remove found transitions between
         non-neighbors.
     @param abs_tol: maximum volume for an "empty" polytope
+    @param prefilter: before solving for the states in cell i
+        that can reach cell j, check whether the bounding box
+        of cell j intersects some box that contains the states
+        reachable from cell i. Skip pairs that fail this check.
+        See L{feasible.may_be_feasible}.
+    @type prefilter: bool
 
     @param plotit: plot partitioning as it evolves
     @type plotit: boolean,
@@ -509,8 +623,582 @@ def discretize(
     min_cell_volume = (min_cell_volume /np.finfo(np.double).eps
         *np.finfo(np.double).eps)
 
+    (part, part2orig, subsys_list,
+     orig_list, orig) = _prepare_partition(part, ssys, conservative)
+    if not conservative:
+        remove_trans = False # already allowed in nonconservative
+
+    # Initialize matrix for pairs to check
+    IJ = part.adj.copy()
+    IJ = IJ.todense()
+    IJ = np.array(IJ)
+    logger.debug("\n Starting IJ: \n" + str(IJ) )
+
+    # next line omitted in discretize_overlap
+    IJ = reachable_within(trans_length, IJ,
+                          np.array(part.adj.todense()) )
+
+    # Initialize output
+    num_regions = len(part)
+    transitions = np.zeros(
+        [num_regions, num_regions],
+        dtype = int
+    )
+    sol = deepcopy(part.regions)
+    adj = part.adj.copy()
+    adj = adj.todense()
+    adj = np.array(adj)
+
+    # init graphics
+    plot = None
+    if plotit:
+        try:
+            import matplotlib.pyplot as plt
+
+            plt.ion()
+            fig, (ax1, ax2) = plt.subplots(1, 2)
+            ax1.axis('scaled')
+            ax2.axis('scaled')
+            plot = dict(
+                plt=plt, fig=fig, ax1=ax1, ax2=ax2,
+                file_extension='pdf', save_img=save_img,
+                plot_every=plot_every)
+        except:
+            logger.error('failed to import matplotlib')
+
+    sol, adj, transitions, orig, subsys_list, progress = _refine(
+        sol, adj, transitions, IJ, orig, orig_list, subsys_list,
+        ssys, part, N, closed_loop, use_all_horizon, conservative,
+        max_num_poly, min_cell_volume, abs_tol, trans_length,
+        remove_trans, prefilter, plot=plot)
+
+    new_part = PropPreservingPartition(
+        domain=part.domain,
+        regions=sol, adj=sp.lil_matrix(adj),
+        prop_regions=part.prop_regions
+    )
+
+    # check completeness of adjacency matrix
+    if debug:
+        tmp_part = deepcopy(new_part)
+        tmp_part.compute_adj()
+
+    ts = _build_ts(sol, transitions, part.prop_regions)
+    ts_states = range(len(sol))
+
+    param = {
+        'N':N,
+        'trans_length':trans_length,
+        'closed_loop':closed_loop,
+        'conservative':conservative,
+        'use_all_horizon':use_all_horizon,
+        'min_cell_volume':min_cell_volume,
+        'max_num_poly':max_num_poly,
+        'prefilter':prefilter
+    }
+
+    ppp2orig = [part2orig[x] for x in orig]
+
+    end_time = os.times()[0]
+    msg = 'Total abstraction time: ' +\
+          str(end_time - start_time) + '[sec]'
+    print(msg)
+    logger.info(msg)
+
+    if save_img and plot is not None:
+        plt = plot['plt']
+        fig, ax = plt.subplots(1, 1)
+        plt.plot(progress)
+        ax.set_xlabel('iteration')
+        ax.set_ylabel('progress ratio')
+        ax.figure.savefig('progress.pdf')
+
+    return AbstractPwa(
+        ppp=new_part,
+        ts=ts,
+        ppp2ts=ts_states,
+        pwa=ssys,
+        pwa_ppp=part,
+        ppp2pwa=orig,
+        ppp2sys=subsys_list,
+        orig_ppp=orig_ppp,
+        ppp2orig=ppp2orig,
+        disc_params=param
+    )
+
+def discretize_lazy(
+    part, ssys, specs, solver='gr1c', max_rounds=10,
+    N=10, min_cell_volume=0.1,
+    closed_loop=True, conservative=False,
+    max_num_poly=5, use_all_horizon=False,
+    trans_length=1, remove_trans=False,
+    abs_tol=1e-7, prefilter=True
+):
+    """Refine the partition only where synthesis needs it.
+
+    Starts from the coarse partition C{part},
+    and checks transitions only from the cells labeled with
+    propositions that occur in the initial conditions and
+    progress goals of C{specs}.
+    Then it synthesizes a controller.
+    If synthesis fails, then the cells that the transition system
+    reaches from the losing cells, and that have not been checked,
+    are refined and checked too, and synthesis repeats.
+    This continues until synthesis succeeds,
+    no more cells are reached,
+    or C{max_rounds} rounds have been completed.
+
+    With C{solver='jtlv'}, the losing cells are those in
+    the counterexamples that JTLV returns.
+    Other solvers return no counterexamples,
+    so all checked cells are considered losing.
+    Either way, cells that the dynamics cannot reach
+    from the losing cells are never refined.
+
+    Cells that have not been checked yet have no outgoing transitions,
+    so the controller avoids them.
+    Therefore, a controller found for a partial abstraction
+    is also correct for the continuous dynamics.
+
+    As in the examples, the specification should describe
+    initial conditions in terms of propositions,
+    because the initial nodes of the transition system are ignored.
+
+    See Also
+    ========
+    L{discretize}, L{synth.synthesize}
+
+    @param part: coarse L{PropPreservingPartition},
+        e.g., from L{prop2part}
+    @param ssys: L{LtiSysDyn} or L{PwaSysDyn}
+    @param specs: specification to synthesize a controller for
+    @type specs: L{spec.GRSpec}
+    @param solver: passed as C{option} to L{synth.synthesize}
+    @param max_rounds: maximal number of synthesis attempts
+
+    For the other parameters, see L{discretize}.
+
+    @return: C{(abstraction, controller)}.
+        The controller is C{None} if none was found.
+    @rtype: C{(AbstractPwa, MealyMachine)}
+    """
+    from tulip.spec import parser
+    from tulip.spec import transformation as tx
+    orig_ppp = part
+    (part, part2orig, subsys_list,
+     orig_list, orig) = _prepare_partition(part, ssys, conservative)
+    if not conservative:
+        remove_trans = False
+    n = len(part)
+    sol = deepcopy(part.regions)
+    adj = np.array(part.adj.todense())
+    transitions = np.zeros([n, n], dtype=int)
+    IJ = np.zeros([n, n], dtype=int)
+    active = [False] * n
+    # seed with cells labeled by props that the spec mentions,
+    # parsed without the symbol table, which lacks the props
+    words = set()
+    for formula in specs.sys_init + specs.sys_prog:
+        g = tx.Tree.from_recursive_ast(parser.parse(formula))
+        words.update(u.value for u in g.variables)
+    new = [i for i, r in enumerate(sol) if r.props & words]
+    if not new:
+        new = range(n)
+    param = {
+        'N':N,
+        'trans_length':trans_length,
+        'closed_loop':closed_loop,
+        'conservative':conservative,
+        'use_all_horizon':use_all_horizon,
+        'min_cell_volume':min_cell_volume,
+        'max_num_poly':max_num_poly,
+        'prefilter':prefilter
+    }
+    ab = None
+    ctrl = None
+    for k in xrange(max_rounds):
+        # check transitions from the new cells
+        adj_k = reachable_within(trans_length, adj, adj)
+        for i in new:
+            active[i] = True
+            IJ[:, i] = adj_k[:, i]
+        logger.info('round {k}: checking {n} more cells'.format(
+            k=k, n=len(new)))
+        sol, adj, transitions, orig, subsys_list, progress = _refine(
+            sol, adj, transitions, IJ, orig, orig_list, subsys_list,
+            ssys, part, N, closed_loop, use_all_horizon, conservative,
+            max_num_poly, min_cell_volume, abs_tol, trans_length,
+            remove_trans, prefilter, active=active)
+        n = len(sol)
+        IJ = np.zeros([n, n], dtype=int)
+        ab = AbstractPwa(
+            ppp=PropPreservingPartition(
+                domain=part.domain,
+                regions=sol, adj=sp.lil_matrix(adj),
+                prop_regions=part.prop_regions),
+            ts=_build_ts(sol, transitions, part.prop_regions),
+            ppp2ts=range(n),
+            pwa=ssys,
+            pwa_ppp=part,
+            ppp2pwa=orig,
+            ppp2sys=subsys_list,
+            orig_ppp=orig_ppp,
+            ppp2orig=[part2orig[x] for x in orig],
+            disc_params=param)
+        ctrl, losing = _synthesize_partial(solver, specs, ab.ts)
+        if ctrl is not None:
+            logger.info('realizable after checking {a} of {n} cells'.format(
+                a=sum(active), n=n))
+            break
+        if not losing:
+            losing = [i for i in xrange(n) if active[i]]
+        # frontier: unchecked cells reachable from the losing cells,
+        # unchecked cells have no outgoing transitions
+        reached = set(losing)
+        stack = list(losing)
+        while stack:
+            i = stack.pop()
+            for j in ab.ts.successors(i):
+                if j not in reached:
+                    reached.add(j)
+                    stack.append(j)
+        new = sorted(i for i in reached if not active[i])
+        if not new:
+            logger.info('unrealizable, all reachable cells checked')
+            break
+    else:
+        logger.info('no controller found within {k} rounds'.format(
+            k=max_rounds))
+    return ab, ctrl
+
+def _synthesize_partial(solver, specs, ts):
+    """Return controller and losing cells of a partial abstraction.
+
+    @param ts: transition system of the abstraction,
+        its states are the cell indices
+    @return: C{(controller, losing)}, where C{controller} is
+        C{None} if synthesis failed, and C{losing} is the
+        C{list} of cells in the counterexamples, if any
+    """
+    from tulip import synth
+    if solver != 'jtlv':
+        ctrl = synth.synthesize(solver, specs, sys=ts, ignore_sys_init=True)
+        return ctrl, list()
+    from tulip.interfaces import jtlv
+    statevar = 'loc'
+    spec = specs | synth.sys_to_spec(ts, statevar, True)
+    r = jtlv.synthesize(spec)
+    if isinstance(r, list):
+        losing = sorted({c[statevar] for c in r if statevar in c})
+        logger.info('counterexamples in cells: {c}'.format(c=losing))
+        return None, losing
+    ctrl = synth.strategy2mealy(r, spec)
+    remove_deadends(ctrl)
+    return ctrl, list()
+
+def update_abstraction(
+    ab, changed_subsystems=None, changed_props=None,
+    remove_trans=False, abs_tol=1e-7
+):
+    """Update abstraction after changing subsystems or propositions.
+
+    Only the cells that descend from the changed components
+    are discretized again:
+
+      - cells with a changed subsystem as active dynamics
+      - cells whose convex original cell (C{ab.pwa_ppp})
+        intersects the old or new region of a changed proposition.
+
+    The original cells of these cells are split by the
+    new proposition regions and refined again from scratch.
+    Transitions from neighbors to the new cells are checked again,
+    which can refine the neighbors too.
+    All other cells and transitions are reused.
+
+    In conservative mode there are no original cells to return to,
+    so affected cells are split by the new proposition regions
+    and their transitions checked again,
+    but refinements made for the old dynamics are kept.
+
+    The discretization parameters are taken from C{ab.disc_params}.
+
+    See Also
+    ========
+    L{discretize}
+
+    @type ab: L{AbstractPwa}
+
+    @param changed_subsystems: new subsystems,
+        by index in C{ab.pwa.list_subsys}.
+        If C{ab.pwa} is an L{LtiSysDyn}, then use the index 0.
+        The domain of each subsystem must remain the same.
+    @type changed_subsystems: C{dict} of L{LtiSysDyn}
+
+    @param changed_props: new regions of existing propositions
+    @type changed_props: C{dict} of C{Polytope} or C{Region}
+
+    @param remove_trans: see L{discretize}
+    @param abs_tol: see L{discretize}
+
+    @rtype: L{AbstractPwa}
+    """
+    start_time = os.times()[0]
+    if changed_subsystems is None:
+        changed_subsystems = dict()
+    if changed_props is None:
+        changed_props = dict()
+    params = ab.disc_params
+    N = params['N']
+    trans_length = params['trans_length']
+    closed_loop = params['closed_loop']
+    conservative = params['conservative']
+    use_all_horizon = params['use_all_horizon']
+    min_cell_volume = params['min_cell_volume']
+    max_num_poly = params['max_num_poly']
+    prefilter = params.get('prefilter', True)
+    if not conservative:
+        remove_trans = False
+    # new dynamics
+    ssys = ab.pwa
+    ispwa = isinstance(ssys, PwaSysDyn)
+    if ispwa:
+        subsystems = list(ssys.list_subsys)
+    else:
+        subsystems = [ssys]
+    for k, subsys in changed_subsystems.iteritems():
+        if not 0 <= k < len(subsystems):
+            raise ValueError('no subsystem with index: ' + str(k))
+        old = subsystems[k]
+        if ispwa and not (subsys.domain == old.domain):
+            raise ValueError(
+                'domain of subsystem ' + str(k) + ' changed, '
+                'use discretize instead.')
+        subsystems[k] = subsys
+    if ispwa:
+        ssys = PwaSysDyn(
+            list_subsys=subsystems, domain=ssys.domain,
+            time_semantics=ssys.time_semantics,
+            timestep=ssys.timestep)
+    else:
+        (ssys, ) = subsystems
+    # new propositions
+    old_props = ab.ppp.prop_regions
+    for p in changed_props:
+        if p not in old_props:
+            raise ValueError('unknown proposition: ' + str(p))
+    prop_regions = dict(old_props)
+    prop_regions.update(changed_props)
+    changed_sets = (
+        [old_props[p] for p in changed_props] +
+        [changed_props[p] for p in changed_props])
+
+    def touches(region):
+        return any(pc.is_fulldim(region.intersect(x))
+                   for x in changed_sets)
+
+    # previous cells
+    old_sol = ab.ppp.regions
+    n_old = len(old_sol)
+    if ispwa:
+        old_sys = ab._ppp2sys
+    else:
+        old_sys = [0] * n_old
+    ts2ppp = {u: i for i, u in enumerate(ab.ppp2ts)}
+    old_trans = np.zeros([n_old, n_old], dtype=int)
+    for u, v in ab.ts.edges_iter():
+        old_trans[ts2ppp[v], ts2ppp[u]] = 1
+    old_adj = np.array(ab.ppp.adj.todense())
+    orig_ppp = ab.orig_ppp
+    if changed_props:
+        orig_ppp = prop2part(orig_ppp.domain, prop_regions)
+    # cells to discretize again: (region, orig, subsystem)
+    new_cells = list()
+    if conservative:
+        orig_list = None
+        pwa_ppp = ab.pwa_ppp
+        ppp2orig = ab._ppp2orig
+        if changed_props:
+            pwa_ppp, part2orig = _prepare_partition(
+                orig_ppp, ssys, True)[:2]
+        affected = set()
+        for i, region in enumerate(old_sol):
+            if changed_props and touches(region):
+                pieces = _split_by_props(region, changed_props)
+            elif old_sys[i] in changed_subsystems:
+                # a new cell, its transitions are found again
+                pieces = [region.copy()]
+            else:
+                continue
+            affected.add(i)
+            new_cells.extend((r, 0, old_sys[i]) for r in pieces)
+        kept = [i for i in xrange(n_old) if i not in affected]
+        orig = [0]
+        if changed_props:
+            ppp2orig = [part2orig[x] for x in orig]
+    else:
+        old_orig = ab._ppp2pwa
+        n_orig = len(ab.pwa_ppp)
+        orig_sys = [None] * n_orig
+        part2orig = [None] * n_orig
+        for i in xrange(n_old):
+            orig_sys[old_orig[i]] = old_sys[i]
+            part2orig[old_orig[i]] = ab._ppp2orig[i]
+        orig_regions = list()
+        orig_map = dict()
+        new_orig = list()
+        new_part2orig = list()
+        for o, region in enumerate(ab.pwa_ppp.regions):
+            if (orig_sys[o] in changed_subsystems or
+                    (changed_props and touches(region))):
+                new_orig.append(o)
+                continue
+            orig_map[o] = len(orig_regions)
+            orig_regions.append(region)
+            new_part2orig.append(part2orig[o])
+        # split affected original cells by the new propositions
+        for o in new_orig:
+            region = ab.pwa_ppp.regions[o]
+            if changed_props and touches(region):
+                pieces = _split_by_props(region, changed_props)
+            else:
+                pieces = [region]
+            for r in pieces:
+                new_cells.append((r, len(orig_regions), orig_sys[o]))
+                orig_regions.append(r)
+                new_part2orig.append(part2orig[o])
+        affected = {i for i in xrange(n_old) if old_orig[i] in new_orig}
+        kept = [i for i in xrange(n_old) if i not in affected]
+        orig = [orig_map[old_orig[i]] for i in kept]
+        orig += [x[1] for x in new_cells]
+        orig_list = [r[0].copy() if len(r) else r.copy()
+                     for r in orig_regions]
+        pwa_ppp = PropPreservingPartition(
+            domain=ab.pwa_ppp.domain, regions=orig_regions,
+            prop_regions=prop_regions, check=False)
+        pwa_ppp.compute_adj()
+        if changed_props:
+            new_part2orig = [_locate(r, orig_ppp.regions)
+                             for r in orig_regions]
+    logger.info('discretizing again {n} of {m} cells'.format(
+        n=len(affected), m=n_old))
+    # reuse cells, adjacency and transitions
+    k = len(kept)
+    sol = [old_sol[i] for i in kept] + [x[0] for x in new_cells]
+    if ispwa:
+        subsys_list = [old_sys[i] for i in kept] + [x[2] for x in new_cells]
+    else:
+        subsys_list = None
+    n = len(sol)
+    adj = np.zeros([n, n], dtype=int)
+    adj[:k, :k] = old_adj[np.ix_(kept, kept)]
+    transitions = np.zeros([n, n], dtype=int)
+    transitions[:k, :k] = old_trans[np.ix_(kept, kept)]
+    # adjacency of new cells: to former neighbors and each other
+    affected_list = sorted(affected)
+    if affected_list:
+        near = np.flatnonzero(old_adj[np.ix_(kept, affected_list)].any(axis=1))
+    else:
+        near = list()
+    for a in xrange(k, n):
+        adj[a, a] = 1
+        for b in list(near) + range(a + 1, n):
+            if pc.is_adjacent(sol[a], sol[b]):
+                adj[a, b] = 1
+                adj[b, a] = 1
+    # check transitions from and to new cells
+    adj_k = reachable_within(trans_length, adj, adj)
+    IJ = np.zeros([n, n], dtype=int)
+    IJ[:, k:] = adj_k[:, k:]
+    IJ[k:, :] = adj_k[k:, :]
+    sol, adj, transitions, orig, subsys_list, progress = _refine(
+        sol, adj, transitions, IJ, orig, orig_list, subsys_list,
+        ssys, pwa_ppp, N, closed_loop, use_all_horizon, conservative,
+        max_num_poly, min_cell_volume, abs_tol, trans_length,
+        remove_trans, prefilter)
+    if not conservative:
+        ppp2orig = [new_part2orig[x] for x in orig]
+    new_part = PropPreservingPartition(
+        domain=ab.ppp.domain,
+        regions=sol, adj=sp.lil_matrix(adj),
+        prop_regions=prop_regions
+    )
+    ts = _build_ts(sol, transitions, prop_regions)
+
+    end_time = os.times()[0]
+    msg = 'Total update time: ' +\
+          str(end_time - start_time) + '[sec]'
+    logger.info(msg)
+
+    return AbstractPwa(
+        ppp=new_part,
+        ts=ts,
+        ppp2ts=range(len(sol)),
+        pwa=ssys,
+        pwa_ppp=pwa_ppp,
+        ppp2pwa=orig,
+        ppp2sys=subsys_list,
+        orig_ppp=orig_ppp,
+        ppp2orig=ppp2orig,
+        disc_params=dict(params)
+    )
+
+def _split_by_props(region, prop_regions):
+    """Split region into convex pieces labeled with C{prop_regions}.
+
+    The labels of C{region} for propositions
+    not in C{prop_regions} are preserved.
+
+    @type region: C{Polytope} or C{Region}
+    @type prop_regions: C{dict}
+
+    @rtype: C{list} of C{Region}
+    """
+    pieces = [(region, set(region.props))]
+    for p, x in prop_regions.iteritems():
+        new = list()
+        for r, labels in pieces:
+            labels = labels - {p}
+            for q in _convex_pieces(r.intersect(x)):
+                new.append((q, labels | {p}))
+            for q in _convex_pieces(r.diff(x)):
+                new.append((q, labels))
+        pieces = new
+    return [pc.Region([q], props) for q, props in pieces]
+
+def _convex_pieces(region):
+    if isinstance(region, pc.Region):
+        polys = region.list_poly
+    else:
+        polys = [region]
+    return [q for q in polys if pc.is_fulldim(q)]
+
+def _locate(region, regions):
+    """Return index of the element of C{regions} that contains C{region}.
+
+    Tested using the Chebyshev center of C{region}.
+    """
+    r, x = pc.cheby_ball(region)
+    for i, other in enumerate(regions):
+        if x in other:
+            return i
+    raise ValueError('region not covered by partition')
+
+def _prepare_partition(part, ssys, conservative):
+    """Split partition among subsystems and convexify it.
+
+    @type part: L{PropPreservingPartition}
+    @type ssys: L{LtiSysDyn} or L{PwaSysDyn}
+
+    @return: C{(part, part2orig, subsys_list, orig_list, orig)}, where:
+        - C{part}: the new partition
+        - C{part2orig}: map from C{part} to the given partition
+        - C{subsys_list}: map from C{part} to subsystems,
+          C{None} if C{ssys} is an L{LtiSysDyn}
+        - C{orig_list}: convex polytopes of C{part},
+          C{None} if C{conservative}
+        - C{orig}: map to C{orig_list}
+    """
     ispwa = isinstance(ssys, PwaSysDyn)
-    islti = isinstance(ssys, LtiSysDyn)
 
     if ispwa:
         (part, ppp2pwa, part2orig) = pwa_partition(ssys, part)
@@ -529,7 +1217,6 @@ def discretize(
         if ispwa:
             ppp2pwa = [ppp2pwa[i] for i in new2old]
 
-        remove_trans = False # already allowed in nonconservative
         orig_list = []
         for poly in part:
             if len(poly) == 0:
@@ -541,55 +1228,56 @@ def discretize(
                     "problem in convexification")
         orig = range(len(orig_list))
 
-    # Cheby radius of disturbance set
-    # (defined within the loop for pwa systems)
-    if islti:
-        if len(ssys.E) > 0:
-            rd = ssys.Wset.chebR
-        else:
-            rd = 0.
-
-    # Initialize matrix for pairs to check
-    IJ = part.adj.copy()
-    IJ = IJ.todense()
-    IJ = np.array(IJ)
-    logger.debug("\n Starting IJ: \n" + str(IJ) )
-
-    # next line omitted in discretize_overlap
-    IJ = reachable_within(trans_length, IJ,
-                          np.array(part.adj.todense()) )
-
-    # Initialize output
-    num_regions = len(part)
-    transitions = np.zeros(
-        [num_regions, num_regions],
-        dtype = int
-    )
-    sol = deepcopy(part.regions)
-    adj = part.adj.copy()
-    adj = adj.todense()
-    adj = np.array(adj)
-
     # next 2 lines omitted in discretize_overlap
     if ispwa:
         subsys_list = list(ppp2pwa)
     else:
         subsys_list = None
-    ss = ssys
-
-    # init graphics
-    if plotit:
-        try:
-            import matplotlib.pyplot as plt
+    return part, part2orig, subsys_list, orig_list, orig
 
-            plt.ion()
-            fig, (ax1, ax2) = plt.subplots(1, 2)
-            ax1.axis('scaled')
-            ax2.axis('scaled')
-            file_extension = 'pdf'
-        except:
-            logger.error('failed to import matplotlib')
-            plt = None
+def _refine(
+    sol, adj, transitions, IJ, orig, orig_list, subsys_list,
+    ssys, part, N, closed_loop, use_all_horizon, conservative,
+    max_num_poly, min_cell_volume, abs_tol, trans_length,
+    remove_trans, prefilter, active=None, plot=None
+):
+    """Refine cells and find transitions for the pairs in C{IJ}.
+
+    This is the main loop of L{discretize},
+    which continues until no pair remains to be checked.
+    The arguments are modified or replaced,
+    so use the returned values.
+
+    @param sol: cells, i.e., polytopes or regions
+    @param adj: adjacency matrix of C{sol}
+    @param transitions: C{transitions[j, i] == 1} if cell C{j}
+        is reachable from cell C{i}
+    @param IJ: C{IJ[j, i] == 1} if the transition from cell C{i}
+        to cell C{j} remains to be checked
+    @param orig: map from C{sol} to C{orig_list}
+    @param orig_list: convex cells to use as C{trans_set}
+    @param subsys_list: map from C{sol} to subsystems of C{ssys},
+        C{None} if C{ssys} is an L{LtiSysDyn}
+    @param part: used for plotting and checks
+    @param active: if a C{list} of C{bool},
+        then skip pairs from cells C{i} with C{not active[i]}.
+        Cells created by splitting cell C{i} inherit C{active[i]}.
+    @param plot: C{dict} of plotting options created
+        by L{discretize}, or C{None}
+
+    For the other parameters, see L{discretize}.
+
+    @return: C{(sol, adj, transitions, orig, subsys_list, progress)}
+    """
+    ispwa = isinstance(ssys, PwaSysDyn)
+    ss = ssys
+    # Cheby radius of disturbance set
+    # (defined within the loop for pwa systems)
+    if not ispwa:
+        if len(ssys.E) > 0:
+            rd = ssys.Wset.chebR
+        else:
+            rd = 0.
 
     iter_count = 0
 
@@ -601,6 +1289,11 @@ def discretize(
 
     progress = list()
 
+    # boxes reachable from each cell, for the prefilter
+    reach_boxes = dict()
+    n_checked = 0
+    n_skipped = 0
+
     # Do the abstraction
     while np.sum(IJ) > 0:
         ind = np.nonzero(IJ)
@@ -608,6 +1301,8 @@ def discretize(
         i = ind[1][0]
         j = ind[0][0]
         IJ[j, i] = 0
+        if active is not None and not active[i]:
+            continue
         si = sol[i]
         sj = sol[j]
 
@@ -631,6 +1326,18 @@ def discretize(
             # Use original cell as trans_set
             trans_set = orig_list[orig[i]]
 
+        n_checked += 1
+        if prefilter:
+            if i not in reach_boxes:
+                reach_boxes[i] = reachable_boxes(
+                    si, ss, N, trans_set, abs_tol)
+            if not boxes_hit(reach_boxes[i], sj, abs_tol):
+                logger.info('\t unreachable by bounding boxes: ' +
+                            str(i) + ' --X--> ' + str(j) + '\n')
+                n_skipped += 1
+                transitions[j, i] = 0
+                continue
+
         S0 = solve_feasible(
             si, sj, ss, N, closed_loop,
             use_all_horizon, trans_set, max_num_poly
@@ -719,6 +1426,7 @@ def discretize(
             # replace si by intersection (single state)
             isect_list = pc.separate(isect)
             sol[i] = isect_list[0]
+            reach_boxes.pop(i, None)
 
             # cut difference into connected pieces
             difflist = pc.separate(diff)
@@ -735,6 +1443,8 @@ def discretize(
                 # keep track of PWA subsystems map to new states
                 if ispwa:
                     subsys_list.append(subsys_list[i])
+                if active is not None:
+                    active.append(active[i])
             n_cells = len(sol)
             new_idx = xrange(n_cells-1, n_cells-num_new-1, -1)
 
@@ -861,12 +1571,14 @@ def discretize(
         iter_count += 1
 
         # no plotting ?
-        if not plotit:
-            continue
-        if plt is None or plot_partition is None:
+        if plot is None or plot_partition is None:
             continue
-        if iter_count % plot_every != 0:
+        if iter_count % plot['plot_every'] != 0:
             continue
+        plt = plot['plt']
+        fig = plot['fig']
+        ax1 = plot['ax1']
+        ax2 = plot['ax2']
 
         tmp_part = PropPreservingPartition(
             domain=part.domain,
@@ -901,24 +1613,27 @@ def discretize(
         ax2.set_xlim(l[0,0], u[0,0])
         ax2.set_ylim(l[1,0], u[1,0])
 
-        if save_img:
+        if plot['save_img']:
             fname = 'movie' +str(iter_count).zfill(3)
-            fname += '.' + file_extension
+            fname += '.' + plot['file_extension']
             fig.savefig(fname, dpi=250)
         plt.pause(1)
 
-    new_part = PropPreservingPartition(
-        domain=part.domain,
-        regions=sol, adj=sp.lil_matrix(adj),
-        prop_regions=part.prop_regions
-    )
+    if prefilter:
+        logger.info(
+            'prefilter skipped {s} of {n} reachability problems'.format(
+                s=n_skipped, n=n_checked))
+    return sol, adj, transitions, orig, subsys_list, progress
 
-    # check completeness of adjacency matrix
-    if debug:
-        tmp_part = deepcopy(new_part)
-        tmp_part.compute_adj()
+def _build_ts(sol, transitions, prop_regions):
+    """Return transition system with the given transitions.
+
+    @param transitions: C{transitions[j, i] == 1} if
+        there is a transition from cell C{i} to cell C{j}
+    @param prop_regions: propositions to label the cells with
 
-    # generate transition system and add transitions
+    @rtype: L{transys.TransitionSystem}
+    """
     ts = trs.TransitionSystem()
 
     adj = sp.lil_matrix(transitions.T)
@@ -928,50 +1643,13 @@ def discretize(
     add_adj(ts, adj, ts_states)
 
     # annotate TS with state labels
-    for p in part.prop_regions:
+    for p in prop_regions:
         ts.vars[p] = 'boolean'
     for u, region in zip(ts, sol):
         d = ts.node[u]
         for p in ts.vars:
             d[p] = (p in region.props)
-
-    param = {
-        'N':N,
-        'trans_length':trans_length,
-        'closed_loop':closed_loop,
-        'conservative':conservative,
-        'use_all_horizon':use_all_horizon,
-        'min_cell_volume':min_cell_volume,
-        'max_num_poly':max_num_poly
-    }
-
-    ppp2orig = [part2orig[x] for x in orig]
-
-    end_time = os.times()[0]
-    msg = 'Total abstraction time: ' +\
-          str(end_time - start_time) + '[sec]'
-    print(msg)
-    logger.info(msg)
-
-    if save_img and plt is not None:
-        fig, ax = plt.subplots(1, 1)
-        plt.plot(progress)
-        ax.set_xlabel('iteration')
-        ax.set_ylabel('progress ratio')
-        ax.figure.savefig('progress.pdf')
-
-    return AbstractPwa(
-        ppp=new_part,
-        ts=ts,
-        ppp2ts=ts_states,
-        pwa=ssys,
-        pwa_ppp=part,
-        ppp2pwa=orig,
-        ppp2sys=subsys_list,
-        orig_ppp=orig_ppp,
-        ppp2orig=ppp2orig,
-        disc_params=param
-    )
+    return ts
 
 def reachable_within(trans_length, adj_k, adj):
     """Find cells reachable within trans_length hops.
@@ -1114,11 +1792,14 @@ def multiproc_discretize_switched(
 
     modes = hybrid_sys.modes
     mode_nums = hybrid_sys.disc_domain_size
+    disc_params = _disc_params_by_mode(disc_params, modes)
+    groups = _group_modes(hybrid_sys, disc_params)
 
     q = mp.Queue()
 
     mode_args = dict()
-    for mode in modes:
+    for group in groups:
+        mode = group[0]
         cont_dyn = hybrid_sys.dynamics[mode]
         mode_args[mode] = (q, mode, ppp, cont_dyn, disc_params[mode])
 
@@ -1143,7 +1824,8 @@ def multiproc_discretize_switched(
     logger.info('Merged partition has: ' + str(n) + ', states')
 
     # find feasible transitions over merged partition
-    for mode in modes:
+    for group in groups:
+        mode = group[0]
         cont_dyn = hybrid_sys.dynamics[mode]
         params = disc_params[mode]
 
@@ -1160,6 +1842,8 @@ def multiproc_discretize_switched(
         mode, t = q.get()
         trans[mode] = t
 
+    _share_within_groups(merged_abstr, trans, abstractions, groups)
+
     # merge the abstractions, creating a common TS
     merge_abstractions(merged_abstr, trans,
                        abstractions, modes, mode_nums)
@@ -1182,6 +1866,9 @@ def discretize_switched(
 
     @param disc_params: discretization parameters passed to L{discretize} for
 		each mode. See L{discretize} for details.
+        Modes with the same dynamics object
+        (see L{SwitchedSysDyn.group_modes})
+        and equal parameters are abstracted once.
     @type disc_params: dict (keyed by mode) of dicts.
 
     @param plot: save partition images
@@ -1193,17 +1880,17 @@ def discretize_switched(
         some attributes are dict keyed by mode
     @rtype: L{AbstractSwitched}
     """
-    if disc_params is None:
-        disc_params = {'N':1, 'trans_length':1}
-
     logger.info('discretizing hybrid system')
 
     modes = hybrid_sys.modes
     mode_nums = hybrid_sys.disc_domain_size
+    disc_params = _disc_params_by_mode(disc_params, modes)
+    groups = _group_modes(hybrid_sys, disc_params)
 
     # discretize each abstraction separately
     abstractions = dict()
-    for mode in modes:
+    for group in groups:
+        mode = group[0]
         logger.debug(30*'-'+'\n')
         logger.info('Abstracting mode: ' + str(mode))
 
@@ -1224,7 +1911,8 @@ def discretize_switched(
 
     # find feasible transitions over merged partition
     trans = dict()
-    for mode in modes:
+    for group in groups:
+        mode = group[0]
         cont_dyn = hybrid_sys.dynamics[mode]
 
         params = disc_params[mode]
@@ -1234,6 +1922,8 @@ def discretize_switched(
             N=params['N'], trans_length=params['trans_length']
         )
 
+    _share_within_groups(merged_abstr, trans, abstractions, groups)
+
     # merge the abstractions, creating a common TS
     merge_abstractions(merged_abstr, trans,
                        abstractions, modes, mode_nums)
@@ -1243,6 +1933,46 @@ def discretize_switched(
 
     return merged_abstr
 
+def _disc_params_by_mode(disc_params, modes):
+    """Return discretization parameters keyed by mode."""
+    if disc_params is None:
+        return {mode: {'N':1, 'trans_length':1} for mode in modes}
+    return disc_params
+
+def _group_modes(hybrid_sys, disc_params):
+    """Group modes with same dynamics and discretization parameters.
+
+    The first mode of each group is abstracted,
+    the others share its abstraction.
+
+    @type hybrid_sys: L{SwitchedSysDyn}
+    @rtype: C{list} of C{list} of modes
+    """
+    groups = list()
+    for same_dyn in hybrid_sys.group_modes():
+        subgroups = list()
+        for mode in same_dyn:
+            for group in subgroups:
+                if disc_params[group[0]] == disc_params[mode]:
+                    group.append(mode)
+                    break
+            else:
+                subgroups.append([mode])
+        groups.extend(subgroups)
+    logger.info('{n} modes, {m} distinct abstractions'.format(
+        n=sum(len(g) for g in groups), m=len(groups)))
+    return groups
+
+def _share_within_groups(merged_abstr, trans, abstractions, groups):
+    """Copy results for the first mode of each group to the others."""
+    ppp2modes = merged_abstr.ppp2modes
+    for group in groups:
+        mode = group[0]
+        for other in group[1:]:
+            abstractions[other] = abstractions[mode]
+            ppp2modes[other] = ppp2modes[mode]
+            trans[other] = trans[mode]
+
 def plot_mode_partitions(swab, show_ts, only_adjacent):
     """Save each mode's partition and final merged partition.
     """
@@ -1311,15 +2041,19 @@ def merge_abstractions(merged_abstr, trans, abstr, modes, mode_nums):
     merged_abstr.ts = sys_ts
     merged_abstr.ppp2ts = ppp2ts
 
+@backend.call_site('get_transitions')
 def get_transitions(
     abstract_sys, mode, ssys, N=10,
     closed_loop=True,
-    trans_length=1
+    trans_length=1, prefilter=True
 ):
     """Find which transitions are feasible in given mode.
 
     Used for the candidate transitions of the merged partition.
 
+    @param prefilter: skip transitions found infeasible
+        by comparing bounding boxes, see L{discretize}.
+
     @rtype: scipy.sparse.lil_matrix
     """
     logger.info('checking which transitions remain feasible after merging')
@@ -1341,6 +2075,8 @@ def get_transitions(
     # Do the abstraction
     n_checked = 0
     n_found = 0
+    n_skipped = 0
+    reach_boxes = dict()
     while np.sum(IJ) > 0:
         n_checked += 1
 
@@ -1358,11 +2094,22 @@ def get_transitions(
         trans_set = abstract_sys.ppp2pwa(mode, i)[1]
         active_subsystem = abstract_sys.ppp2sys(mode, i)[1]
 
-        trans_feasible = is_feasible(
-            si, sj, active_subsystem, N,
-            closed_loop = closed_loop,
-            trans_set = trans_set
-        )
+        if prefilter:
+            if i not in reach_boxes:
+                reach_boxes[i] = reachable_boxes(
+                    si, active_subsystem, N, trans_set)
+            trans_feasible = boxes_hit(reach_boxes[i], sj)
+            if not trans_feasible:
+                n_skipped += 1
+        else:
+            trans_feasible = True
+
+        if trans_feasible:
+            trans_feasible = is_feasible(
+                si, sj, active_subsystem, N,
+                closed_loop = closed_loop,
+                trans_set = trans_set
+            )
 
         if trans_feasible:
             transitions[i, j] = 1
@@ -1373,6 +2120,7 @@ def get_transitions(
             msg = '\t Not feasible transition.'
         logger.debug(msg)
     logger.info('Checked: ' + str(n_checked))
+    logger.info('Skipped by prefilter: ' + str(n_skipped))
     logger.info('Found: ' + str(n_found))
     logger.info('Survived merging: ' + str(float(n_found) / n_checked) + ' % ')
 
@@ -1435,6 +2183,7 @@ def merge_partitions(abstractions):
 
    	# Create a list of merged-together regions
     ab0 = abstractions[init_mode]
+    regions = ab0.ppp.regions
     parents = {init_mode: range(len(ab0.ppp))}
     ap_labeling = dict()
     for i, reg in enumerate(ab0.ppp):
@@ -1443,7 +2192,7 @@ def merge_partitions(abstractions):
     for cur_mode in remaining_modes:
         ab2 = abstractions[cur_mode]
         r = merge_partition_pair(
-            ab0.ppp, ab2, cur_mode, prev_modes,
+            regions, ab2, cur_mode, prev_modes,
             parents, ap_labeling)
         regions, parents, ap_labeling = r
         prev_modes += [cur_mode]
@@ -1557,7 +2306,7 @@ def merge_partition_pair(
             isect.props = u.props.copy()
 
             new_list.append(isect)
-            idx = new_list.index(isect)
+            idx = len(new_list) - 1
 
             # keep track of parents
             for mode in prev_modes:
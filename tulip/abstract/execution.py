@@ -0,0 +1,314 @@
+# Copyright (c) 2014 by California Institute of Technology
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the California Institute of Technology nor
+#    the names of its contributors may be used to endorse or promote
+#    products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL CALTECH
+# OR THE CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+"""
+Closed-loop execution of controllers synthesized for abstractions.
+
+At each discrete step of an episode:
+
+  1. the Mealy machine reacts to the environment inputs
+     (stage C{'reaction'}), choosing the next cell,
+  2. L{find_controller.get_input} computes an input sequence
+     that steers the continuous state to that cell
+     (stage C{'input'}),
+  3. the dynamics are simulated for C{N} steps,
+     with disturbances sampled from C{Wset}
+     (stage C{'simulation'}).
+
+An episode stops at the first violation:
+
+  - C{'initial'}: the controller does not start from the initial cell
+  - C{'reaction'}: no reaction to the environment inputs
+  - C{'input'}: no input reaches the next cell
+  - C{'domain'}: the continuous state left the domain
+  - C{'transition'}: the continuous state is not in the next cell
+
+Example::
+
+    from tulip.abstract import execution
+    report = execution.run_episodes(
+        ctrl, disc_dynamics, initial_states,
+        num_steps=20, processes=4)
+    print(execution.format_report(report))
+"""
+from __future__ import absolute_import
+import logging
+logger = logging.getLogger(__name__)
+import multiprocessing as mp
+from timeit import default_timer as timer
+
+import numpy as np
+
+from .find_controller import (
+    get_input, find_discrete_state, InputWorkspace)
+
+STAGES = ('reaction', 'input', 'simulation')
+PERCENTILES = (50, 90, 99)
+
+
+def run_episode(
+    ctrl, ab, x0, env_inputs=None, num_steps=10,
+    statevar='loc', seed=None
+):
+    """Run controller C{ctrl} in closed loop with abstraction C{ab}.
+
+    The dynamics C{ab.pwa} are simulated.
+    If C{ab} was computed with C{closed_loop=True},
+    then the input is recomputed after each step,
+    with decreasing horizon. Otherwise, the input sequence
+    from L{get_input} is applied open-loop.
+    An L{InputWorkspace} is reused over the episode.
+
+    @param ctrl: controller synthesized for C{ab.ts}
+    @type ctrl: L{transys.MealyMachine}
+
+    @type ab: L{AbstractPwa}
+
+    @param x0: initial continuous state
+    @type x0: 1d C{numpy.ndarray}
+
+    @param env_inputs: values of the inputs of C{ctrl}:
+        - C{None}: no inputs
+        - C{list} of C{dict}, one per step
+        - callable C{f(t, x, outputs)} that returns a C{dict},
+          where C{outputs} are those of the previous reaction
+          (C{None} at C{t = 0})
+
+    @param num_steps: number of discrete steps,
+        not counting the initial reaction
+    @param statevar: output of C{ctrl} that stores the node of C{ab.ts}
+    @param seed: for sampling disturbances
+
+    @return: episode with keys:
+        - C{'x'}: continuous states, one per row
+        - C{'u'}: inputs applied, one per row
+        - C{'cells'}: indices of visited cells in C{ab.ppp}
+        - C{'steps'}: number of discrete steps completed
+        - C{'violation'}: C{None}, or C{(t, kind)},
+          where C{kind} is one of the violations listed above
+        - C{'latency'}: C{dict} that maps each stage
+          to a C{list} of durations in seconds
+    @rtype: C{dict}
+    """
+    rng = np.random.RandomState(seed)
+    ts2ppp = {u: i for i, u in enumerate(ab.ppp2ts)}
+    N = ab.disc_params['N']
+    closed_loop = ab.disc_params['closed_loop']
+    latency = {stage: list() for stage in STAGES}
+    workspace = InputWorkspace()
+    x = np.asarray(x0, dtype=float).flatten()
+    xs = [x]
+    us = list()
+    cell = find_discrete_state(x, ab.ppp)
+    cells = [cell]
+    episode = dict(x=xs, u=us, cells=cells, steps=0,
+                   violation=None, latency=latency)
+    if cell is None:
+        episode['violation'] = (0, 'domain')
+        return _finish(episode)
+    state = _initial_state(ctrl)
+    outputs = None
+    for t in xrange(num_steps + 1):
+        inputs = _inputs(env_inputs, t, x, outputs)
+        t0 = timer()
+        try:
+            state, outputs = ctrl.reaction(state, inputs)
+        except Exception:
+            logger.debug('no reaction to: ' + str(inputs))
+            episode['violation'] = (t, 'reaction')
+            break
+        latency['reaction'].append(timer() - t0)
+        target = ts2ppp.get(outputs.get(statevar))
+        if t == 0:
+            if target != cell:
+                episode['violation'] = (t, 'initial')
+                break
+            continue
+        ssys = ab.ppp2sys(cell)[1]
+        t_input = 0.0
+        t_sim = 0.0
+        for k in xrange(N):
+            t0 = timer()
+            try:
+                if k == 0 or closed_loop:
+                    u = get_input(x, ssys, ab, cell, target,
+                                  N=N - k, workspace=workspace)
+                    j = 0
+            except Exception:
+                logger.debug('no input for: ' + str((cell, target)))
+                episode['violation'] = (t, 'input')
+                break
+            t1 = timer()
+            try:
+                x = _step(ab.pwa, x, u[j], rng)
+            except ValueError:
+                episode['violation'] = (t, 'domain')
+                break
+            t_input += t1 - t0
+            t_sim += timer() - t1
+            xs.append(x)
+            us.append(u[j])
+            j += 1
+        if episode['violation'] is not None:
+            break
+        latency['input'].append(t_input)
+        latency['simulation'].append(t_sim)
+        cell = find_discrete_state(x, ab.ppp)
+        cells.append(cell)
+        if cell is None:
+            episode['violation'] = (t, 'domain')
+            break
+        if cell != target:
+            episode['violation'] = (t, 'transition')
+            break
+        episode['steps'] = t
+    return _finish(episode)
+
+
+def run_episodes(
+    ctrl, ab, initial_states, env_inputs=None,
+    num_steps=10, statevar='loc', processes=1, seed=None
+):
+    """Run an episode from each initial state and collect statistics.
+
+    See L{run_episode} for the arguments.
+    Episode C{i} samples disturbances with seed C{seed + i}.
+
+    @param initial_states: one per row
+    @type initial_states: 2d C{numpy.ndarray}
+
+    @param processes: number of worker processes.
+        If C{None}, then use C{multiprocessing.cpu_count()}.
+        The controller, abstraction and C{env_inputs}
+        must be picklable.
+    @type processes: C{int}
+
+    @return: report with keys:
+        - C{'episodes'}: C{list} of episodes,
+          as returned by L{run_episode}
+        - C{'num_episodes'}
+        - C{'num_steps'}: total discrete steps completed
+        - C{'time'}: wall clock time in seconds
+        - C{'steps_per_sec'}: discrete steps per second
+        - C{'latency'}: C{dict} that maps each stage to
+          C{dict} from percentile to seconds
+        - C{'violations'}: C{list} of C{(episode, t, kind)}
+    @rtype: C{dict}
+    """
+    tasks = [
+        (ctrl, ab, x0, env_inputs, num_steps, statevar,
+         None if seed is None else seed + i)
+        for i, x0 in enumerate(initial_states)]
+    t0 = timer()
+    if processes == 1:
+        episodes = map(_run_episode, tasks)
+    else:
+        pool = mp.Pool(processes)
+        try:
+            episodes = pool.map(_run_episode, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    wall = timer() - t0
+    num_steps = sum(e['steps'] for e in episodes)
+    latency = dict()
+    for stage in STAGES:
+        durations = [d for e in episodes for d in e['latency'][stage]]
+        if durations:
+            p = np.percentile(durations, PERCENTILES)
+        else:
+            p = [np.nan] * len(PERCENTILES)
+        latency[stage] = dict(zip(PERCENTILES, p))
+    violations = [(i, ) + e['violation']
+                  for i, e in enumerate(episodes)
+                  if e['violation'] is not None]
+    return dict(
+        episodes=episodes,
+        num_episodes=len(episodes),
+        num_steps=num_steps,
+        time=wall,
+        steps_per_sec=num_steps / wall if wall > 0 else np.inf,
+        latency=latency,
+        violations=violations)
+
+
+def format_report(report):
+    """Return summary of report from L{run_episodes} as C{str}."""
+    s = '{n} episodes, {k} steps in {t:.3f} sec'.format(
+        n=report['num_episodes'], k=report['num_steps'],
+        t=report['time'])
+    s += ' ({r:.1f} steps/sec)\n'.format(r=report['steps_per_sec'])
+    s += 'latency [ms]: ' + ', '.join(
+        'p' + str(p) for p in PERCENTILES) + '\n'
+    for stage in STAGES:
+        p = report['latency'][stage]
+        s += '\t{stage:<12}'.format(stage=stage) + ', '.join(
+            '{x:.3f}'.format(x=1e3 * p[q]) for q in PERCENTILES) + '\n'
+    s += 'violations: ' + str(len(report['violations'])) + '\n'
+    for i, t, kind in report['violations']:
+        s += '\tepisode {i}, step {t}: {kind}\n'.format(
+            i=i, t=t, kind=kind)
+    return s
+
+
+def _run_episode(task):
+    return run_episode(*task)
+
+
+def _finish(episode):
+    episode['x'] = np.array(episode['x'])
+    episode['u'] = np.array(episode['u'])
+    return episode
+
+
+def _initial_state(ctrl):
+    (state, ) = ctrl.initial_nodes
+    return state
+
+
+def _inputs(env_inputs, t, x, outputs):
+    if env_inputs is None:
+        return dict()
+    if callable(env_inputs):
+        return env_inputs(t, x, outputs)
+    return env_inputs[t]
+
+
+def _step(ssys, x, u, rng):
+    """Return successor of state C{x} under input C{u}.
+
+    @raise ValueError: if C{x} is outside the domain of C{ssys}
+    """
+    x_next = ssys.step(x, u, rng=rng)
+    if isinstance(x_next, tuple):
+        x_next = x_next[0]
+    return x_next[0]
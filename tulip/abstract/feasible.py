@@ -37,6 +37,8 @@ Primary functions:
     - L{solve_feasible}
     - L{createLM}
     - L{get_max_extreme}
+    - L{may_be_feasible}
+    - L{sample_feasible}
 
 See Also
 ========
@@ -50,6 +52,8 @@ from collections import Iterable
 import numpy as np
 import polytope as pc
 
+from . import backend
+
 def is_feasible(
     from_region, to_region, sys, N,
     closed_loop=True,
@@ -67,6 +71,7 @@ def is_feasible(
     )
     return from_region <= S0
 
+@backend.call_site('solve_feasible')
 def solve_feasible(
     P1, P2, ssys, N=1, closed_loop=True,
     use_all_horizon=False, trans_set=None, max_num_poly=5
@@ -461,6 +466,252 @@ def get_max_extreme(G,D,N):
     d_hat = np.amax(np.dot(G,DN_extreme), axis=1)
     return d_hat.reshape(d_hat.size,1)
 
+def may_be_feasible(
+    from_region, to_region, sys, N,
+    trans_set=None, abs_tol=1e-7
+):
+    """Return False if to_region is not reachable from_region.
+
+    Cheap test based on interval over-approximations
+    of the states reachable in 1, ..., N steps,
+    see L{reachable_boxes}.
+    It needs only the bounding boxes of the sets involved,
+    so it can be used to skip the polytope projections
+    of L{solve_feasible} for pairs that are clearly infeasible.
+
+    @return: False if the transition is infeasible,
+        True if it may be feasible.
+    @rtype: bool
+    """
+    boxes = reachable_boxes(from_region, sys, N, trans_set, abs_tol)
+    return boxes_hit(boxes, to_region, abs_tol)
+
+@backend.call_site('reachable_boxes')
+def reachable_boxes(P1, ssys, N, trans_set=None, abs_tol=1e-7):
+    """Return boxes that contain the states reachable from P1.
+
+    The k-th box contains the states reachable
+    in k+1 steps, for k = 0, ..., N-1,
+    with intermediate states in C{trans_set}
+    (or C{P1} if C{trans_set} is C{None}),
+    for any input in C{ssys.Uset} and disturbance in C{ssys.Wset}.
+    The boxes are propagated in center-radius form::
+
+        c' = A c + B c_u + E c_w + K
+        r' = |A| r + |B| r_u + |E| r_w
+
+    So they over-approximate the sets that L{solve_feasible}
+    considers, both closed and open loop.
+
+    @type ssys: L{LtiSysDyn}
+
+    @return: C{[(l, u), ...]} with the bounds of each box,
+        or C{None} if some set is unbounded.
+    @rtype: C{list} of pairs of 1d C{numpy.ndarray}
+    """
+    x_box = bounding_box(P1)
+    if x_box is None:
+        return None
+    if trans_set is None:
+        trans_set = P1
+    trans_box = bounding_box(trans_set)
+    return propagate_boxes(x_box, ssys, N, trans_box, abs_tol)
+
+def propagate_boxes(x_box, ssys, N, trans_box=None, abs_tol=1e-7):
+    """Return boxes that contain the states reachable from C{x_box}.
+
+    As L{reachable_boxes}, but starting from the box C{x_box},
+    for example C{(x0, x0)} for the single state C{x0}.
+    Intermediate boxes are intersected with C{trans_box},
+    unless it is C{None}.
+
+    @param x_box: C{(l, u)} as returned by L{bounding_box}
+
+    @return: C{[(l, u), ...]}, or C{None} if C{ssys.Uset}
+        or C{ssys.Wset} is unbounded.
+    """
+    if ssys.Uset is None:
+        return None
+    u_box = bounding_box(ssys.Uset, use_cache=False)
+    if u_box is None:
+        return None
+    A = ssys.A
+    B = ssys.B
+    E = ssys.E
+    n = A.shape[1]
+    m = B.shape[1]
+    # state dependent input constraints: [u; x] \in Uset
+    l, u = u_box
+    l, u = l[:m], u[:m]
+    c0 = B.dot((l + u) / 2.) + ssys.K.flatten()
+    r0 = np.abs(B).dot((u - l) / 2.)
+    if not np.all(E == 0) and pc.is_fulldim(ssys.Wset):
+        w_box = bounding_box(ssys.Wset, use_cache=False)
+        if w_box is None:
+            return None
+        l, u = w_box
+        c0 = c0 + E.dot((l + u) / 2.)
+        r0 = r0 + np.abs(E).dot((u - l) / 2.)
+    l, u = (np.asarray(b, dtype=float).flatten() for b in x_box)
+    boxes = list()
+    for k in xrange(N):
+        if k > 0 and trans_box is not None:
+            l = np.maximum(l, trans_box[0])
+            u = np.minimum(u, trans_box[1])
+            if np.any(l > u + abs_tol):
+                break
+        c = A.dot((l + u) / 2.) + c0
+        r = np.abs(A).dot((u - l) / 2.) + r0
+        l, u = c - r, c + r
+        assert l.shape == (n,)
+        boxes.append((l, u))
+    return boxes
+
+def boxes_hit(boxes, region, abs_tol=1e-7):
+    """Return False if no box intersects the bounding box of region.
+
+    @param boxes: as returned by L{reachable_boxes}
+
+    @rtype: bool
+    """
+    if boxes is None:
+        return True
+    box = bounding_box(region)
+    return any(boxes_meet(b, box, abs_tol) for b in boxes)
+
+def boxes_meet(a, b, abs_tol=1e-7):
+    """Return C{False} if the boxes C{a}, C{b} are C{abs_tol} apart.
+
+    C{None} is an unbounded box.
+
+    @param a: C{(l, u)} as returned by L{bounding_box}
+    @param b: same as C{a}
+
+    @rtype: bool
+    """
+    if a is None or b is None:
+        return True
+    return bool(np.all(a[0] <= b[1] + abs_tol) and
+                np.all(b[0] <= a[1] + abs_tol))
+
+@backend.call_site('sample_feasible')
+def sample_feasible(
+    P1, P2, ssys, N=1, trans_set=None,
+    num_samples=20, seed=None
+):
+    """Return fraction of sampled states in P1 from which P2 is reachable.
+
+    States are sampled uniformly in C{P1}.
+    For each sample C{x0} and convex polytope of C{P2},
+    a single LP decides whether an open-loop input sequence
+    steers C{x0} to that polytope in C{N} steps,
+    for all disturbances, with intermediate states in C{trans_set}
+    (see L{createLM}).
+
+    For C{N = 1} this is exact up to sampling.
+    For C{N > 1} open-loop reachability implies
+    closed-loop reachability, but not conversely,
+    so the fraction can be smaller than that of L{solve_feasible}.
+
+    @param trans_set: If specified,
+        then force transitions to be in this set.
+        Otherwise, P1 is used.
+        If it is not convex,
+        then its polytope that contains C{x0} is used.
+
+    @param seed: for C{numpy.random.RandomState}
+
+    @return: fraction of samples, C{None} if no state was sampled
+    @rtype: C{float}
+    """
+    rng = np.random.RandomState(seed)
+    samples = _sample_states(P1, num_samples, rng)
+    if not samples:
+        return None
+    if trans_set is None:
+        trans_set = P1
+    n = ssys.A.shape[1]
+    targets = _convex(P2)
+    n_found = 0
+    for x0 in samples:
+        Pk = [q for q in _convex(trans_set) if x0 in q]
+        if not Pk:
+            continue
+        Pk = Pk[0]
+        for PN in targets:
+            L, M = createLM(ssys, N, Pk, Pk, PN)
+            h = M.flatten() - L[:, :n].dot(x0)
+            G = L[:, n:]
+            c = np.zeros(G.shape[1])
+            sol = backend.lpsolve(c, G, h)
+            if sol['status'] == 0:
+                n_found += 1
+                break
+    return float(n_found) / len(samples)
+
+def _sample_states(region, num_samples, rng, max_tries=1000):
+    """Return states sampled uniformly in C{region}.
+
+    Uses rejection sampling in the bounding box of C{region}.
+    Fewer states are returned if C{region} fills
+    a tiny part of its bounding box.
+
+    @rtype: C{list} of 1d C{numpy.ndarray}
+    """
+    box = bounding_box(region)
+    if box is None:
+        return []
+    l, u = box
+    samples = []
+    for i in xrange(num_samples * max_tries):
+        x = l + rng.rand(l.size) * (u - l)
+        if x in region:
+            samples.append(x)
+        if len(samples) == num_samples:
+            break
+    return samples
+
+def _convex(p):
+    if isinstance(p, pc.Region):
+        return list(p.list_poly)
+    return [p]
+
+def bounding_box(p, use_cache=True):
+    """Return bounds C{(l, u)} of polytope or region.
+
+    Unlike C{polytope.bounding_box},
+    return C{None} if C{p} is unbounded or empty.
+    Bounds found are cached in C{p.bbox} if C{use_cache}.
+
+    @rtype: pair of 1d C{numpy.ndarray}
+    """
+    if use_cache and p.bbox is not None:
+        l, u = p.bbox
+        return np.asarray(l).flatten(), np.asarray(u).flatten()
+    if isinstance(p, pc.Region):
+        boxes = [bounding_box(q, use_cache) for q in p.list_poly]
+        if not boxes or None in boxes:
+            return None
+        l = np.amin([b[0] for b in boxes], axis=0)
+        u = np.amax([b[1] for b in boxes], axis=0)
+    else:
+        if p.A.size == 0:
+            return None
+        n = p.A.shape[1]
+        l = np.zeros(n)
+        u = np.zeros(n)
+        for i in xrange(n):
+            c = np.zeros(n)
+            c[i] = 1.
+            for sign, bound in ((1., l), (-1., u)):
+                sol = backend.lpsolve(sign * c, p.A, p.b)
+                if sol['status'] != 0:
+                    return None
+                bound[i] = np.asarray(sol['x']).flatten()[i]
+    if use_cache:
+        p.bbox = (l.reshape(-1, 1), u.reshape(-1, 1))
+    return l, u
+
 def _block_diag2(A,B):
     """Like block_diag() in scipy.linalg, but restricted to 2 inputs.
 
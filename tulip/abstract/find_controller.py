@@ -40,6 +40,11 @@ Helper functions:
     - L{get_input_helper}
     - L{is_seq_inside}
 
+Repeated calls, as in receding horizon control,
+can reuse data via an L{InputWorkspace}.
+L{RecedingHorizonInput} recomputes the input at each step
+of a single transition.
+
 See Also
 ========
 L{discretize}
@@ -47,18 +52,22 @@ L{discretize}
 from __future__ import absolute_import
 
 import numpy as np
-from cvxopt import matrix, solvers
-solvers.options['msg_lev'] = 'GLP_MSG_OFF'
-
 import polytope as pc
 
-from .feasible import solve_feasible, createLM, _block_diag2
+from . import backend
+from .feasible import (
+    solve_feasible, createLM, _block_diag2,
+    bounding_box, boxes_meet, propagate_boxes)
+
+# tolerance for pruning unreachable targets
+_PRUNE_TOL = 1e-7
 
+@backend.call_site('get_input')
 def get_input(
     x0, ssys, abstraction,
     start, end,
     R=[], r=[], Q=[], mid_weight=0.0,
-    test_result=False
+    test_result=False, N=None, workspace=None
 ):
     """Compute continuous control input for discrete transition.
 
@@ -113,10 +122,10 @@ def get_input(
     @param abstraction: abstract system dynamics
     @type abstraction: L{AbstractPwa}
 
-    @param start: index of the initial state in C{abstraction.ts}
+    @param start: index of the initial region in C{abstraction.ppp}
     @type start: int >= 0
 
-    @param end: index of the end state in C{abstraction.ts}
+    @param end: index of the end region in C{abstraction.ppp}
     @type end: int >= 0
 
     @param R: state cost matrix for::
@@ -140,15 +149,20 @@ def get_input(
         the calculated input sequence is safe.
     @type test_result: bool
 
+    @param N: horizon length, default is C{abstraction.disc_params['N']}.
+        A shorter horizon is used to recompute the input
+        after each step of a closed-loop transition (Note 2).
+    @type N: int >= 1
+
+    @param workspace: data reused across calls
+    @type workspace: L{InputWorkspace}
+
     @return: array A where row k contains the
         control input: u(k)
         for k = 0,1 ... N-1
     @rtype: (N x m) numpy 2darray
     """
 
-    #@param N: horizon length
-    #@type N: int >= 1
-
     #@param conservative:
     #    if True,
     #    then force plant to stay inside initial
@@ -166,11 +180,11 @@ def get_input(
     regions = part.regions
 
     ofts = abstraction.ts
-    original_regions = abstraction.orig_ppp
     orig = abstraction._ppp2orig
 
     params = abstraction.disc_params
-    N = params['N']
+    if N is None:
+        N = params['N']
     conservative = params['conservative']
     closed_loop = params['closed_loop']
 
@@ -196,13 +210,13 @@ def get_input(
         raise Exception("get_input: "
             "Q must be square and have side N * dim(input space)")
     if ofts is not None:
-        start_state = 's' +str(start)
-        end_state = 's' +str(end)
+        start_state = abstraction.ppp2ts[start]
+        end_state = abstraction.ppp2ts[end]
 
         if end_state not in ofts.successors(start_state):
             raise Exception('get_input: '
-                'no transition from state s' +str(start) +
-                ' to state s' +str(end)
+                'no transition from state ' +str(start_state) +
+                ' to state ' +str(end_state)
             )
     else:
         print("get_input: "
@@ -213,82 +227,52 @@ def get_input(
             "partitions not given, reverting to conservative mode")
         conservative = True
 
-    P_start = regions[start]
     P_end = regions[end]
 
     n = ssys.A.shape[1]
-    m = ssys.B.shape[1]
-
     idx = range((N-1)*n, N*n)
+    # copy, so that mid_weight does not modify the caller's arrays
+    R = np.array(R, dtype=float)
+    r = np.array(r, dtype=float)
+
+    if workspace is None:
+        workspace = InputWorkspace()
+    P1 = workspace.start_set(abstraction, start, conservative)
+
+    if mid_weight > 0:
+        R[
+            np.ix_(
+                range(n*(N-1), n*N),
+                range(n*(N-1), n*N)
+            )
+        ] += mid_weight*np.eye(n)
 
-    if conservative:
-        # Take convex hull or P_start as constraint
-        if len(P_start) > 0:
-            if len(P_start) > 1:
-                # Take convex hull
-                vert = pc.extreme(P_start[0])
-                for i in range(1, len(P_start)):
-                    vert = np.hstack([
-                        vert,
-                        pc.extreme(P_start[i])
-                    ])
-                P1 = pc.qhull(vert)
-            else:
-                P1 = P_start[0]
-        else:
-            P1 = P_start
-    else:
-        # Take original proposition preserving cell as constraint
-        P1 = original_regions[orig[start]]
-
+    # polytopes in target region
     if len(P_end) > 0:
-        low_cost = np.inf
-        low_u = np.zeros([N,m])
-
-        # for each polytope in target region
-        for P3 in P_end:
-            if mid_weight > 0:
-                rc, xc = pc.cheby_ball(P3)
-                R[
-                    np.ix_(
-                        range(n*(N-1), n*N),
-                        range(n*(N-1), n*N)
-                    )
-                ] += mid_weight*np.eye(n)
-
-                r[idx, :] += -mid_weight*xc
-
-            try:
-                u, cost = get_input_helper(
-                    x0, ssys, P1, P3, N, R, r, Q,
-                    closed_loop=closed_loop
-                )
-                r[idx, :] += mid_weight*xc
-            except:
-                r[idx, :] += mid_weight*xc
-                continue
-
-            if cost < low_cost:
-                low_u = u
-                low_cost = cost
-
-        if low_cost == np.inf:
-            raise Exception("get_input: Did not find any trajectory")
+        targets = list(P_end)
     else:
-        P3 = P_end
+        targets = [P_end]
+    centers = abstraction.cheby_centers(end)
+
+    # prune targets that x(N) cannot reach
+    boxes = propagate_boxes((x0, x0), ssys, N)
+    reach = None if boxes is None else boxes[-1]
+    candidates = []
+    for P3, xc in zip(targets, centers):
+        if not boxes_meet(reach, bounding_box(P3), _PRUNE_TOL):
+            continue
+        r3 = r.copy()
         if mid_weight > 0:
-            rc, xc = pc.cheby_ball(P3)
-            R[
-                np.ix_(
-                    range(n*(N-1), n*N),
-                    range(n*(N-1), n*N)
-                )
-            ] += mid_weight*np.eye(n)
-            r[idx, :] += -mid_weight*xc
-        low_u, cost = get_input_helper(
-            x0, ssys, P1, P3, N, R, r, Q,
-            closed_loop=closed_loop
-        )
+            r3[idx, :] += -mid_weight*xc.reshape(n, 1)
+        candidates.append((P3, r3))
+
+    best = _solve_targets(
+        x0, ssys, P1, candidates, N, R, Q,
+        closed_loop, workspace
+    )
+    if best is None:
+        raise Exception("get_input: Did not find any trajectory")
+    low_u, cost, P3 = best
 
     if test_result:
         good = is_seq_inside(x0, low_u, ssys, P1, P3)
@@ -296,9 +280,10 @@ def get_input(
             print("Calculated sequence not good")
     return low_u
 
+@backend.call_site('get_input_helper')
 def get_input_helper(
     x0, ssys, P1, P3, N, R, r, Q,
-    closed_loop=True
+    closed_loop=True, workspace=None
 ):
     """Calculates the sequence u_seq such that:
 
@@ -308,94 +293,397 @@ def get_input_helper(
       - [u(k); x(k)] \in PU
 
     and minimizes x'Rx + 2*r'x + u'Qu
+
+    @param workspace: if given, then reuse the constraints
+        and the matrices that depend only on C{ssys, N, R, Q},
+        and start the QP solver from the previous solution.
+    @type workspace: L{InputWorkspace}
     """
-    n = ssys.A.shape[1]
     m = ssys.B.shape[1]
 
-    list_P = []
-    if closed_loop:
-        temp_part = P3
-        list_P.append(P3)
-        for i in xrange(N-1,0,-1):
-            temp_part = solve_feasible(
-                P1, temp_part, ssys, N=1,
-                closed_loop=False, trans_set=P1
-            )
-            list_P.insert(0, temp_part)
-        list_P.insert(0,P1)
-        L,M = createLM(ssys, N, list_P, disturbance_ind=[1])
-    else:
-        list_P.append(P1)
-        for i in xrange(N-1,0,-1):
-            list_P.append(P1)
-        list_P.append(P3)
-        L,M = createLM(ssys, N, list_P)
-
-    # Remove first constraint on x(0)
-    L = L[range(list_P[0].A.shape[0], L.shape[0]),:]
-    M = M[range(list_P[0].A.shape[0], M.shape[0]),:]
+    if workspace is None:
+        workspace = InputWorkspace()
+    c = workspace.constraints(ssys, N, P1, P3, closed_loop)
+    if c is None:
+        raise Exception("getInputHelper: "
+            "no state can reach P3 in N steps")
+    Lx, Lu, M = c
 
-    # Separate L matrix
-    Lx = L[:,range(n)]
-    Lu = L[:,range(n,L.shape[1])]
+    # Constraints
+    G = Lu
+    h = M - Lx.dot(x0).reshape(Lx.shape[0],1)
 
-    M = M - Lx.dot(x0).reshape(Lx.shape[0],1)
+    qp = workspace.qp(ssys, N, R, Q)
+    P = qp.P
+    q = qp.linear_cost(x0, r)
+    initvals = workspace.initial_guess(ssys, N)
 
-    # Constraints
-    G = matrix(Lu)
-    h = matrix(M)
+    sol = backend.qpsolve(P, q, G, h, initvals=initvals)
 
-    B_diag = ssys.B
-    for i in xrange(N-1):
-        B_diag = _block_diag2(B_diag,ssys.B)
-    K_hat = np.tile(ssys.K, (N,1))
-
-    A_it = ssys.A.copy()
-    A_row = np.zeros([n, n*N])
-    A_K = np.zeros([n*N, n*N])
-    A_N = np.zeros([n*N, n])
-
-    for i in xrange(N):
-        A_row = ssys.A.dot(A_row)
-        A_row[np.ix_(
-            range(n),
-            range(i*n, (i+1)*n)
-        )] = np.eye(n)
-
-        A_N[np.ix_(
-            range(i*n, (i+1)*n),
-            range(n)
-        )] = A_it
-
-        A_K[np.ix_(
-            range(i*n,(i+1)*n),
-            range(A_K.shape[1])
-        )] = A_row
-
-        A_it = ssys.A.dot(A_it)
-
-    Ct = A_K.dot(B_diag)
-    P = matrix(Q + Ct.T.dot(R).dot(Ct) )
-    q = matrix(
-        np.dot(
-            np.dot(x0.reshape(1, x0.size), A_N.T) +
-            A_K.dot(K_hat).T, R.dot(Ct)
-        ) +
-        r.T.dot(Ct)
-    ).T
-
-    sol = solvers.qp(P, q, G, h)
-
-    if sol['status'] != "optimal":
+    if sol['status'] != 0:
         raise Exception("getInputHelper: "
             "QP solver finished with status " +
             str(sol['status'])
         )
-    u = np.array(sol['x']).flatten()
-    cost = sol['primal objective']
+    u = sol['x']
+    cost = sol['fun']
+    qp.last_u = u
 
     return u.reshape(N, m), cost
 
+class InputWorkspace(object):
+    """Data reused by repeated calls of L{get_input}.
+
+    For each system and horizon, the matrices that map
+    inputs to states and the quadratic cost are computed once,
+    and the last input sequence found is kept
+    to warm-start the QP solver in the next call.
+    The cost is recomputed if C{R} or C{Q} change.
+
+    For each transition, the backward chain of
+    one-step feasible sets from the target is computed once,
+    up to the longest horizon used so far.
+    The chain for horizon C{N - 1} is a suffix of that for C{N},
+    so after the first step of a closed-loop transition
+    each recomputation of the input is a single QP.
+
+    Usage::
+
+        workspace = InputWorkspace()
+        for ...:
+            u = get_input(x, ssys, ab, i, j, workspace=workspace)
+    """
+    def __init__(self):
+        self._qps = dict()
+        self._start_sets = dict()
+        self._chains = dict()
+        self._constraints = dict()
+
+    def start_set(self, abstraction, start, conservative):
+        """Return constraint set on x(0) for transitions from C{start}.
+
+        @rtype: C{Polytope}
+        """
+        key = (id(abstraction), start, conservative)
+        c = self._start_sets.get(key)
+        if c is None:
+            P1 = _start_set(abstraction, start, conservative)
+            # keep abstraction, so that its id is not reused
+            c = (abstraction, P1)
+            self._start_sets[key] = c
+        return c[1]
+
+    def constraints(self, ssys, N, P1, P3, closed_loop):
+        """Return C{Lx, Lu, M}, with C{Lx x(0) + Lu u <= M}.
+
+        The constraint on x(0) is excluded.
+
+        @return: C{None} if some feasible set is empty,
+            so no x(0) can reach C{P3}
+        """
+        key = (id(ssys), id(P1), id(P3), N, closed_loop)
+        c = self._constraints.get(key)
+        if c is not None:
+            return c[1]
+        n = ssys.A.shape[1]
+        if closed_loop:
+            list_P = self.chain(ssys, P1, P3).list_P(N)
+            if any(pc.is_empty(p) for p in list_P):
+                self._constraints[key] = ((ssys, P1, P3), None)
+                return None
+            L, M = createLM(ssys, N, list_P, disturbance_ind=[1])
+        else:
+            list_P = N * [P1] + [P3]
+            L, M = createLM(ssys, N, list_P)
+
+        # Remove first constraint on x(0)
+        L = L[range(list_P[0].A.shape[0], L.shape[0]),:]
+        M = M[range(list_P[0].A.shape[0], M.shape[0]),:]
+
+        # Separate L matrix
+        Lx = L[:,range(n)]
+        Lu = L[:,range(n,L.shape[1])]
+
+        self._constraints[key] = ((ssys, P1, P3), (Lx, Lu, M))
+        return Lx, Lu, M
+
+    def chain(self, ssys, P1, P3):
+        """Return chain of feasible sets from C{P1} to C{P3}.
+
+        @rtype: L{_FeasibleChain}
+        """
+        key = (id(ssys), id(P1), id(P3))
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = _FeasibleChain(ssys, P1, P3)
+            self._chains[key] = chain
+        return chain
+
+    def qp(self, ssys, N, R, Q):
+        """Return cached data for C{ssys, N, R, Q}.
+
+        @rtype: L{_InputQP}
+        """
+        key = (id(ssys), N)
+        qp = self._qps.get(key)
+        if qp is None or not qp.matches(ssys, R, Q):
+            qp = _InputQP(ssys, N, R, Q)
+            self._qps[key] = qp
+        return qp
+
+    def initial_guess(self, ssys, N):
+        """Return last input sequence for C{ssys} and horizon C{N}.
+
+        If there is none, then shift the last sequence
+        for horizon C{N + 1}, as in receding horizon control.
+
+        @return: C{None} if no sequence found yet
+        """
+        qp = self._qps.get((id(ssys), N))
+        if qp is not None and qp.last_u is not None:
+            return qp.last_u
+        qp = self._qps.get((id(ssys), N + 1))
+        if qp is not None and qp.last_u is not None:
+            m = ssys.B.shape[1]
+            return qp.last_u[m:]
+        return None
+
+class _FeasibleChain(object):
+    """Sets C{S_0 = P3}, C{S_{k+1}} = states in C{P1}
+    that can be driven to C{S_k} in one step, staying in C{P1}.
+    """
+    def __init__(self, ssys, P1, P3):
+        self.ssys = ssys
+        self.P1 = P1
+        self.sets = [P3]
+
+    def list_P(self, N):
+        """Return C{[P1, S_{N-1}, ..., S_1, S_0]}."""
+        while len(self.sets) < N:
+            self.sets.append(solve_feasible(
+                self.P1, self.sets[-1], self.ssys, N=1,
+                closed_loop=False, trans_set=self.P1
+            ))
+        return [self.P1] + self.sets[N-1::-1]
+
+class RecedingHorizonInput(object):
+    """Closed-loop input for one transition of an abstraction.
+
+    As in Note 2 of L{get_input}, the input is recomputed
+    at each step, with horizon C{N, N - 1, ..., 1}.
+    The feasible sets are computed in the first step
+    and reused, so each later step solves a single QP.
+
+    Usage::
+
+        f = RecedingHorizonInput(ssys, ab, start, end)
+        while not f.done:
+            u = f(x)
+            x = ...
+
+    @param cost: passed to L{get_input},
+        C{R, r, Q} for the full horizon C{N},
+        and truncated as the horizon shrinks.
+    """
+    def __init__(
+        self, ssys, abstraction, start, end,
+        N=None, workspace=None, **cost
+    ):
+        if N is None:
+            N = abstraction.disc_params['N']
+        if workspace is None:
+            workspace = InputWorkspace()
+        self.ssys = ssys
+        self.abstraction = abstraction
+        self.start = start
+        self.end = end
+        self.N = N
+        self.workspace = workspace
+        self.cost = cost
+        self.k = 0
+
+    @property
+    def done(self):
+        """C{True} after C{N} inputs have been returned."""
+        return self.k >= self.N
+
+    def __call__(self, x):
+        """Return input for current state C{x}.
+
+        @rtype: 1d C{numpy.ndarray}
+        """
+        if self.done:
+            raise Exception('RecedingHorizonInput: '
+                'transition already completed')
+        u = get_input(
+            x, self.ssys, self.abstraction, self.start, self.end,
+            N=self.N - self.k, workspace=self.workspace,
+            **self._cost()
+        )
+        self.k += 1
+        return u[0, :]
+
+    def _cost(self):
+        """Return cost for remaining horizon."""
+        n = self.ssys.A.shape[1]
+        m = self.ssys.B.shape[1]
+        i = self.k * n
+        j = self.k * m
+        cost = dict(self.cost)
+        if len(cost.get('R', [])) > 0:
+            cost['R'] = cost['R'][i:, i:]
+        if len(cost.get('r', [])) > 0:
+            cost['r'] = cost['r'][i:, :]
+        if len(cost.get('Q', [])) > 0:
+            cost['Q'] = cost['Q'][j:, j:]
+        return cost
+
+class _InputQP(object):
+    """Cost matrices of L{get_input_helper} for given C{ssys, N, R, Q}.
+
+    The states are::
+
+        x = A_N x(0) + A_K (B_diag u + K_hat)
+
+    so the cost x'Rx + 2r'x + u'Qu is::
+
+        u'P u + 2 q'u + const,
+
+    with C{P = Q + Ct'R Ct} and C{Ct = A_K B_diag}.
+    """
+    def __init__(self, ssys, N, R, Q):
+        n = ssys.A.shape[1]
+
+        B_diag = ssys.B
+        for i in xrange(N-1):
+            B_diag = _block_diag2(B_diag,ssys.B)
+        K_hat = np.tile(ssys.K, (N,1))
+
+        A_it = ssys.A.copy()
+        A_row = np.zeros([n, n*N])
+        A_K = np.zeros([n*N, n*N])
+        A_N = np.zeros([n*N, n])
+
+        for i in xrange(N):
+            A_row = ssys.A.dot(A_row)
+            A_row[np.ix_(
+                range(n),
+                range(i*n, (i+1)*n)
+            )] = np.eye(n)
+
+            A_N[np.ix_(
+                range(i*n, (i+1)*n),
+                range(n)
+            )] = A_it
+
+            A_K[np.ix_(
+                range(i*n,(i+1)*n),
+                range(A_K.shape[1])
+            )] = A_row
+
+            A_it = ssys.A.dot(A_it)
+
+        Ct = A_K.dot(B_diag)
+        self.ssys = ssys
+        self.R = np.array(R, dtype=float)
+        self.Q = np.array(Q, dtype=float)
+        self.A_N = A_N
+        self.offset = A_K.dot(K_hat)
+        self.Ct = Ct
+        self.RCt = self.R.dot(Ct)
+        self.P = self.Q + Ct.T.dot(self.RCt)
+        self.last_u = None
+
+    def matches(self, ssys, R, Q):
+        return (ssys is self.ssys and
+                np.array_equal(R, self.R) and
+                np.array_equal(Q, self.Q))
+
+    def linear_cost(self, x0, r):
+        """Return C{q} for initial state C{x0}."""
+        x_free = self.A_N.dot(x0.reshape(x0.size, 1)) + self.offset
+        return (x_free.T.dot(self.RCt) + r.T.dot(self.Ct)).T
+
+@backend.call_site('solve_targets')
+def _solve_targets(
+    x0, ssys, P1, candidates, N, R, Q,
+    closed_loop, workspace
+):
+    """Return least cost input over target polytopes.
+
+    The QPs share the cost matrix C{P} and differ in
+    the constraints and the linear cost.
+    Each QP is solved separately.
+
+    @param candidates: C{[(P3, r), ...]}
+
+    @return: C{(u, cost, P3)}, or C{None} if all are infeasible
+    """
+    m = ssys.B.shape[1]
+    qp = workspace.qp(ssys, N, R, Q)
+    # prune targets with empty feasible sets
+    feasible = list()
+    problems = list()
+    for P3, r3 in candidates:
+        c = workspace.constraints(ssys, N, P1, P3, closed_loop)
+        if c is None:
+            continue
+        Lx, Lu, M = c
+        h = M - Lx.dot(x0).reshape(Lx.shape[0], 1)
+        q = qp.linear_cost(x0, r3)
+        feasible.append(P3)
+        problems.append((Lu, h, q))
+    guess = workspace.initial_guess(ssys, N)
+    solutions = [
+        _solve_one(qp.P, qi, Gi, hi, guess)
+        for Gi, hi, qi in problems]
+    best = None
+    for P3, sol in zip(feasible, solutions):
+        if sol is None:
+            continue
+        u, cost = sol
+        if best is None or cost < best[1]:
+            best = (u, cost, P3)
+    if best is None:
+        return None
+    u, cost, P3 = best
+    qp.last_u = u
+    return u.reshape(N, m), cost, P3
+
+def _solve_one(P, q, G, h, initvals):
+    """Return C{(u, cost)}, or C{None} if infeasible."""
+    sol = backend.qpsolve(P, q, G, h, initvals=initvals)
+    if sol['status'] != 0:
+        return None
+    return sol['x'], sol['fun']
+
+def _start_set(abstraction, start, conservative):
+    """Return constraint set on x(0) for transitions from C{start}."""
+    P_start = abstraction.ppp.regions[start]
+    if conservative:
+        # Take convex hull or P_start as constraint
+        if len(P_start) > 0:
+            if len(P_start) > 1:
+                # Take convex hull
+                vert = pc.extreme(P_start[0])
+                for i in range(1, len(P_start)):
+                    vert = np.hstack([
+                        vert,
+                        pc.extreme(P_start[i])
+                    ])
+                P1 = pc.qhull(vert)
+            else:
+                P1 = P_start[0]
+        else:
+            P1 = P_start
+    else:
+        # Take the convex cell that was the transition set
+        # during discretization as constraint
+        P1, _ = abstraction.ppp2trans(start)
+        if isinstance(P1, pc.Region) and len(P1) == 1:
+            P1 = P1[0]
+    return P1
+
 def is_seq_inside(x0, u_seq, ssys, P0, P1):
     """Checks if the plant remains inside P0 for time t = 1, ... N-1
     and  that the plant reaches P1 for time t = N.
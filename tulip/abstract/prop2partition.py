@@ -36,12 +36,14 @@ import logging
 logger = logging.getLogger(__name__)
 import warnings
 import copy
+import multiprocessing as mp
 import numpy as np
 from scipy import sparse as sp
 import polytope as pc
 from polytope.plot import plot_partition
 from tulip import transys as trs
 from tulip.transys.labeled_graphs import add_adj
+from .feasible import bounding_box, boxes_meet
 # inline imports:
 #
 # from tulip.graphics import newax
@@ -172,7 +174,7 @@ def part2convex(ppp):
 
     return (cvxpart, new2old)
 
-def pwa_partition(pwa_sys, ppp, abs_tol=1e-5):
+def pwa_partition(pwa_sys, ppp, abs_tol=1e-5, processes=1):
     """This function takes:
 
       - a piecewise affine system C{pwa_sys} and
@@ -182,6 +184,17 @@ def pwa_partition(pwa_sys, ppp, abs_tol=1e-5):
     and returns a *refined* proposition preserving partition
     where in each region a unique subsystem of pwa_sys is active.
 
+    Only pairs of subsystem domain and region with
+    intersecting bounding boxes are intersected.
+    A region that meets the domain of a single subsystem
+    is inside that domain, so it is copied as is.
+    Adjacency is inherited from C{ppp.adj}:
+    pieces of non-adjacent regions are not adjacent,
+    and pieces equal to their parent regions are adjacent
+    whenever their parents are.
+    The remaining pairs are tested only if their
+    bounding boxes touch.
+
     Reference
     =========
     Modified from Petter Nilsson's code
@@ -198,6 +211,11 @@ def pwa_partition(pwa_sys, ppp, abs_tol=1e-5):
     @type pwa_sys: L{hybrid.PwaSysDyn}
     @type ppp: L{PropPreservingPartition}
 
+    @param processes: number of worker processes
+        used to compute intersections.
+        If C{None}, then use C{multiprocessing.cpu_count()}.
+    @type processes: C{int}
+
     @return: new partition and associated maps:
 
         - new partition C{new_ppp}
@@ -213,49 +231,79 @@ def pwa_partition(pwa_sys, ppp, abs_tol=1e-5):
     # for each subsystem's domain, cut it into pieces
     # each piece is the intersection with
     # a unique Region in ppp.regions
-    new_list = []
-    subsys_list = []
-    parents = []
+    sys_boxes = [bounding_box(s.domain) for s in pwa_sys.list_subsys]
+    reg_boxes = [bounding_box(r) for r in ppp.regions]
+    candidates = [
+        [i for i, b in enumerate(sys_boxes)
+         if boxes_meet(b, reg_boxes[j], 0)]
+        for j in xrange(len(ppp.regions))]
+    tasks = list()
     for i, subsys in enumerate(pwa_sys.list_subsys):
         for j, region in enumerate(ppp.regions):
-            isect = region.intersect(subsys.domain)
-
-            if pc.is_fulldim(isect):
-                rc, xc = pc.cheby_ball(isect)
-
-                if rc < abs_tol:
-                    msg = 'One of the regions in the refined PPP is '
-                    msg += 'too small, this may cause numerical problems'
-                    warnings.warn(msg)
+            if i not in candidates[j]:
+                continue
+            whole = (len(candidates[j]) == 1)
+            tasks.append((i, j, whole))
+    args = [(ppp.regions[j], pwa_sys.list_subsys[i].domain, w)
+            for i, j, w in tasks]
+    if processes == 1:
+        results = map(_intersect_region, args)
+    else:
+        pool = mp.Pool(processes)
+        try:
+            results = pool.map(_intersect_region, args)
+        finally:
+            pool.close()
+            pool.join()
+    logger.info('pwa_partition: intersected {n} of {m} pairs'.format(
+        n=len(tasks), m=len(pwa_sys.list_subsys) * len(ppp.regions)))
 
-                # not Region yet, but Polytope ?
-                if len(isect) == 0:
-                    isect = pc.Region([isect])
+    new_list = []
+    subsys_list = []
+    parents = []
+    is_whole = []
+    for (i, j, whole), (isect, rc) in zip(tasks, results):
+        if isect is None:
+            continue
+        if rc < abs_tol:
+            msg = 'One of the regions in the refined PPP is '
+            msg += 'too small, this may cause numerical problems'
+            warnings.warn(msg)
 
-                # label with AP
-                isect.props = region.props.copy()
+        # label with AP
+        isect.props = ppp.regions[j].props.copy()
 
-                # store new Region
-                new_list.append(isect)
+        # store new Region
+        new_list.append(isect)
 
-                # keep track of original Region in ppp.regions
-                parents.append(j)
+        # keep track of original Region in ppp.regions
+        parents.append(j)
 
-                # index of subsystem active within isect
-                subsys_list.append(i)
+        # index of subsystem active within isect
+        subsys_list.append(i)
+        is_whole.append(whole)
 
     # compute spatial adjacency matrix
     n = len(new_list)
+    boxes = [reg_boxes[j] if whole else bounding_box(r)
+             for r, j, whole in zip(new_list, parents, is_whole)]
     adj = sp.lil_matrix((n, n), dtype=np.int8)
     for i, ri in enumerate(new_list):
         pi = parents[i]
         for j, rj in enumerate(new_list[0:i]):
             pj = parents[j]
 
-            if (ppp.adj[pi, pj] == 1) or (pi == pj):
-                if pc.is_adjacent(ri, rj):
-                    adj[i, j] = 1
-                    adj[j, i] = 1
+            if (ppp.adj[pi, pj] != 1) and (pi != pj):
+                continue
+            if is_whole[i] and is_whole[j]:
+                is_adj = (pi != pj)
+            else:
+                is_adj = (
+                    boxes_meet(boxes[i], boxes[j], abs_tol) and
+                    pc.is_adjacent(ri, rj))
+            if is_adj:
+                adj[i, j] = 1
+                adj[j, i] = 1
         adj[i, i] = 1
 
     new_ppp = PropPreservingPartition(
@@ -266,6 +314,28 @@ def pwa_partition(pwa_sys, ppp, abs_tol=1e-5):
     )
     return (new_ppp, subsys_list, parents)
 
+def _intersect_region(args):
+    """Return intersection of region with domain and its Chebyshev radius.
+
+    @param args: C{(region, domain, whole)},
+        where C{whole} means that C{region} is known
+        to be a subset of C{domain}.
+
+    @return: C{(isect, rc)}, with C{isect = None} if not fulldim
+    """
+    region, domain, whole = args
+    if whole:
+        isect = region.copy()
+    else:
+        isect = region.intersect(domain)
+    if not pc.is_fulldim(isect):
+        return (None, None)
+    rc, xc = pc.cheby_ball(isect)
+    # not Region yet, but Polytope ?
+    if len(isect) == 0:
+        isect = pc.Region([isect])
+    return (isect, rc)
+
 def add_grid(ppp, grid_size=None, num_grid_pnts=None, abs_tol=1e-10):
     """ This function takes a proposition preserving partition ppp and the size
     of the grid or the number of grids, and returns a refined proposition
@@ -0,0 +1,600 @@
+# Copyright (c) 2014 by California Institute of Technology
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the California Institute of Technology nor
+#    the names of its contributors may be used to endorse or promote
+#    products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL CALTECH
+# OR THE CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+"""
+Compact binary storage of partitions and abstractions.
+
+A partition or abstraction is saved as a single C{.npz} container.
+The polytopes of all regions are stacked into one array of
+H-representation rows, indexed by offset arrays::
+
+    poly_A[poly_ptr[k]:poly_ptr[k+1]]  (rows of polytope k)
+    reg_ptr[i]:reg_ptr[i+1]            (polytopes of region i)
+
+The adjacency is stored in CSR form and the maps C{ppp2*}
+of an L{AbstractPwa} as integer arrays.
+Chebyshev balls are saved too, as well as any bounding boxes
+and volumes already computed, so that loading does not need
+to solve any LP.
+
+Loading is lazy: a region is constructed on first access.
+Unless the container is compressed, the arrays are memory-mapped,
+so a controller process can start without reading every polytope.
+
+Primary functions:
+    - L{save_partition}, L{load_partition}
+    - L{save_abstraction}, L{load_abstraction}
+
+See Also
+========
+L{discretize}, L{prop2part}
+"""
+from __future__ import absolute_import
+import logging
+logger = logging.getLogger(__name__)
+import json
+import struct
+import zipfile
+
+import numpy as np
+from scipy import sparse as sp
+import polytope as pc
+
+from tulip import transys as trs
+from tulip.hybrid import LtiSysDyn, PwaSysDyn
+from .prop2partition import PropPreservingPartition
+from .discretization import AbstractPwa
+
+FORMAT_VERSION = 1
+
+# region kinds
+_POLYTOPE = 0
+_REGION = 1
+
+_PARTITIONS = ('ppp', 'pwa_ppp', 'orig_ppp')
+_MAPS = ('ppp2ts', 'ppp2pwa', 'ppp2sys', 'ppp2orig')
+
+
+def save_partition(ppp, filename, compress=False):
+    """Save proposition preserving partition to C{.npz} file.
+
+    @type ppp: L{PropPreservingPartition}
+
+    @param filename: path of container, conventionally C{*.npz}
+    @type filename: str
+
+    @param compress: if C{True}, then deflate the arrays.
+        Compressed containers are smaller,
+        but cannot be memory-mapped when loaded.
+    @type compress: bool
+    """
+    meta = {'kind': 'partition'}
+    arrays = _pack_partition(ppp, 'ppp_', meta)
+    _write(filename, arrays, meta, compress)
+
+
+def load_partition(filename, mmap=True):
+    """Load partition saved with L{save_partition}.
+
+    Regions are constructed on first access.
+
+    @param mmap: memory-map arrays of uncompressed containers
+    @type mmap: bool
+
+    @rtype: L{PropPreservingPartition}
+    """
+    arrays, meta = _read(filename, mmap)
+    if meta['kind'] != 'partition':
+        raise ValueError(
+            'container holds: {k}, not a partition'.format(k=meta['kind']))
+    return _unpack_partition(arrays, 'ppp_', meta)
+
+
+def save_abstraction(ab, filename, compress=False):
+    """Save discrete abstraction to C{.npz} file.
+
+    Stores the partitions C{ppp}, C{pwa_ppp}, C{orig_ppp},
+    the maps C{ppp2ts}, C{ppp2pwa}, C{ppp2sys}, C{ppp2orig},
+    the dynamics C{pwa}, the edges of C{ts}
+    and the discretization parameters.
+
+    The transition system must be the one created by L{discretize},
+    i.e., its variables are the continuous propositions.
+
+    @type ab: L{AbstractPwa}
+
+    @param compress: see L{save_partition}
+    """
+    meta = {'kind': 'abstraction', 'partitions': list()}
+    arrays = dict()
+    for name in _PARTITIONS:
+        ppp = getattr(ab, name)
+        if ppp is None:
+            continue
+        arrays.update(_pack_partition(ppp, name + '_', meta))
+        meta['partitions'].append(name)
+    maps = {
+        'ppp2ts': ab.ppp2ts,
+        'ppp2pwa': ab._ppp2pwa,
+        'ppp2sys': ab._ppp2sys,
+        'ppp2orig': ab._ppp2orig}
+    for name, x in maps.iteritems():
+        if x is None:
+            continue
+        arrays[name] = np.array(list(x))
+    if ab.ts is not None:
+        node2int = {u: k for k, u in enumerate(ab.ts.nodes_iter())}
+        edges = [(node2int[u], node2int[v])
+                 for u, v in ab.ts.edges_iter()]
+        arrays['ts_nodes'] = np.array(ab.ts.nodes())
+        arrays['ts_edges'] = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        meta['ts_vars'] = sorted(ab.ts.vars)
+    if ab.pwa is not None:
+        arrays.update(_pack_dynamics(ab.pwa, meta))
+    meta['disc_params'] = ab.disc_params
+    _write(filename, arrays, meta, compress)
+
+
+def load_abstraction(filename, mmap=True):
+    """Load abstraction saved with L{save_abstraction}.
+
+    Regions of the partitions are constructed on first access.
+    The transition system is rebuilt from the stored edges,
+    with nodes labeled by the propositions of each region.
+
+    @param mmap: see L{load_partition}
+
+    @rtype: L{AbstractPwa}
+    """
+    arrays, meta = _read(filename, mmap)
+    if meta['kind'] != 'abstraction':
+        raise ValueError(
+            'container holds: {k}, not an abstraction'.format(
+                k=meta['kind']))
+    parts = {name: _unpack_partition(arrays, name + '_', meta)
+             for name in meta['partitions']}
+    maps = {name: arrays[name].tolist() if name in arrays else None
+            for name in _MAPS}
+    ts = None
+    if 'ts_edges' in arrays:
+        ppp = parts['ppp']
+        props = _region_props(arrays, 'ppp_')
+        ts = trs.TransitionSystem()
+        nodes = arrays['ts_nodes'].tolist()
+        ts.add_nodes_from(nodes)
+        edges = arrays['ts_edges']
+        ts.add_edges_from((nodes[i], nodes[j]) for i, j in edges.tolist())
+        for p in meta['ts_vars']:
+            ts.vars[str(p)] = 'boolean'
+        for i, u in enumerate(maps['ppp2ts']):
+            d = ts.node[u]
+            for p in ts.vars:
+                d[p] = (p in props[i])
+        assert len(ppp) == len(maps['ppp2ts'])
+    pwa = None
+    if 'dyn_A' in arrays:
+        pwa = _unpack_dynamics(arrays, meta)
+    disc_params = {str(k): v for k, v in meta['disc_params'].iteritems()}
+    return AbstractPwa(
+        ppp=parts.get('ppp'),
+        ts=ts,
+        ppp2ts=maps['ppp2ts'],
+        pwa=pwa,
+        pwa_ppp=parts.get('pwa_ppp'),
+        ppp2pwa=maps['ppp2pwa'],
+        ppp2sys=maps['ppp2sys'],
+        orig_ppp=parts.get('orig_ppp'),
+        ppp2orig=maps['ppp2orig'],
+        disc_params=disc_params)
+
+
+class LazyRegions(object):
+    """Sequence of regions constructed on first access.
+
+    Used as C{PropPreservingPartition.regions} of loaded partitions.
+    Slicing and copying return C{list}s of regions,
+    so code that modifies the regions of a partition,
+    e.g., L{discretize}, receives ordinary lists.
+    """
+
+    def __init__(self, arrays, prefix, props):
+        self._arrays = arrays
+        self._prefix = prefix
+        self._props = props
+        self._reg_ptr = arrays[prefix + 'reg_ptr']
+        self._kind = arrays[prefix + 'reg_kind']
+        self._cache = dict()
+
+    def __len__(self):
+        return len(self._kind)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in xrange(*key.indices(len(self)))]
+        n = len(self)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError('region index out of range')
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        region = _make_region(
+            self._arrays, self._prefix, key,
+            self._kind[key], self._props[key])
+        self._cache[key] = region
+        return region
+
+    def __copy__(self):
+        return self[:]
+
+    def __deepcopy__(self, memo):
+        return [r.copy() for r in self]
+
+    @property
+    def num_loaded(self):
+        """Number of regions constructed so far."""
+        return len(self._cache)
+
+
+def _pack_partition(ppp, prefix, meta):
+    """Return C{dict} of arrays that represent C{ppp}."""
+    arrays = _pack_regions(ppp.regions, prefix)
+    arrays.update(_pack_regions([ppp.domain], prefix + 'domain_'))
+    # propositions
+    if ppp.prop_regions is None:
+        prop_names = list()
+    else:
+        prop_names = sorted(ppp.prop_regions)
+        arrays.update(_pack_regions(
+            [ppp.prop_regions[p] for p in prop_names],
+            prefix + 'prop_'))
+    meta[prefix + 'props'] = prop_names
+    meta[prefix + 'has_props'] = ppp.prop_regions is not None
+    index = {p: k for k, p in enumerate(prop_names)}
+    labels = np.zeros((len(ppp.regions), len(prop_names)), dtype=bool)
+    for i, region in enumerate(ppp.regions):
+        for p in region.props:
+            labels[i, index[p]] = True
+    arrays[prefix + 'reg_props'] = labels
+    # adjacency
+    if ppp.adj is not None:
+        adj = sp.csr_matrix(ppp.adj)
+        arrays[prefix + 'adj_indptr'] = adj.indptr.astype(np.int64)
+        arrays[prefix + 'adj_indices'] = adj.indices.astype(np.int64)
+        arrays[prefix + 'adj_shape'] = np.array(adj.shape, dtype=np.int64)
+    return arrays
+
+
+def _pack_regions(regions, prefix):
+    """Stack H-representations of polytopes or regions."""
+    kind = list()
+    reg_ptr = [0]
+    polys = list()
+    for region in regions:
+        if isinstance(region, pc.Region):
+            kind.append(_REGION)
+            polys.extend(region.list_poly)
+        else:
+            kind.append(_POLYTOPE)
+            polys.append(region)
+        reg_ptr.append(len(polys))
+    dim = max([_dim(p) for p in polys] or [0])
+    poly_ptr = [0]
+    A = list()
+    b = list()
+    chebr = np.zeros(len(polys))
+    chebx = np.zeros((len(polys), dim))
+    bbox = np.zeros((len(polys), 2, dim))
+    volume = np.zeros(len(polys))
+    for k, p in enumerate(polys):
+        if p.A.size > 0:
+            A.append(p.A)
+            b.append(p.b.flatten())
+        poly_ptr.append(poly_ptr[-1] + _nrows(p))
+        r, xc = pc.cheby_ball(p)
+        chebr[k] = r
+        if xc is not None:
+            chebx[k, :_dim(p)] = np.asarray(xc).flatten()
+        # store bounding box and volume only if already computed,
+        # because volume is estimated by sampling
+        if p.bbox is not None:
+            l, u = p.bbox
+            bbox[k, 0, :_dim(p)] = np.asarray(l).flatten()
+            bbox[k, 1, :_dim(p)] = np.asarray(u).flatten()
+        else:
+            bbox[k, ...] = np.nan
+        if p._volume is not None:
+            volume[k] = p._volume
+        else:
+            volume[k] = np.nan
+    if A:
+        A = np.vstack(A)
+        b = np.hstack(b)
+    else:
+        A = np.zeros((0, dim))
+        b = np.zeros(0)
+    return {
+        prefix + 'poly_A': A,
+        prefix + 'poly_b': b,
+        prefix + 'poly_ptr': np.array(poly_ptr, dtype=np.int64),
+        prefix + 'poly_chebr': chebr,
+        prefix + 'poly_chebx': chebx,
+        prefix + 'poly_bbox': bbox,
+        prefix + 'poly_volume': volume,
+        prefix + 'reg_ptr': np.array(reg_ptr, dtype=np.int64),
+        prefix + 'reg_kind': np.array(kind, dtype=np.int8)}
+
+
+def _dim(p):
+    if p.A.size == 0:
+        return 0
+    return p.A.shape[1]
+
+
+def _nrows(p):
+    if p.A.size == 0:
+        return 0
+    return p.A.shape[0]
+
+
+def _unpack_partition(arrays, prefix, meta):
+    props = _region_props(arrays, prefix)
+    regions = LazyRegions(arrays, prefix, props)
+    domain = _make_region(
+        arrays, prefix + 'domain_', 0,
+        arrays[prefix + 'domain_reg_kind'][0], set())
+    if meta[prefix + 'has_props']:
+        prop_names = meta[prefix + 'props']
+        prop_kind = arrays[prefix + 'prop_reg_kind']
+        prop_regions = {
+            str(p): _make_region(
+                arrays, prefix + 'prop_', k, prop_kind[k], set())
+            for k, p in enumerate(prop_names)}
+    else:
+        prop_regions = None
+    ppp = PropPreservingPartition(
+        domain=domain, regions=list(),
+        prop_regions=prop_regions, check=False)
+    ppp.regions = regions
+    if prefix + 'adj_indptr' in arrays:
+        n, m = arrays[prefix + 'adj_shape']
+        indices = arrays[prefix + 'adj_indices']
+        adj = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.int8),
+             indices, arrays[prefix + 'adj_indptr']),
+            shape=(n, m))
+        ppp.adj = adj.tolil()
+    return ppp
+
+
+def _region_props(arrays, prefix):
+    """Return C{list} of proposition sets, one per region."""
+    meta = arrays['__meta__']
+    names = [str(p) for p in meta[prefix + 'props']]
+    labels = np.asarray(arrays[prefix + 'reg_props'])
+    return [{names[k] for k in np.flatnonzero(row)} for row in labels]
+
+
+def _make_region(arrays, prefix, i, kind, props):
+    """Construct region C{i} from the stacked arrays."""
+    reg_ptr = arrays[prefix + 'reg_ptr']
+    polys = [_make_polytope(arrays, prefix, k)
+             for k in xrange(reg_ptr[i], reg_ptr[i + 1])]
+    if kind == _POLYTOPE:
+        (poly, ) = polys
+        return poly
+    region = pc.Region(polys, props)
+    return region
+
+
+def _make_polytope(arrays, prefix, k):
+    poly_ptr = arrays[prefix + 'poly_ptr']
+    start, end = poly_ptr[k], poly_ptr[k + 1]
+    if start == end:
+        return pc.Polytope()
+    A = np.array(arrays[prefix + 'poly_A'][start:end])
+    b = np.array(arrays[prefix + 'poly_b'][start:end])
+    dim = A.shape[1]
+    r = float(arrays[prefix + 'poly_chebr'][k])
+    poly = pc.Polytope(
+        A, b, minrep=True, chebR=r,
+        chebX=np.array(arrays[prefix + 'poly_chebx'][k][:dim]),
+        fulldim=r > pc.polytope.ABS_TOL,
+        normalize=False)
+    bbox = arrays[prefix + 'poly_bbox'][k][:, :dim]
+    if not np.isnan(bbox).any():
+        poly.bbox = (bbox[0].reshape(-1, 1).copy(),
+                     bbox[1].reshape(-1, 1).copy())
+    vol = float(arrays[prefix + 'poly_volume'][k])
+    if not np.isnan(vol):
+        poly._volume = vol
+    return poly
+
+
+def _pack_dynamics(pwa, meta):
+    """Stack matrices and sets of each subsystem."""
+    if isinstance(pwa, LtiSysDyn):
+        meta['dyn_kind'] = 'lti'
+        subsys = [pwa]
+    elif isinstance(pwa, PwaSysDyn):
+        meta['dyn_kind'] = 'pwa'
+        subsys = pwa.list_subsys
+    else:
+        raise TypeError(
+            'dynamics of type: {t} not supported'.format(t=type(pwa)))
+    meta['dyn_time'] = [pwa.time_semantics, pwa.timestep]
+    arrays = {
+        'dyn_A': np.array([s.A for s in subsys]),
+        'dyn_B': np.array([s.B for s in subsys]),
+        'dyn_E': np.array([s.E for s in subsys]),
+        'dyn_K': np.array([s.K for s in subsys])}
+    arrays.update(_pack_regions([s.Uset for s in subsys], 'dyn_Uset_'))
+    arrays.update(_pack_regions([s.Wset for s in subsys], 'dyn_Wset_'))
+    arrays.update(_pack_regions(
+        [s.domain for s in subsys], 'dyn_domain_'))
+    arrays.update(_pack_regions([pwa.domain], 'dyn_pwa_domain_'))
+    return arrays
+
+
+def _unpack_dynamics(arrays, meta):
+    time_semantics, timestep = meta['dyn_time']
+    if time_semantics is not None:
+        time_semantics = str(time_semantics)
+    kinds = {
+        name: arrays['dyn_' + name + '_reg_kind']
+        for name in ('Uset', 'Wset', 'domain')}
+    subsys = list()
+    for k in xrange(len(arrays['dyn_A'])):
+        sets = {
+            name: _make_region(
+                arrays, 'dyn_' + name + '_', k, kinds[name][k], set())
+            for name in kinds}
+        E = np.array(arrays['dyn_E'][k])
+        Wset = sets['Wset']
+        if not Wset.A.size:
+            Wset = None
+        s = LtiSysDyn(
+            A=np.array(arrays['dyn_A'][k]),
+            B=np.array(arrays['dyn_B'][k]),
+            E=E, K=np.array(arrays['dyn_K'][k]),
+            Uset=sets['Uset'], Wset=Wset,
+            domain=sets['domain'],
+            time_semantics=time_semantics,
+            timestep=timestep)
+        if Wset is None:
+            s.Wset = pc.Polytope()
+        subsys.append(s)
+    if meta['dyn_kind'] == 'lti':
+        (s, ) = subsys
+        return s
+    domain = _make_region(
+        arrays, 'dyn_pwa_domain_', 0,
+        arrays['dyn_pwa_domain_reg_kind'][0], set())
+    return PwaSysDyn(
+        list_subsys=subsys, domain=domain,
+        time_semantics=time_semantics, timestep=timestep)
+
+
+def _write(filename, arrays, meta, compress):
+    meta['version'] = FORMAT_VERSION
+    arrays = dict(arrays)
+    arrays['__meta__'] = np.array(json.dumps(meta))
+    if compress:
+        np.savez_compressed(filename, **arrays)
+    else:
+        np.savez(filename, **arrays)
+    logger.info('saved {n} arrays to: {f}'.format(n=len(arrays), f=filename))
+
+
+def _read(filename, mmap):
+    """Return C{dict} of arrays and the metadata of a container."""
+    npz = np.load(filename)
+    meta = json.loads(str(npz['__meta__']))
+    if meta['version'] != FORMAT_VERSION:
+        raise ValueError(
+            'unsupported format version: {v}'.format(v=meta['version']))
+    arrays = _LazyArrays(filename, npz, mmap)
+    arrays['__meta__'] = meta
+    return arrays, meta
+
+
+class _LazyArrays(dict):
+    """Read arrays from container on first access."""
+
+    def __init__(self, filename, npz, mmap):
+        super(_LazyArrays, self).__init__()
+        self._npz = npz
+        self._names = set(npz.files)
+        self._offsets = _member_offsets(filename) if mmap else dict()
+        self._filename = filename
+
+    def __contains__(self, name):
+        return (
+            super(_LazyArrays, self).__contains__(name) or
+            name in self._names)
+
+    def __missing__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        x = None
+        if name in self._offsets:
+            x = _memmap(self._filename, self._offsets[name])
+        if x is None:
+            x = self._npz[name]
+        self[name] = x
+        return x
+
+
+def _member_offsets(filename):
+    """Return offsets of uncompressed arrays stored in C{filename}."""
+    offsets = dict()
+    with zipfile.ZipFile(filename) as z:
+        infos = z.infolist()
+    with open(filename, 'rb') as f:
+        for info in infos:
+            if info.compress_type != zipfile.ZIP_STORED:
+                continue
+            if not info.filename.endswith('.npy'):
+                continue
+            # local file header: 30 bytes, then name and extra field
+            f.seek(info.header_offset + 26)
+            n, m = struct.unpack('<HH', f.read(4))
+            name = info.filename[:-len('.npy')]
+            offsets[name] = info.header_offset + 30 + n + m
+    return offsets
+
+
+def _memmap(filename, offset):
+    """Memory-map C{.npy} array stored at C{offset}, if possible."""
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            header = np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            header = np.lib.format.read_array_header_2_0(f)
+        else:
+            return None
+        shape, fortran_order, dtype = header
+        start = f.tell()
+    if dtype.hasobject or not np.prod(shape):
+        return None
+    order = 'F' if fortran_order else 'C'
+    return np.memmap(
+        filename, dtype=dtype, mode='r',
+        shape=shape, order=order, offset=start)
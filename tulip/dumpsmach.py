@@ -163,3 +163,197 @@ def python_case(M, classname="TulipStrategy", start='Sinit'):
                 args=','.join('\n{t}{v}={v}'.format(v=v, t=4*tab)
                               for v in M.inputs))
     return code
+
+
+def write_python_table(filename, *args, **kwargs):
+    """Convenience wrapper for writing output of python_table to file.
+
+    @type  filename: str
+    @param filename: Name of file in which to place the code generated
+        by L{python_table}.
+    """
+    with open(filename, 'w') as f:
+        f.write(python_table(*args, **kwargs))
+
+
+def python_table(M, classname="TulipStrategy", start='Sinit'):
+    """Export MealyMachine as Python class based on a transition table.
+
+    The class has the same interface as that of L{python_case}.
+    Transitions are stored in a C{dict} that maps the state and
+    a C{tuple} of input values to the next state and an index
+    in a C{list} of the distinct output valuations.
+    So a move takes constant time.
+
+    The tables are written as strings of integers, indices of
+    the values of each port, and built when the code is executed.
+    So the size of the code is linear in the number of transitions,
+    and it compiles quickly, unlike large literals.
+    Values of ports are written with C{repr}, so they must be
+    Python literals, e.g., integers, Booleans or strings.
+
+    If a state has several edges with the same inputs,
+    then the first one is taken, as in L{python_case}.
+
+    @type M: L{MealyMachine}
+    @type classname: C{str}
+    @param start: initial node in C{M}
+
+    @raise ValueError: if some edge does not assign
+        a value to each input port
+
+    @rtype: str
+    @return: The returned string is valid Python code and can, for
+        example, be:
+          - saved directly into a ".*.py" file, or
+          - passed to "exec".
+    """
+    tab = 4 * ' '
+    node_to_int = dict([(s, i) for i, s in enumerate(M)])
+    inputs = list(M.inputs)
+    outputs = list(M.outputs)
+    input_args = ', '.join(inputs)
+    # indices of values of each port
+    input_values = [dict() for k in inputs]
+    output_values = [dict() for k in outputs]
+    out_ports = zip(outputs, output_values)
+    # distinct output valuations
+    output_rows = dict()
+    # rows: state, input indices, next state, output index
+    transitions = list()
+    seen = set()
+    for u, w, d in M.edges_iter(data=True):
+        try:
+            key = (u, tuple([d[k] for k in inputs]))
+        except KeyError:
+            raise ValueError(
+                'edge ({u}, {w}) has no value for inputs: {m}'.format(
+                    u=u, w=w, m=[k for k in inputs if k not in d]))
+        if key in seen:
+            continue
+        seen.add(key)
+        out = tuple([
+            values.setdefault(d[k], len(values)) if k in d else -1
+            for k, values in out_ports])
+        row = [node_to_int[u]]
+        row.extend([
+            values.setdefault(x, len(values))
+            for values, x in zip(input_values, key[1])])
+        row.append(node_to_int[w])
+        row.append(output_rows.setdefault(out, len(output_rows)))
+        transitions.append(row)
+    dead_ends = [node_to_int[u] for u in M if not M.out_degree(u)]
+    code = (
+        'def _rows(packed):\n'
+        '{t}"""Return lists of integers, from lines after the first."""\n'
+        '{t}return [[int(i) for i in line.split()]\n'
+        '{t2}for line in packed.splitlines()[1:]]\n'
+        '\n'
+        '\n'
+        'def _outputs(names, values, rows):\n'
+        '{t}"""Return output valuations, index -1 if port absent."""\n'
+        '{t}return [\n'
+        '{t2}dict((k, v[i]) for k, v, i in zip(names, values, row)\n'
+        '{t3} if i >= 0)\n'
+        '{t2}for row in rows]\n'
+        '\n'
+        '\n'
+        'def _transitions(values, rows):\n'
+        '{t}"""Return transitions from rows:\n'
+        '\n'
+        '{t}state, input indices, next state, output index\n'
+        '{t}"""\n'
+        '{t}return dict(\n'
+        '{t2}((row[0], tuple(v[i] for v, i in zip(values, row[1:-2]))),\n'
+        '{t2} (row[-2], row[-1]))\n'
+        '{t2}for row in rows)\n'
+        '\n'
+        '\n'
+        'class {classname}(object):\n'
+        '{t}"""Mealy transducer.\n'
+        '\n'
+        '{t}Internal states are integers, the current state\n'
+        '{t}is stored in the attribute "state".\n'
+        '{t}To take a transition, call method "move".\n'
+        '\n'
+        '{t}The dict "transitions" maps the state and the tuple of\n'
+        '{t}inputs to the next state and an index in "outputs".\n'
+        '\n'
+        '{t}Automatically generated by tulip.dumpsmach on {date}\n'
+        '{t}To learn more about TuLiP, visit http://tulip-control.org\n'
+        '{t}"""\n'
+        '{t}input_names = {input_names!r}\n'
+        '{t}input_values = {input_values!r}\n'
+        '{t}output_names = {output_names!r}\n'
+        '{t}output_values = {output_values!r}\n'
+        '\n'
+        '{t}def __init__(self):\n'
+        '{t2}self.state = {sinit}\n'
+        '\n'
+        '{t}def move(self, {input_args}):\n'
+        '{t2}"""Given inputs, take move and return outputs.\n'
+        '\n'
+        '{t2}@rtype: dict\n'
+        '{t2}@return: dictionary with keys of the output variable names:\n'
+        '{t2}    {output_list}\n'
+        '{t2}"""\n'
+        '{t2}try:\n'
+        '{t3}self.state, i = self.transitions[\n'
+        '{t4}(self.state, ({input_tuple}))]\n'
+        '{t2}except KeyError:\n'
+        '{t3}self._error({input_args})\n'
+        '{t2}return dict(self.outputs[i])\n'
+        '\n'
+        '{t}def _error(self, {input_args}):\n'
+        '{t2}if self.state in self.dead_ends:\n'
+        '{t3}raise Exception("Reached dead-end state !")\n'
+        '{t2}raise ValueError("Unrecognized input:" + ('
+        '{inputs}).format({args}))\n'
+        '\n'
+        '\n'
+        '{classname}.outputs = _outputs(\n'
+        '{t}{classname}.output_names, {classname}.output_values, _rows("""\n'
+        '{output_table}"""))\n'
+        '{classname}.transitions = _transitions(\n'
+        '{t}{classname}.input_values, _rows("""\n'
+        '{transition_table}"""))\n'
+        '{classname}.dead_ends = frozenset(map(int, """\n'
+        '{dead_ends}""".split()))\n'
+        ).format(
+            classname=classname,
+            t=tab,
+            t2=2*tab,
+            t3=3*tab,
+            t4=4*tab,
+            date=time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
+            input_names=tuple(inputs),
+            input_values=_value_tuples(input_values),
+            output_names=tuple(outputs),
+            output_values=_value_tuples(output_values),
+            sinit=node_to_int[start],
+            input_args=input_args,
+            input_tuple=input_args + (',' if len(inputs) == 1 else ''),
+            output_list=[str(v) for v in outputs],
+            output_table=_pack(
+                row for row, _ in
+                sorted(output_rows.iteritems(), key=lambda x: x[1])),
+            transition_table=_pack(transitions),
+            dead_ends=_pack([u] for u in dead_ends),
+            inputs=''.join(
+                '\n{t}"{v} = {{{v}}};"'.format(v=v, t=3*tab)
+                for v in inputs) or '""',
+            args=','.join('\n{t}{v}={v}'.format(v=v, t=4*tab)
+                          for v in inputs))
+    return code
+
+
+def _value_tuples(indices):
+    """Return C{tuple} of values of each port, ordered by index."""
+    return tuple(
+        tuple(v for v, _ in sorted(d.iteritems(), key=lambda x: x[1]))
+        for d in indices)
+
+
+def _pack(rows):
+    """Return rows of integers as lines of a string."""
+    return ''.join(' '.join(map(str, row)) + '\n' for row in rows)
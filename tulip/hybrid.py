@@ -217,6 +217,63 @@ class LtiSysDyn(object):
         
         return ax
 
+    def step(self, x, u, d=None, rng=None):
+        """Return successors of C{k} states.
+
+        @param x: states, one per row
+        @type x: C{numpy.ndarray} of shape C{(k, n)}
+        @param u: inputs, one per row
+        @type u: C{numpy.ndarray} of shape C{(k, m)}
+        @param d: disturbances, one per row.
+            If C{None}, then sample them uniformly from C{Wset}.
+        @type d: C{numpy.ndarray} of shape C{(k, p)}
+        @param rng: used for sampling C{d},
+            default is C{numpy.random}
+        @type rng: C{numpy.random.RandomState}
+
+        @rtype: C{numpy.ndarray} of shape C{(k, n)}
+        """
+        x = _as_batch(x, self.A.shape[1])
+        u = _as_batch(u, self.B.shape[1])
+        if d is None:
+            d = self.sample_disturbance(x.shape[0], rng)
+        else:
+            d = _as_batch(d, self.E.shape[1])
+        return (x.dot(self.A.T) + u.dot(self.B.T) +
+                d.dot(self.E.T) + self.K.T)
+
+    def sample_disturbance(self, k, rng=None):
+        """Return C{k} disturbances sampled uniformly from C{Wset}.
+
+        If C{Wset} is not full-dimensional, then return zeros.
+
+        @rtype: C{numpy.ndarray} of shape C{(k, p)}
+        """
+        p = self.E.shape[1]
+        if self.Wset is None or not pc.is_fulldim(self.Wset):
+            return np.zeros([k, p])
+        return _sample_polytope(self.Wset, k, rng)
+
+    def simulate(self, x0, u, d=None, seed=None):
+        """Simulate C{k} trajectories for C{T} steps.
+
+        @param x0: initial states, one per row
+        @type x0: C{numpy.ndarray} of shape C{(k, n)}
+        @param u: inputs, C{u[t]} applied at time C{t}
+        @type u: C{numpy.ndarray} of shape C{(T, k, m)}
+        @param d: disturbances, as C{u}.
+            If C{None}, then sample them from C{Wset}.
+        @param seed: for sampling disturbances
+
+        @return: states, C{x[t]} at time C{t}
+        @rtype: C{numpy.ndarray} of shape C{(T + 1, k, n)}
+        """
+        def step(x, u, d, rng):
+            return self.step(x, u, d, rng), 0
+        x, _ = _simulate(step, self.A.shape[1], x0, u,
+                         [()] * len(u), d, seed)
+        return x
+
 class PwaSysDyn(object):
     """PwaSysDyn class for specifying a polytopic piecewise affine system.
     A PwaSysDyn object contains the fields:
@@ -328,6 +385,66 @@ class PwaSysDyn(object):
                            show_domain=show_domain, **kwargs)
         return ax
 
+    def find_subsystem(self, x, abs_tol=1e-7):
+        """Return index of subsystem active at each state.
+
+        The index is C{-1} for states outside
+        the subsystem domains.
+        If domains share a facet, then the first one is returned.
+
+        @param x: states, one per row
+        @type x: C{numpy.ndarray} of shape C{(k, n)}
+
+        @rtype: C{numpy.ndarray} of C{int} with shape C{(k,)}
+        """
+        x = _as_batch(x, self.list_subsys[0].A.shape[1])
+        idx = -np.ones(x.shape[0], dtype=int)
+        for i in xrange(len(self.list_subsys) - 1, -1, -1):
+            domain = self.list_subsys[i].domain
+            idx[_inside(domain, x, abs_tol)] = i
+        return idx
+
+    def step(self, x, u, d=None, rng=None):
+        """Return successors of C{k} states and active subsystems.
+
+        See L{LtiSysDyn.step} for the arguments.
+
+        @return: C{(x, idx)}, where C{idx} as in L{find_subsystem}
+        @rtype: C{tuple} of C{numpy.ndarray}
+        """
+        n = self.list_subsys[0].A.shape[1]
+        m = self.list_subsys[0].B.shape[1]
+        p = self.list_subsys[0].E.shape[1]
+        x = _as_batch(x, n)
+        u = _as_batch(u, m)
+        if d is not None:
+            d = _as_batch(d, p)
+        idx = self.find_subsystem(x)
+        if np.any(idx < 0):
+            raise ValueError('states outside domain: ' +
+                             str(x[idx < 0]))
+        x_next = np.zeros(x.shape)
+        for i in np.unique(idx):
+            mask = (idx == i)
+            di = None if d is None else d[mask]
+            x_next[mask] = self.list_subsys[i].step(
+                x[mask], u[mask], di, rng)
+        return x_next, idx
+
+    def simulate(self, x0, u, d=None, seed=None):
+        """Simulate C{k} trajectories for C{T} steps.
+
+        See L{LtiSysDyn.simulate} for the arguments.
+
+        @return: C{(x, idx)}, where:
+            - C{x} has shape C{(T + 1, k, n)}
+            - C{idx[t]} are the subsystems active at time C{t},
+              with shape C{(T, k)}
+        @rtype: C{tuple} of C{numpy.ndarray}
+        """
+        return _simulate(self.step, self.list_subsys[0].A.shape[1],
+                         x0, u, [()] * len(u), d, seed)
+
 class SwitchedSysDyn(object):
     """Represent hybrid systems switching between dynamic modes.
     
@@ -412,9 +529,13 @@ class SwitchedSysDyn(object):
         # Check each dynamics key is a valid mode,
         # i.e., a valid combination of env and sys labels.
         if dynamics is not None:
-            modes = self.all_mode_combs
+            env = set(self.env_labels)
+            disc_sys = set(self.disc_sys_labels)
             
-            undefined_modes = set(dynamics.keys()).difference(modes)
+            undefined_modes = {
+                mode for mode in dynamics
+                if not (isinstance(mode, tuple) and len(mode) == 2 and
+                        mode[0] in env and mode[1] in disc_sys)}
             
             if undefined_modes:
                 msg = 'SwitchedSysDyn: `dynamics` keys inconsistent'
@@ -422,7 +543,11 @@ class SwitchedSysDyn(object):
                 msg += 'Undefined modes:\n' + str(undefined_modes)
                 raise ValueError(msg)
             
-            missing_modes = set(modes).difference(dynamics.keys())
+            # enumerate the mode product only if some mode is missing
+            missing_modes = set()
+            if len(dynamics) < len(env) * len(disc_sys):
+                missing_modes = {mode for mode in self.iter_mode_combs()
+                                 if mode not in dynamics}
             
             if missing_modes:
                 msg = 'Missing the modes:\n' + str(missing_modes)
@@ -493,13 +618,44 @@ class SwitchedSysDyn(object):
     @property
     def all_mode_combs(self):
         """Return all possible combinations of modes.
+        
+        See also L{iter_mode_combs}.
         """
-        modes = [(a,b) for a in self.env_labels
-                           for b in self.disc_sys_labels]
-            
+        modes = list(self.iter_mode_combs())
+        
         logger.debug('Available modes: ' + str(modes) )
         return modes
     
+    def iter_mode_combs(self):
+        """Return iterator over all possible combinations of modes.
+        
+        Unlike L{all_mode_combs}, the combinations are
+        generated lazily, because their number is the product
+        of the numbers of environment and system labels.
+        """
+        return itertools.product(self.env_labels, self.disc_sys_labels)
+    
+    def group_modes(self):
+        """Return modes grouped by their dynamics.
+        
+        Modes are in the same group if their dynamics
+        are the same L{PwaSysDyn} object,
+        so each group needs to be abstracted only once.
+        
+        @return: groups in the order their first mode appears
+            in C{modes}
+        @rtype: C{list} of C{list} of modes
+        """
+        groups = dict()
+        order = list()
+        for mode in self.modes:
+            key = id(self.dynamics[mode])
+            if key not in groups:
+                groups[key] = list()
+                order.append(key)
+            groups[key].append(mode)
+        return [groups[k] for k in order]
+    
     @property
     def modes(self):
         if self.dynamics is None:
@@ -533,6 +689,116 @@ class SwitchedSysDyn(object):
                                      Uset, Wset, domain)
         return cls((1,1), {(0,0):pwa_sys}, domain)
 
+    def step(self, x, u, modes, d=None, rng=None):
+        """Return successors of C{k} states and active subsystems.
+
+        See L{LtiSysDyn.step} for the other arguments.
+
+        @param modes: mode C{(env_label, sys_label)}
+            of all states, or C{list} of one mode per state
+
+        @return: C{(x, idx)}, see L{PwaSysDyn.step}
+        @rtype: C{tuple} of C{numpy.ndarray}
+        """
+        n = self.dynamics.values()[0].list_subsys[0].A.shape[1]
+        x = _as_batch(x, n)
+        k = x.shape[0]
+        if isinstance(modes, tuple):
+            modes = [modes] * k
+        if len(modes) != k:
+            raise ValueError('need one mode per state')
+        groups = dict()
+        for j, mode in enumerate(modes):
+            groups.setdefault(mode, list()).append(j)
+        u = np.asarray(u, dtype=float).reshape(k, -1)
+        if d is not None:
+            d = np.asarray(d, dtype=float).reshape(k, -1)
+        x_next = np.zeros(x.shape)
+        idx = np.zeros(k, dtype=int)
+        for mode, rows in groups.iteritems():
+            if mode not in self.dynamics:
+                raise ValueError('no dynamics for mode: ' + str(mode))
+            dj = None if d is None else d[rows]
+            x_next[rows], idx[rows] = self.dynamics[mode].step(
+                x[rows], u[rows], dj, rng)
+        return x_next, idx
+
+    def simulate(self, x0, u, modes, d=None, seed=None):
+        """Simulate C{k} trajectories for C{T} steps.
+
+        See L{LtiSysDyn.simulate} for the other arguments.
+
+        @param modes: C{modes[t]} are the modes at time C{t},
+            as in L{step}
+        @type modes: C{list} of length C{T}
+
+        @return: C{(x, idx)}, see L{PwaSysDyn.simulate}
+        @rtype: C{tuple} of C{numpy.ndarray}
+        """
+        if len(modes) != len(u):
+            raise ValueError('need modes for each time step')
+        n = self.dynamics.values()[0].list_subsys[0].A.shape[1]
+        return _simulate(self.step, n, x0, u, [(m,) for m in modes],
+                         d, seed)
+
+
+def _simulate(step, n, x0, u, args, d, seed):
+    """Iterate C{step} and stack the states and subsystem indices."""
+    rng = np.random.RandomState(seed)
+    x0 = _as_batch(x0, n)
+    T = len(u)
+    x = np.zeros((T + 1, ) + x0.shape)
+    idx = np.zeros((T, x0.shape[0]), dtype=int)
+    x[0] = x0
+    for t in xrange(T):
+        dt = None if d is None else d[t]
+        step_args = (x[t], u[t]) + args[t] + (dt, rng)
+        x[t + 1], idx[t] = step(*step_args)
+    return x, idx
+
+def _as_batch(x, n):
+    """Return C{x} as 2d array with C{n} columns."""
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 1:
+        x = x.reshape(1, x.size)
+    if x.ndim != 2 or x.shape[1] != n:
+        raise ValueError('expected array with ' + str(n) +
+                         ' columns, got shape: ' + str(x.shape))
+    return x
+
+def _inside(region, x, abs_tol=1e-7):
+    """Return C{True} for each row of C{x} in C{region}.
+
+    @type region: C{polytope.Polytope} or C{polytope.Region}
+    @rtype: C{numpy.ndarray} of C{bool}
+    """
+    if isinstance(region, pc.Region):
+        polys = region.list_poly
+    else:
+        polys = [region]
+    inside = np.zeros(x.shape[0], dtype=bool)
+    for poly in polys:
+        b = poly.b.flatten()
+        inside |= np.all(x.dot(poly.A.T) - b <= abs_tol, axis=1)
+    return inside
+
+def _sample_polytope(poly, k, rng=None):
+    """Return C{k} points sampled uniformly from C{poly}.
+
+    Uses rejection sampling in the bounding box of the vertices.
+
+    @rtype: C{numpy.ndarray} of shape C{(k, poly.dim)}
+    """
+    if rng is None:
+        rng = np.random
+    vertices = pc.extreme(poly)
+    l = vertices.min(axis=0)
+    u = vertices.max(axis=0)
+    points = np.zeros([0, l.size])
+    while points.shape[0] < k:
+        x = l + rng.rand(2 * k, l.size) * (u - l)
+        points = np.vstack([points, x[_inside(poly, x, 0)]])
+    return points[:k]
 
 def _push_time_data(system_list, time_semantics, timestep):
     """Overwrite the time data in system list. Throws warnings if overwriting
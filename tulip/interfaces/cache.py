@@ -0,0 +1,394 @@
+# Copyright (c) 2014 by California Institute of Technology
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the California Institute of Technology nor
+#    the names of its contributors may be used to endorse or promote
+#    products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL CALTECH
+# OR THE CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+"""
+Persistent cache of synthesis results.
+
+Results are stored on disk, one file per problem,
+named by a hash of:
+
+  - the input to the solver, as translated from the specification
+  - the solver name and a hash of its executable
+  - the options passed to the solver, e.g., C{init_option}
+
+so that the same problem is solved only once,
+across processes that share the cache directory.
+The least recently used results are removed
+when the cache exceeds its size limit.
+
+Usage::
+
+    cache = SynthesisCache()
+    ctrl = synth.synthesize('gr1c', specs, sys=ts, cache=cache)
+    print(cache.stats)
+"""
+import logging
+logger = logging.getLogger(__name__)
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from distutils.spawn import find_executable
+import networkx as nx
+from tulip.spec import translation
+from tulip.interfaces.strategy import Strategy
+
+
+DEFAULT_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'tulip', 'synthesis')
+DEFAULT_MAX_SIZE = 2**30  # bytes
+_SUFFIX = '.json.gz'
+# hashes of solver executables, by path, size and mtime
+_fingerprints = dict()
+
+
+class SynthesisCache(object):
+    """Cache of strategies and realizability, stored in a directory.
+
+    Each result is a compressed JSON file.
+    Strategies are stored as a table of variable values per node,
+    under a header with the order of variables,
+    and a list of successors per node,
+    and loaded as L{Strategy}.
+
+    Attributes:
+
+      - C{path}: directory of the cache
+      - C{max_size}: limit of total size of results [bytes]
+      - C{stats}: C{dict} of numbers of C{'hits'}, C{'misses'},
+        C{'stores'} and C{'evictions'}, since creation
+    """
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        """Open cache in directory C{path}, creating it if needed.
+
+        @param path: defaults to environment variable
+            C{TULIP_SYNTHESIS_CACHE}, if defined,
+            otherwise to L{DEFAULT_PATH}
+        @param max_size: in bytes
+        """
+        if path is None:
+            path = os.environ.get('TULIP_SYNTHESIS_CACHE', DEFAULT_PATH)
+        self.path = path
+        self.max_size = max_size
+        self.stats = dict(hits=0, misses=0, stores=0, evictions=0)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def __repr__(self):
+        return '{cls}(path={path}, max_size={size})'.format(
+            cls=type(self).__name__, path=repr(self.path),
+            size=self.max_size)
+
+    def key(self, solver, spec, **options):
+        """Return key of problem.
+
+        @param solver: C{'gr1c'}, C{'jtlv'} or C{'slugs'}
+        @type spec: L{GRSpec}
+        @param options: that affect the result,
+            e.g., C{init_option}, and C{operation}
+            (C{'synthesize'} or C{'realizable'})
+        @rtype: C{str}
+        """
+        h = _options_hash(solver, options)
+        _hash_input(h, solver, spec)
+        return h.hexdigest()
+
+    def key_and_input(self, solver, spec, **options):
+        """Return key of problem, and the input to the solver.
+
+        Same key as L{key}. The translation that is hashed
+        is also kept, so that on a miss the solver
+        need not translate C{spec} again.
+
+        @return: C{(key, translated)}, where C{translated} is:
+            for C{'gr1c'} and C{'slugs'} a temporary file
+            that contains the input, at position 0,
+            for C{'jtlv'} a pair of the SMV and LTL inputs
+        """
+        h = _options_hash(solver, options)
+        translated = _hash_input(h, solver, spec, keep=True)
+        return h.hexdigest(), translated
+
+    def load(self, key):
+        """Return result stored for C{key}.
+
+        @raise KeyError: if C{key} is not in the cache
+        @return: strategy as C{networkx.DiGraph},
+            C{None} if unrealizable,
+            or C{bool} if only realizability was stored.
+        """
+        fname = self._fname(key)
+        try:
+            with gzip.open(fname, 'rb') as f:
+                d = json.load(f)
+        except (IOError, ValueError):
+            self.stats['misses'] += 1
+            raise KeyError(key)
+        # mark as recently used
+        try:
+            os.utime(fname, None)
+        except OSError:
+            pass
+        self.stats['hits'] += 1
+        logger.info('synthesis cache hit: {k}'.format(k=key))
+        if 'realizable' in d:
+            return d['realizable']
+        if d['strategy'] is None:
+            return None
+        return _dict_to_strategy(d['strategy'])
+
+    def dump(self, key, result):
+        """Store C{result} for C{key}, and evict old results.
+
+        @param result: as returned by L{load}
+        """
+        if isinstance(result, bool):
+            d = dict(realizable=result)
+        elif result is None:
+            d = dict(strategy=None)
+        else:
+            d = dict(strategy=_strategy_to_dict(result))
+        # write and rename, because processes may share the cache
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        os.close(fd)
+        with gzip.open(tmp, 'wb') as f:
+            json.dump(d, f, separators=(',', ':'))
+        os.rename(tmp, self._fname(key))
+        self.stats['stores'] += 1
+        self._evict()
+
+    def size(self):
+        """Return total size of stored results in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        """Remove all stored results."""
+        for fname, _, _ in self._entries():
+            _remove(fname)
+
+    def _fname(self, key):
+        return os.path.join(self.path, key + _SUFFIX)
+
+    def _entries(self):
+        """Return C{list} of C{(fname, size, mtime)} of results."""
+        entries = list()
+        for name in os.listdir(self.path):
+            if not name.endswith(_SUFFIX):
+                continue
+            fname = os.path.join(self.path, name)
+            try:
+                st = os.stat(fname)
+            except OSError:
+                continue
+            entries.append((fname, st.st_size, st.st_mtime))
+        return entries
+
+    def _evict(self):
+        """Remove least recently used results, down to C{max_size}."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_size:
+            return
+        entries.sort(key=lambda x: x[2])
+        for fname, size, _ in entries:
+            if total <= self.max_size:
+                break
+            _remove(fname)
+            total -= size
+            self.stats['evictions'] += 1
+            logger.debug('evicted: {f}'.format(f=fname))
+
+
+def _options_hash(solver, options):
+    """Return hash of C{solver} and C{options}."""
+    h = hashlib.sha256()
+    h.update(solver)
+    h.update(_fingerprint(solver))
+    h.update(repr(sorted(options.iteritems())))
+    return h
+
+
+def _hash_input(h, solver, spec, keep=False):
+    """Update hash C{h} with the input that the solver reads.
+
+    @param solver: C{'gr1c'}, C{'jtlv'} or C{'slugs'}
+    @type spec: L{GRSpec}
+    @param keep: if C{True}, then return the input,
+        as described in L{SynthesisCache.key_and_input},
+        otherwise C{None}
+    """
+    if solver == 'jtlv':
+        from tulip.interfaces import jtlv
+        x = (jtlv.generate_jtlv_smv(spec), jtlv.generate_jtlv_ltl(spec))
+        for s in x:
+            h.update(s)
+        return x if keep else None
+    elif solver in {'gr1c', 'slugs'}:
+        f = tempfile.TemporaryFile() if keep else None
+        translation.write(spec, solver, _HashWriter(h, f))
+        if f is not None:
+            f.seek(0)
+        return f
+    else:
+        raise ValueError('unknown solver: {s}'.format(s=solver))
+
+
+class _HashWriter(object):
+    """File-like that updates a hash with what is written.
+
+    If C{f} is given, then also writes to C{f}.
+    """
+
+    def __init__(self, h, f=None):
+        self.h = h
+        self.f = f
+
+    def write(self, s):
+        self.h.update(s)
+        if self.f is not None:
+            self.f.write(s)
+
+
+def _fingerprint(solver):
+    """Return hash of solver executable, or C{''} if not found."""
+    if solver == 'jtlv':
+        from tulip.interfaces import jtlv
+        path = os.path.join(jtlv.JTLV_PATH, jtlv.JTLV_EXE)
+    elif solver == 'gr1c':
+        from tulip.interfaces import gr1c
+        path = find_executable(gr1c.GR1C_BIN_PREFIX + 'gr1c')
+    else:
+        path = find_executable(solver)
+    if path is None or not os.path.isfile(path):
+        logger.warn('executable of {s} not found'.format(s=solver))
+        return ''
+    st = os.stat(path)
+    k = (path, st.st_size, st.st_mtime)
+    if k not in _fingerprints:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2**20), b''):
+                h.update(chunk)
+        _fingerprints[k] = h.hexdigest()
+    return _fingerprints[k]
+
+
+def _strategy_to_dict(g):
+    """Return C{dict} of lists that represents strategy C{g}.
+
+    @param g: with node attribute C{'state'} and
+        optional integer attributes, e.g., C{'mode'}
+    @type g: L{Strategy} or C{networkx.DiGraph}
+    """
+    if isinstance(g, Strategy):
+        d = dict(
+            nodes=g.ids.tolist(),
+            variables=g.variables,
+            states=g.states.tolist(),
+            successors=[
+                g.indices[i:j].tolist()
+                for i, j in zip(g.indptr[:-1], g.indptr[1:])],
+            attributes={k: v.tolist() for k, v in g.attributes.iteritems()})
+    else:
+        nodes = g.nodes()
+        index = dict((u, i) for i, u in enumerate(nodes))
+        variables = sorted(g.node[nodes[0]]['state']) if nodes else list()
+        attr = sorted(
+            k for k in (g.node[nodes[0]] if nodes else dict())
+            if k != 'state')
+        d = dict(
+            nodes=nodes,
+            variables=variables,
+            states=[[g.node[u]['state'][k] for k in variables]
+                    for u in nodes],
+            successors=[[index[v] for v in g.successors_iter(u)]
+                        for u in nodes],
+            attributes=dict(
+                (k, [g.node[u].get(k) for u in nodes]) for k in attr))
+    for k in ('env_vars', 'sys_vars'):
+        if hasattr(g, k):
+            d[k] = getattr(g, k)
+    return d
+
+
+def _dict_to_strategy(d):
+    """Inverse of L{_strategy_to_dict}.
+
+    @return: L{Strategy} if all values and attributes are integers,
+        otherwise C{networkx.DiGraph}
+    """
+    nodes = d['nodes']
+    variables = [str(k) for k in d['variables']]
+    attributes = dict((str(k), v) for k, v in d['attributes'].iteritems())
+    states = d['states']
+    successors = d['successors']
+    dvars = dict()
+    for k in ('env_vars', 'sys_vars'):
+        if k in d:
+            dvars[k] = _domains(d[k])
+    if _all_int(nodes) and all(_all_int(x) for x in states) and all(
+            _all_int(v) for v in attributes.itervalues()):
+        indptr = [0]
+        for succ in successors:
+            indptr.append(indptr[-1] + len(succ))
+        indices = [j for succ in successors for j in succ]
+        return Strategy(nodes, variables, states, indptr, indices,
+                        attributes=attributes, **dvars)
+    g = nx.DiGraph()
+    for i, u in enumerate(nodes):
+        attr = dict((k, v[i]) for k, v in attributes.iteritems())
+        g.add_node(u, state=dict(zip(variables, states[i])), **attr)
+    for i, succ in enumerate(successors):
+        g.add_edges_from((nodes[i], nodes[j]) for j in succ)
+    for k, v in dvars.iteritems():
+        setattr(g, k, v)
+    return g
+
+
+def _all_int(values):
+    return all(isinstance(x, (int, long)) for x in values)
+
+
+def _domains(dvars):
+    """Restore tuple domains, as lists after JSON."""
+    return dict(
+        (str(k), tuple(v) if isinstance(v, list) and
+         all(isinstance(x, int) for x in v) else v)
+        for k, v in dvars.iteritems())
+
+
+def _remove(fname):
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
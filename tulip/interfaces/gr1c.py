@@ -43,17 +43,24 @@ Use the logging module to throttle verbosity.
 """
 import logging
 logger = logging.getLogger(__name__)
-import copy
 import os
+import shutil
+import StringIO
 import subprocess
+import sys
 import tempfile
+import threading
 import xml.etree.ElementTree as ET
-import networkx as nx
-from tulip.spec import GRSpec, translate
+import xml.etree.cElementTree as cET
+from tulip.spec import GRSpec
+from tulip.spec import translation
+from tulip.interfaces.strategy import StrategyBuilder
 
 
 GR1C_BIN_PREFIX = ""
 _hl = 60 * '-'
+# bytes of gr1c output kept for messages, when parsed from the pipe
+_HEAD_SIZE = 2**16
 DEFAULT_NAMESPACE = "http://tulip-control.sourceforge.net/ns/1"
 
 
@@ -74,7 +81,7 @@ def _untaglist(x, cast_f=float,
     Return result as 2-tuple, containing name of the tag (as a string)
     and the list obtained from it.
     """
-    if not isinstance(x, str) and not isinstance(x, ET._ElementInterface):
+    if not isinstance(x, str) and not ET.iselement(x):
         raise TypeError("tag to be parsed must be given as" +
             " a string or ElementTree._ElementInterface.")
 
@@ -123,7 +130,7 @@ def _untagdict(x, cast_f_keys=None, cast_f_values=None,
     return a triple, where the first two elements are as usual and the
     third is the list of keys in the order they were found.
     """
-    if not isinstance(x, str) and not isinstance(x, ET._ElementInterface):
+    if not isinstance(x, str) and not ET.iselement(x):
         raise TypeError("tag to be parsed must be given " +
             "as a string or ElementTree._ElementInterface.")
 
@@ -157,36 +164,94 @@ def _untagdict(x, cast_f_keys=None, cast_f_values=None,
         return (elem.tag, di)
 
 def load_aut_xml(x, namespace=DEFAULT_NAMESPACE):
-    """Return L{GRSpec} and L{MealyMachine} constructed from output of gr1c.
+    """Return strategy constructed from output of gr1c.
 
-    @param x: a string or an instance of
-        xml.etree.ElementTree._ElementInterface
+    The XML is parsed incrementally, and each node of the strategy
+    is discarded from the XML tree after it is added to the graph,
+    so the whole XML tree is never in memory.
 
-    @type spec0: L{GRSpec}
-    @param spec0: GR(1) specification with which to interpret the
-        output of gr1c while constructing a MealyMachine, or None if
-        the output from gr1c should be used as is.  Note that spec0
-        may differ from the specification in the given tulipcon XML
-        string x.  If you are unsure what to do, try setting spec0 to
-        whatever L{gr1cint.synthesize} was invoked with.
+    @param x: a string, a file-like object, e.g., the stdout of gr1c,
+        or an instance of xml.etree.ElementTree._ElementInterface
 
-    @rtype: L{GRSpec}
-    """
-    if not isinstance(x, str) and not isinstance(x, ET._ElementInterface):
-        raise TypeError("tag to be parsed must be given " +
-            "as a string or ElementTree._ElementInterface.")
+    @return: strategy as L{Strategy}, with attributes
+        C{env_vars}, C{sys_vars}, and node attributes
+        C{state}, C{mode}, C{rgrad}.
+        If the output contains no automaton,
+        then return C{(spec, None)}, where C{spec} is the L{GRSpec}.
 
+        Changed: earlier versions returned a C{networkx.DiGraph}.
+        L{Strategy} is read-only and supports only part of
+        its interface. Call C{Strategy.to_networkx} to
+        obtain a C{networkx.DiGraph}.
+    """
     if isinstance(x, str):
-        elem = ET.fromstring(x)
+        source = StringIO.StringIO(x)
+    elif hasattr(x, 'read'):
+        source = x
+    elif ET.iselement(x):
+        source = StringIO.StringIO(ET.tostring(x))
     else:
-        elem = x
+        raise TypeError("tag to be parsed must be given " +
+            "as a string, file, or ElementTree._ElementInterface.")
 
     if (namespace is None) or (len(namespace) == 0):
         ns_prefix = ""
     else:
         ns_prefix = "{"+namespace+"}"
+    root_tag = ns_prefix + "tulipcon"
+    aut_tag = ns_prefix + "aut"
+    node_tag = ns_prefix + "node"
+
+    A = StrategyBuilder()
+    ids = set()  # to catch redundancy
+    root = None
+    aut_elem = None
+    spec = None
+    env_vars = None
+    sys_vars = None
+    n = 0
+    for event, elem in cET.iterparse(source, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if root is None:
+                root = elem
+                _check_tulipcon(elem, root_tag)
+            elif tag == aut_tag:
+                aut_elem = elem
+            continue
+        if tag == node_tag:
+            n += 1
+            this_id, mode, rgrad, state, children = _load_node(
+                elem, ns_prefix, namespace)
+            # nodes are not needed after loading
+            aut_elem.remove(elem)
+            if this_id in ids:
+                logger.warn("duplicate nodes found: " +
+                            str(this_id) + "; ignoring...")
+                continue
+            ids.add(this_id)
+            A.add_node(this_id, state, children, mode=mode, rgrad=rgrad)
+        elif tag == ns_prefix + "env_vars":
+            (tag_name, vardict, order) = _untagdict(elem, get_order=True)
+            env_vars = _parse_vars(order, vardict)
+        elif tag == ns_prefix + "sys_vars":
+            (tag_name, vardict, order) = _untagdict(elem, get_order=True)
+            sys_vars = _parse_vars(order, vardict)
+        elif tag == ns_prefix + "spec":
+            spec = _load_spec(elem, env_vars, sys_vars,
+                              ns_prefix, namespace)
+    if aut_elem is None or (aut_elem.text is None and n == 0):
+        mach = None
+        return (spec, mach)
+    # Assume version 1 of tulipcon XML
+    if aut_elem.attrib["type"] != "basic":
+        raise ValueError("Automaton class only recognizes type \"basic\".")
+    A = A.build(env_vars=env_vars, sys_vars=sys_vars)
+    logger.debug('loaded from gr1c result: {n} nodes'.format(n=len(A)))
+    return A
 
-    if elem.tag != ns_prefix+"tulipcon":
+def _check_tulipcon(elem, root_tag):
+    if elem.tag != root_tag:
         raise TypeError("root tag should be tulipcon.")
     if ("version" not in elem.attrib.keys()):
         raise ValueError("unversioned tulipcon XML string.")
@@ -194,16 +259,8 @@ def load_aut_xml(x, namespace=DEFAULT_NAMESPACE):
         raise ValueError("unsupported tulipcon XML version: "+
             str(elem.attrib["version"]))
 
-    # Extract discrete variables and LTL specification
-    (tag_name, env_vardict, env_vars) = _untagdict(elem.find(
-        ns_prefix+"env_vars"), get_order=True)
-    (tag_name, sys_vardict, sys_vars) = _untagdict(elem.find(
-        ns_prefix+"sys_vars"), get_order=True)
-
-    env_vars = _parse_vars(env_vars, env_vardict)
-    sys_vars = _parse_vars(sys_vars, sys_vardict)
-
-    s_elem = elem.find(ns_prefix+"spec")
+def _load_spec(s_elem, env_vars, sys_vars, ns_prefix, namespace):
+    """Return L{GRSpec} from C{spec} element."""
     spec = GRSpec(env_vars=env_vars, sys_vars=sys_vars)
     for spec_tag in ["env_init", "env_safety", "env_prog",
                      "sys_init", "sys_safety", "sys_prog"]:
@@ -215,58 +272,33 @@ def load_aut_xml(x, namespace=DEFAULT_NAMESPACE):
         li = [v.replace("&gt;", ">") for v in li]
         li = [v.replace("&amp;", "&") for v in li]
         setattr(spec, spec_tag, li)
-
-    aut_elem = elem.find(ns_prefix+"aut")
-    if aut_elem is None or (
-        (aut_elem.text is None) and len(aut_elem.getchildren()) == 0):
-        mach = None
-        return (spec, mach)
-
-    # Assume version 1 of tulipcon XML
-    if aut_elem.attrib["type"] != "basic":
-        raise ValueError("Automaton class only recognizes type \"basic\".")
-    node_list = aut_elem.findall(ns_prefix+"node")
-    id_list = []  # For more convenient searching, and to catch redundancy
-    A = nx.DiGraph()
-    A.env_vars = env_vars
-    A.sys_vars = sys_vars
-    for node in node_list:
-        this_id = int(node.find(ns_prefix+"id").text)
-        #this_name = node.find(ns_prefix+"anno").text  # Assume version 1
-        (tag_name, this_name_list) = _untaglist(node.find(ns_prefix+"anno"),
-                                                cast_f=int)
-        if len(this_name_list) == 2:
-            (mode, rgrad) = this_name_list
-        else:
-            (mode, rgrad) = (-1, -1)
-        (tag_name, this_child_list) = _untaglist(
-            node.find(ns_prefix+"child_list"),
-            cast_f=int
-        )
-        if tag_name != ns_prefix+"child_list":
-            # This really should never happen and may not even be
-            # worth checking.
-            raise ValueError("failure of consistency check " +
-                "while processing aut XML string.")
-        (tag_name, this_state) = _untagdict(node.find(ns_prefix+"state"),
-                                            cast_f_values=int,
-                                            namespace=namespace)
-
-        if tag_name != ns_prefix+"state":
-            raise ValueError("failure of consistency check " +
-                "while processing aut XML string.")
-        if this_id in id_list:
-            logger.warn("duplicate nodes found: "+str(this_id)+"; ignoring...")
-            continue
-        id_list.append(this_id)
-
-        logger.info('loaded from gr1c result:\n\t' +str(this_state) )
-
-        A.add_node(this_id, state=copy.copy(this_state),
-                   mode=mode, rgrad=rgrad)
-        for next_node in this_child_list:
-            A.add_edge(this_id, next_node)
-    return A
+    return spec
+
+def _load_node(node, ns_prefix, namespace):
+    """Return id, mode, rgrad, state and successors of C{node}."""
+    this_id = int(node.find(ns_prefix+"id").text)
+    (tag_name, this_name_list) = _untaglist(node.find(ns_prefix+"anno"),
+                                            cast_f=int)
+    if len(this_name_list) == 2:
+        (mode, rgrad) = this_name_list
+    else:
+        (mode, rgrad) = (-1, -1)
+    (tag_name, this_child_list) = _untaglist(
+        node.find(ns_prefix+"child_list"),
+        cast_f=int
+    )
+    if tag_name != ns_prefix+"child_list":
+        # This really should never happen and may not even be
+        # worth checking.
+        raise ValueError("failure of consistency check " +
+            "while processing aut XML string.")
+    (tag_name, this_state) = _untagdict(node.find(ns_prefix+"state"),
+                                        cast_f_values=int,
+                                        namespace=namespace)
+    if tag_name != ns_prefix+"state":
+        raise ValueError("failure of consistency check " +
+            "while processing aut XML string.")
+    return this_id, mode, rgrad, this_state, this_child_list
 
 def _parse_vars(variables, vardict):
     """Helper for parsing env, sys variables.
@@ -318,7 +350,8 @@ def check_syntax(spec_str):
         logger.info(p.stdout.read() )
         return False
 
-def check_realizable(spec, init_option="ALL_ENV_EXIST_SYS_INIT"):
+def check_realizable(spec, init_option="ALL_ENV_EXIST_SYS_INIT",
+                     translated=None):
     """Decide realizability of specification.
 
     Consult the documentation of L{synthesize} about parameters.
@@ -331,25 +364,20 @@ def check_realizable(spec, init_option="ALL_ENV_EXIST_SYS_INIT"):
                            "ALL_INIT", "ONE_SIDE_INIT"):
         raise ValueError("Unrecognized initial condition" +
                          "interpretation (init_option)")
-    s = translate(spec, 'gr1c')
-    f = tempfile.TemporaryFile()
-    f.write(s)
-    f.seek(0)
     logger.info('starting realizability check')
-    p = subprocess.Popen([GR1C_BIN_PREFIX+"gr1c", "-n", init_option, "-r"],
-                         stdin=f,
-                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    p.wait()
+    returncode, out, s, _ = _call_gr1c(
+        ["-n", init_option, "-r"], spec, translated=translated)
 
-    logger.info('gr1c input:\n' + s +_hl)
+    logger.info('gr1c input:\n' + str(s) +_hl)
 
-    if p.returncode == 0:
+    if returncode == 0:
         return True
     else:
-        logger.info(p.stdout.read() )
+        logger.info(out)
         return False
 
-def synthesize(spec, init_option="ALL_ENV_EXIST_SYS_INIT"):
+def synthesize(spec, init_option="ALL_ENV_EXIST_SYS_INIT",
+               translated=None):
     """Synthesize strategy realizing the given specification.
 
     @type spec: L{GRSpec}
@@ -386,65 +414,201 @@ def synthesize(spec, init_option="ALL_ENV_EXIST_SYS_INIT"):
         <http://slivingston.github.io/gr1c/md_spc_format.html#initconditions>}
         for detailed descriptions.
 
-    @return: strategy as L{MealyMachine},
+    @param translated: file that contains the translation of
+        C{spec} to gr1c syntax, for example from
+        C{SynthesisCache.key_and_input}.
+        If given, then gr1c reads it, and C{spec} is not translated.
+
+    @return: strategy as L{Strategy}, see L{load_aut_xml},
         or None if unrealizable or error occurs.
     """
     if init_option not in ("ALL_ENV_EXIST_SYS_INIT",
                            "ALL_INIT", "ONE_SIDE_INIT"):
         raise ValueError("Unrecognized initial condition" +
                          "interpretation (init_option)")
-    try:
-        p = subprocess.Popen(
-            [GR1C_BIN_PREFIX + "gr1c",
-             "-n", init_option,
-             "-t", "tulip"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-        )
-    except OSError as e:
-        if e.errno == os.errno.ENOENT:
-            raise Exception('gr1c not found in path.')
-        else:
-            raise
-
-    s = translate(spec, 'gr1c')
-    logger.info('\n{hl}\n gr1c input:\n {s}\n{hl}'.format(s=s, hl=_hl))
-
     # to make debugging by manually running gr1c easier
-    fname = 'spec.gr1c'
-    try:
-        if logger.getEffectiveLevel() < logging.DEBUG:
-            with open(fname, 'w') as f:
-                f.write(s)
-            logger.debug('wrote input to file "{f}"'.format(f=fname))
-    except:
-        logger.error('failed to write auxiliary file: "{f}"'.format(f=fname))
-
-    (stdoutdata, stderrdata) = p.communicate(s)
+    fname = None
+    if logger.getEffectiveLevel() < logging.DEBUG:
+        fname = 'spec.gr1c'
+    returncode, stdoutdata, s, strategy = _call_gr1c(
+        ["-n", init_option, "-t", "tulip"], spec, fname, load_aut_xml,
+        translated)
+    logger.info('\n{hl}\n gr1c input:\n {s}\n{hl}'.format(s=s, hl=_hl))
 
     msg = (
         ('{spaces} gr1c return code: {c}\n\n'
          '{spaces} gr1c stdout, stderr:\n {out}\n\n').format(
-             c=p.returncode, out=stdoutdata, spaces=30 * ' '
+             c=returncode, out=stdoutdata, spaces=30 * ' '
         )
     )
 
-    if p.returncode == 0:
+    if returncode == 0:
         logger.debug(msg)
-        strategy = load_aut_xml(stdoutdata)
         return strategy
     else:
         print(msg)
         return None
 
+
+def _call_gr1c(args, spec, fname=None, load=None, translated=None):
+    """Run gr1c with C{args}, writing C{spec} to its stdin.
+
+    The spec is translated clause by clause in a separate thread,
+    while gr1c reads it and this thread reads the output of gr1c.
+    So the translated spec is not stored as a whole,
+    and the pipes do not fill up.
+    If C{translated} is given, then gr1c reads it as stdin instead.
+
+    @type args: C{list} of C{str}
+    @type spec: L{GRSpec}
+    @param fname: if given, then also write the input of gr1c
+        to the file with this name
+    @param load: if given, then call it with the stdout of gr1c
+        as a file, to parse the output while gr1c writes it.
+        Parsing errors are ignored if gr1c exits with an error.
+    @param translated: file with the translation of C{spec},
+        at position 0
+
+    @return: C{(returncode, output, spec_str, result)}, where:
+        C{output} is the stdout and stderr of gr1c,
+        only the first L{_HEAD_SIZE} bytes of stdout if C{load} is given;
+        C{spec_str} is the input of gr1c if logging at level INFO,
+        otherwise C{None};
+        C{result} is the return value of C{load}, or C{None}.
+    """
+    if load is None:
+        stderr = subprocess.STDOUT
+    else:
+        stderr = tempfile.TemporaryFile()
+    sinks = list()
+    log = None
+    if logger.isEnabledFor(logging.INFO):
+        log = StringIO.StringIO()
+        sinks.append(log)
+    aux = None
+    if fname is not None:
+        try:
+            aux = open(fname, 'w')
+            sinks.append(aux)
+            logger.debug('writing input to file "{f}"'.format(f=fname))
+        except IOError:
+            logger.error(
+                'failed to write auxiliary file: "{f}"'.format(f=fname))
+    if translated is None:
+        stdin = subprocess.PIPE
+    else:
+        # copy before gr1c starts, because they share the file offset
+        for sink in sinks:
+            shutil.copyfileobj(translated, sink)
+            translated.seek(0)
+        stdin = translated
+    try:
+        # buffered, because the spec is written in small pieces
+        p = subprocess.Popen(
+            [GR1C_BIN_PREFIX + "gr1c"] + args,
+            bufsize=-1,
+            stdin=stdin,
+            stdout=subprocess.PIPE, stderr=stderr
+        )
+    except OSError as e:
+        if e.errno == os.errno.ENOENT:
+            raise Exception('gr1c not found in path.')
+        else:
+            raise
+    errors = list()
+    t = None
+    if translated is None:
+        t = threading.Thread(
+            target=_feed, args=(spec, [p.stdin] + sinks, errors))
+        t.daemon = True
+        t.start()
+    result = None
+    load_error = None
+    if load is None:
+        out = p.stdout.read()
+    else:
+        f = _Head(p.stdout, _HEAD_SIZE)
+        try:
+            result = load(f)
+        except Exception:
+            load_error = sys.exc_info()
+        # drain, so that gr1c can exit
+        f.read()
+        out = f.head
+    if t is not None:
+        t.join()
+    p.wait()
+    if aux is not None:
+        aux.close()
+    if errors:
+        cls, e, tb = errors[0]
+        raise cls, e, tb
+    if load is not None:
+        stderr.seek(0)
+        out += stderr.read()
+        stderr.close()
+        if load_error is not None and p.returncode == 0:
+            cls, e, tb = load_error
+            raise cls, e, tb
+    s = log.getvalue() if log is not None else None
+    return p.returncode, out, s, result
+
+
+def _feed(spec, sinks, errors):
+    """Write C{spec} in gr1c syntax to C{sinks}, then close C{sinks[0]}.
+
+    Exceptions are appended to C{errors}, to be raised by the caller.
+    """
+    try:
+        translation.write(spec, 'gr1c', _Tee(sinks))
+    except IOError as e:
+        # gr1c exited before reading all input,
+        # its output describes the reason
+        if e.errno != os.errno.EPIPE:
+            errors.append(sys.exc_info())
+    except Exception:
+        errors.append(sys.exc_info())
+    finally:
+        try:
+            sinks[0].close()
+        except IOError:
+            pass
+
+
+class _Head(object):
+    """File-like that reads from C{f} and keeps the first C{n} bytes."""
+
+    def __init__(self, f, n):
+        self.f = f
+        self.n = n
+        self.head = ''
+
+    def read(self, size=-1):
+        s = self.f.read(size)
+        if len(self.head) < self.n:
+            self.head += s[:self.n - len(self.head)]
+        return s
+
+
+class _Tee(object):
+    """File-like that writes to each of several files."""
+
+    def __init__(self, files):
+        self.files = files
+
+    def write(self, s):
+        for f in self.files:
+            f.write(s)
+
 def load_mealy(filename):
     """Load C{gr1c} strategy from C{xml} file.
 
     @param filename: xml file name
     @type filename: C{str}
 
-    @return: loaded strategy as an annotated graph.
-    @rtype: C{networkx.Digraph}
+    @return: loaded strategy as an annotated graph,
+        read-only, see L{load_aut_xml}.
+    @rtype: L{Strategy}
     """
     s = open(filename, 'r').read()
     strategy = load_aut_xml(s)
@@ -55,12 +55,14 @@ DEBUG_AUT_FILE = 'aut.txt'
 
 
 def check_realizable(spec, heap_size='-Xmx128m', priority_kind=-1,
-                     init_option=1):
+                     init_option=1, translated=None):
     """Decide realizability of specification defined by given GRSpec object.
 
+    @param translated: see L{create_files}
+
     @return: True if realizable, False if not, or an error occurs.
     """
-    fSMV, fLTL, fAUT = create_files(spec)
+    fSMV, fLTL, fAUT = create_files(spec, translated)
     realizable = solve_game(spec, fSMV, fLTL, fAUT, heap_size,
                             priority_kind, init_option)
     os.unlink(fSMV)
@@ -156,16 +158,17 @@ def solve_game(
 
 def synthesize(
     spec, heap_size='-Xmx128m', priority_kind=3,
-    init_option=1
+    init_option=1, translated=None
 ):
     """Synthesize a strategy satisfying the specification.
 
-    Arguments are described in documentation for L{solve_game}.
+    Arguments are described in documentation for L{solve_game},
+    except for C{translated}, see L{create_files}.
 
     @return: Return strategy as instance of L{MealyMachine}, or a list
         of counter-examples as returned by L{get_counterexamples}.
     """
-    fSMV, fLTL, fAUT = create_files(spec)
+    fSMV, fLTL, fAUT = create_files(spec, translated)
 
     realizable = solve_game(spec, fSMV, fLTL, fAUT, heap_size,
                             priority_kind, init_option)
@@ -192,14 +195,24 @@ def synthesize(
         return counter_examples
 
 
-def create_files(spec):
-    """Create temporary files for read/write by JTLV."""
+def create_files(spec, translated=None):
+    """Create temporary files for read/write by JTLV.
+
+    @param translated: C{(smv, ltl)} as returned by
+        L{generate_jtlv_smv} and L{generate_jtlv_ltl} for C{spec}.
+        If C{None}, then C{spec} is translated.
+    """
+    if translated is None:
+        smv = generate_jtlv_smv(spec)
+        ltl = generate_jtlv_ltl(spec)
+    else:
+        smv, ltl = translated
     fSMV = tempfile.NamedTemporaryFile(delete=False, suffix='smv')
-    fSMV.write(generate_jtlv_smv(spec))
+    fSMV.write(smv)
     fSMV.close()
 
     fLTL = tempfile.NamedTemporaryFile(delete=False, suffix="ltl")
-    fLTL.write(generate_jtlv_ltl(spec))
+    fLTL.write(ltl)
     fLTL.close()
 
     fAUT = tempfile.NamedTemporaryFile(delete=False)
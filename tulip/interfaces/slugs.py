@@ -42,9 +42,9 @@ import json
 import os
 import subprocess
 import tempfile
-import networkx as nx
 import slugs
 from tulip.spec import GRSpec, translate
+from tulip.interfaces.strategy import StrategyBuilder
 
 
 def synthesize(spec):
@@ -52,7 +52,12 @@ def synthesize(spec):
 
     @type spec: L{GRSpec} or C{str} in structured slugs syntax.
     @return: If realizable return synthesized strategy, otherwise C{None}.
-    @rtype: C{networkx.DiGraph}
+
+        Changed: earlier versions returned a C{networkx.DiGraph}.
+        L{Strategy} is read-only and supports only part of
+        its interface. Call C{Strategy.to_networkx} to
+        obtain a C{networkx.DiGraph}.
+    @rtype: L{Strategy}
     """
     if isinstance(spec, GRSpec):
         struct = translate(spec, 'slugs')
@@ -72,26 +77,15 @@ def synthesize(spec):
     vrs = dict(spec.sys_vars)
     vrs.update(spec.env_vars)
     dout = json.loads(out)
-    g = nx.DiGraph()
     dvars = dout['variables']
+    b = StrategyBuilder()
     for stru, d in dout['nodes'].iteritems():
         u = int(stru)
-        state = dict(zip(dvars, d['state']))
-        g.add_node(u, state=state)
-        for v in d['trans']:
-            g.add_edge(u, v)
-    h = nx.DiGraph()
-    for u, d in g.nodes_iter(data=True):
-        bit_state = d['state']
+        bit_state = dict(zip(dvars, d['state']))
         int_state = _bitfields_to_ints(bit_state, vrs)
-        h.add_node(u, state=int_state)
-    for u, v in g.edges_iter():
-        h.add_edge(u, v)
-    logger.debug(
-        ('loaded strategy with vertices:\n  {v}\n'
-         'and edges:\n {e}\n').format(
-            v='\n  '.join(str(x) for x in h.nodes(data=True)),
-            e=h.edges()))
+        b.add_node(u, int_state, d['trans'])
+    h = b.build()
+    logger.debug('loaded strategy: {h}'.format(h=h))
     return h
 
 
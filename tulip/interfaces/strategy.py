@@ -0,0 +1,297 @@
+# Copyright (c) 2014 by California Institute of Technology
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the California Institute of Technology nor
+#    the names of its contributors may be used to endorse or promote
+#    products derived from this software without specific prior
+#    written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED.  IN NO EVENT SHALL CALTECH
+# OR THE CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+# USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+"""
+Compact representation of strategies returned by solvers.
+
+A strategy with millions of nodes does not fit in memory
+as a C{networkx.DiGraph} with a C{dict} per node.
+L{Strategy} stores instead:
+
+  - the values of variables as an integer matrix,
+    one row per node, one column per variable
+  - the successors of each node in compressed sparse row format
+
+and provides a read-only view with the methods of C{networkx.DiGraph}
+that are used to read strategies, e.g., C{successors_iter}
+and C{node[u]['state']}.
+"""
+import logging
+logger = logging.getLogger(__name__)
+import array
+import networkx as nx
+import numpy as np
+
+
+class Strategy(object):
+    """Strategy graph, with nodes labeled by variable values.
+
+    Attributes:
+
+      - C{ids}: node names, as integer array
+      - C{variables}: C{list} of variable names, order of columns
+      - C{states}: integer array, with C{states[i, j]}
+        the value of variable C{variables[j]} at node C{ids[i]}
+      - C{indptr}, C{indices}: successors of node C{ids[i]}
+        are the nodes C{ids[indices[indptr[i]:indptr[i + 1]]]}
+      - C{attributes}: C{dict} that maps names of
+        other node attributes to integer arrays, e.g., C{'mode'}
+      - C{env_vars}, C{sys_vars}: domains of variables
+
+    Nodes are identified by their C{ids}, as in the solver output.
+    The view mimics C{networkx.DiGraph}:
+
+      - C{len(g)}, C{u in g}, C{iter(g)}
+      - C{g.nodes(data=True)}, C{g.nodes_iter()}
+      - C{g.node[u]}, a new C{dict} with key C{'state'}
+        and the other attributes
+      - C{g.successors_iter(u)}, C{g.edges()}
+
+    Use L{to_networkx} for other graph algorithms.
+    """
+
+    def __init__(self, ids, variables, states, indptr, indices,
+                 attributes=None, env_vars=None, sys_vars=None):
+        self.ids = np.asarray(ids, dtype=int)
+        self.variables = list(variables)
+        self.states = np.asarray(states, dtype=int).reshape(
+            len(self.ids), len(self.variables))
+        self.indptr = np.asarray(indptr, dtype=int)
+        self.indices = np.asarray(indices, dtype=int)
+        if attributes is None:
+            attributes = dict()
+        self.attributes = {
+            k: np.asarray(v, dtype=int) for k, v in attributes.iteritems()}
+        if env_vars is not None:
+            self.env_vars = env_vars
+        if sys_vars is not None:
+            self.sys_vars = sys_vars
+        n = len(self.ids)
+        if len(self.indptr) != n + 1:
+            raise ValueError('indptr must have one more entry than ids')
+        # ids are often 0..n-1, then no map is needed
+        if np.array_equal(self.ids, np.arange(n)):
+            self._rows = None
+        else:
+            self._rows = dict((u, i) for i, u in enumerate(self.ids.tolist()))
+            if len(self._rows) != n:
+                raise ValueError('duplicate node ids')
+        self.node = _NodeView(self)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __nonzero__(self):
+        return len(self.ids) > 0
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __contains__(self, u):
+        try:
+            self.row(u)
+        except KeyError:
+            return False
+        return True
+
+    def __repr__(self):
+        return '{cls}({n} nodes, {m} edges, variables={v})'.format(
+            cls=type(self).__name__, n=len(self),
+            m=self.number_of_edges(), v=self.variables)
+
+    def row(self, u):
+        """Return row of node C{u} in C{states}.
+
+        @raise KeyError: if C{u} is not a node
+        """
+        if self._rows is not None:
+            return self._rows[u]
+        if not isinstance(u, (int, long, np.integer)) or not (
+                0 <= u < len(self.ids)):
+            raise KeyError(u)
+        return int(u)
+
+    def state(self, u):
+        """Return C{dict} of variable values at node C{u}."""
+        return dict(zip(self.variables, self.states[self.row(u)].tolist()))
+
+    def nodes(self, data=False):
+        return list(self.nodes_iter(data))
+
+    def nodes_iter(self, data=False):
+        if not data:
+            return iter(self)
+        return ((u, self.node[u]) for u in self)
+
+    def successors(self, u):
+        return list(self.successors_iter(u))
+
+    def successors_iter(self, u):
+        i = self.row(u)
+        rows = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        return iter(self.ids[rows].tolist())
+
+    def edges(self):
+        return list(self.edges_iter())
+
+    def edges_iter(self):
+        sources = np.repeat(self.ids, np.diff(self.indptr))
+        targets = self.ids[self.indices]
+        return iter(zip(sources.tolist(), targets.tolist()))
+
+    def has_edge(self, u, v):
+        return u in self and v in self.successors(u)
+
+    def number_of_nodes(self):
+        return len(self)
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def to_networkx(self):
+        """Return strategy as C{networkx.DiGraph}."""
+        g = nx.DiGraph()
+        g.add_nodes_from(self.nodes_iter(data=True))
+        g.add_edges_from(self.edges_iter())
+        for k in ('env_vars', 'sys_vars'):
+            if hasattr(self, k):
+                setattr(g, k, getattr(self, k))
+        return g
+
+    @classmethod
+    def from_networkx(cls, g):
+        """Return L{Strategy} from C{networkx.DiGraph} C{g}.
+
+        The nodes of C{g} must be integers and have attribute
+        C{'state'}, with the same variables at all nodes.
+        Other node attributes must be integers.
+        """
+        b = StrategyBuilder()
+        for u, d in g.nodes_iter(data=True):
+            attr = dict(d)
+            b.add_node(u, attr.pop('state'), g.successors_iter(u), **attr)
+        return b.build(
+            env_vars=getattr(g, 'env_vars', None),
+            sys_vars=getattr(g, 'sys_vars', None))
+
+
+class _NodeView(object):
+    """Read-only mapping from nodes to C{dict}s of attributes."""
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+
+    def __getitem__(self, u):
+        g = self.strategy
+        i = g.row(u)
+        d = {k: int(v[i]) for k, v in g.attributes.iteritems()}
+        d['state'] = dict(zip(g.variables, g.states[i].tolist()))
+        return d
+
+    def __contains__(self, u):
+        return u in self.strategy
+
+    def __iter__(self):
+        return iter(self.strategy)
+
+    def __len__(self):
+        return len(self.strategy)
+
+
+class StrategyBuilder(object):
+    """Collect nodes one by one, then return a L{Strategy}.
+
+    Values are appended to flat arrays of machine integers,
+    so memory grows linearly with small constants,
+    and no C{dict} is kept per node.
+    """
+
+    def __init__(self):
+        self.variables = None
+        self._ids = array.array('l')
+        self._states = array.array('l')
+        self._degrees = array.array('l')
+        self._succ = array.array('l')
+        self._attributes = dict()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add_node(self, u, state, successors, **attributes):
+        """Add node C{u} with C{state} and C{successors}.
+
+        @param u: integer
+        @param state: maps variable names to integers
+        @type state: C{dict}
+        @param successors: node ids, which can be added later
+        @param attributes: other integer attributes, e.g., C{mode}
+        """
+        if self.variables is None:
+            self.variables = sorted(state)
+            self._attributes = {k: array.array('l') for k in attributes}
+        elif len(state) != len(self.variables):
+            raise ValueError(
+                'node {u} has variables {s}, expected: {v}'.format(
+                    u=u, s=sorted(state), v=self.variables))
+        self._states.extend(state[k] for k in self.variables)
+        self._ids.append(u)
+        n = len(self._succ)
+        self._succ.extend(successors)
+        self._degrees.append(len(self._succ) - n)
+        for k, v in self._attributes.iteritems():
+            v.append(attributes[k])
+
+    def build(self, env_vars=None, sys_vars=None):
+        """Return L{Strategy} of the nodes added.
+
+        @raise ValueError: if some successor is not a node
+        """
+        ids = np.array(self._ids, dtype=int)
+        succ = np.array(self._succ, dtype=int)
+        indptr = np.zeros(len(ids) + 1, dtype=int)
+        np.cumsum(np.array(self._degrees, dtype=int), out=indptr[1:])
+        # successor ids to rows
+        order = np.argsort(ids, kind='mergesort')
+        pos = np.searchsorted(ids[order], succ)
+        pos = np.minimum(pos, max(len(ids) - 1, 0))
+        if len(succ) and (
+                not len(ids) or np.any(ids[order][pos] != succ)):
+            missing = set(succ.tolist()).difference(ids.tolist())
+            raise ValueError(
+                'successors that are not nodes: {m}'.format(m=missing))
+        indices = order[pos] if len(succ) else succ
+        variables = self.variables if self.variables is not None else []
+        return Strategy(
+            ids, variables, np.array(self._states, dtype=int),
+            indptr, indices,
+            attributes={k: np.array(v, dtype=int)
+                        for k, v in self._attributes.iteritems()},
+            env_vars=env_vars, sys_vars=sys_vars)
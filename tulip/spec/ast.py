@@ -76,6 +76,14 @@ def make_nodes(opmap=None):
     The tree is defined recursively,
     not with a graph data structure.
     L{Tree} is a graph data structure for that purpose.
+
+    A node must occur at most once in a tree,
+    because L{Tree} identifies nodes by identity,
+    and its transformations assume that each node has one parent.
+    Different trees can share nodes,
+    because nodes are not modified in place:
+    transformations modify L{Tree} graphs,
+    and C{Tree.to_recursive_ast} copies the nodes.
     """
     if opmap is None:
         opmap = OPMAP
@@ -289,6 +297,10 @@ def make_fol_nodes(opmap=None):
             super(Str, self).__init__(value)
             self.type = 'str'
 
+        def flatten(self, *arg, **kw):
+            # quotes ensure that flattened formulas can be parsed again
+            return '"{v}"'.format(v=self.value)
+
     class Comparator(nodes.Binary):
         """Binary relational operator (2-ary predicate)."""
 
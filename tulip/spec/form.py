@@ -318,9 +318,18 @@ class GRSpec(LTL):
             A string or iterable of strings.  An empty string is
             converted to an empty list.  A string is placed in a list.
             iterables are converted to lists.  Cf. L{GRSpec}.
+
+            Instead of strings, ASTs of C{tulip.spec.ast.nodes}
+            can be given.
+            They are flattened to strings, and cached,
+            so they need not be parsed. Their identifiers
+            are checked when they would have been parsed,
+            see L{parse}.
         """
         self.parser = parser
         self._ast = dict()
+        # given ASTs, not yet checked for undefined identifiers
+        self._unchecked = set()
         self._cache = {
             'string': dict(),
             'jtlv': dict(),
@@ -358,19 +367,29 @@ class GRSpec(LTL):
 
             if isinstance(x, str):
                 if not x:
-                    setattr(self, formula_component, [])
+                    x = []
                 else:
-                    setattr(self, formula_component, [x])
-            elif not isinstance(x, list):
-                setattr(self, formula_component, list(x))
-
-            setattr(self, formula_component,
-                    copy.deepcopy(getattr(self, formula_component)))
+                    x = [x]
+            elif hasattr(x, 'flatten'):
+                x = [x]
+            setattr(self, formula_component, self._add_ast(x))
 
         LTL.__init__(self, formula=self.to_canon(),
                      input_variables=self.env_vars,
                      output_variables=self.sys_vars)
 
+    def _add_ast(self, clauses):
+        """Return C{list} of strings, caching any ASTs in C{clauses}."""
+        r = list()
+        for x in clauses:
+            if not isinstance(x, basestring):
+                tree = x
+                x = tree.flatten()
+                self._ast[x] = tree
+                self._unchecked.add(x)
+            r.append(x)
+        return r
+
     def __repr__(self):
         args = (',\n\n'.join([
                 'env_vars={ev}',
@@ -510,7 +529,7 @@ class GRSpec(LTL):
                     ' found in {name}: {f}'.format(f=f, name=name))
 
     def copy(self):
-        return GRSpec(
+        r = GRSpec(
             env_vars=dict(self.env_vars),
             sys_vars=dict(self.sys_vars),
             env_init=copy.copy(self.env_init),
@@ -520,6 +539,11 @@ class GRSpec(LTL):
             sys_safety=copy.copy(self.sys_safety),
             sys_prog=copy.copy(self.sys_prog)
         )
+        # ASTs can be shared, see `tulip.spec.ast.make_nodes`
+        r._ast.update(self._ast)
+        r._unchecked.update(self._unchecked)
+        r._bool_int.update(self._bool_int)
+        return r
 
     def __or__(self, other):
         """Create union of two specifications."""
@@ -542,7 +566,9 @@ class GRSpec(LTL):
 
         for x in self._parts:
             getattr(result, x).extend(getattr(other, x))
-
+        result._ast.update(other._ast)
+        result._unchecked.update(other._unchecked)
+        result._bool_int.update(other._bool_int)
         return result
 
     def to_canon(self):
@@ -605,7 +631,7 @@ class GRSpec(LTL):
         logger.info('done with substitutions.\n')
         return a
 
-    def compile_init(self, no_str):
+    def compile_init(self, no_str, vectorized=False):
         """Compile python expression for initial conditions.
 
         The returned bytecode can be used with C{eval}
@@ -619,28 +645,42 @@ class GRSpec(LTL):
               - C{int} for integers
               - C{str} for arbitrary finite types
 
+        Only the initial conditions are parsed,
+        if they have not been parsed before.
+
         @param no_str: if True, then compile the formula
             where all string variables have been replaced by integers.
             Otherwise compile the original formula containing strings.
+        @param vectorized: if True, then compile an expression over
+            C{numpy} arrays, one per variable, that evaluates
+            the initial condition at all indices at once.
+            Boolean variables must be Boolean arrays.
+            Evaluate with C{eval(code, {'numpy': numpy}, values)}.
 
         @return: python expression compiled for C{eval}
         @rtype: C{code}
         """
-        self.str_to_int()
+        self._str_to_int(['env_init', 'sys_init'])
+        lang = 'numpy' if vectorized else 'python'
+        op = '&' if vectorized else 'and'
         init = {'env': self.env_init, 'sys': self.sys_init}
         pyinit = dict()
         for side, clauses in init.iteritems():
             if no_str:
                 clauses = [self._bool_int[x] for x in clauses]
             logger.info('clauses to compile: ' + str(clauses))
-            c = [ts.translate_ast(self.ast(x), 'python').flatten()
+            c = [ts.translate_ast(self._ast[x], lang).flatten()
                  for x in clauses]
             logger.info('after translation to python: ' + str(c))
-            s = _conj(c, op='and')
+            s = _conj(c, op=op)
             if not s:
                 s = 'True'
             pyinit[side] = s
-        s = 'not ({assumption}) or ({assertion})'.format(
+        if vectorized:
+            template = '(~ numpy.bool_({assumption})) | ({assertion})'
+        else:
+            template = 'not ({assumption}) or ({assertion})'
+        s = template.format(
             assumption=pyinit['env'],
             assertion=pyinit['sys'])
         return compile(s, '<string>', 'eval')
@@ -652,20 +692,21 @@ class GRSpec(LTL):
         Otherwise it returns a copy of spec with all arbitrary
         finite vars replaced by int-valued vars.
         """
+        self._str_to_int(self._parts)
+
+    def _str_to_int(self, parts):
         logger.info('convert string variables to integers...')
         vars_dict = dict(self.env_vars)
         vars_dict.update(self.sys_vars)
         fvars = {v: d for v, d in vars_dict.iteritems() if isinstance(d, list)}
+        self._parse(parts)
         # replace symbols by ints
-        for p in self._parts:
+        for p in parts:
             for x in getattr(self, p):
                 if self._bool_int.get(x) in self._ast:
-                    logger.debug(str(x) + ' is in _bool_int cache')
                     continue
-                else:
-                    logger.debug(str(x) + ' is not in _bool_int cache')
                 # get AST
-                a = self.ast(x)
+                a = self._ast[x]
                 # create AST copy with int and bool vars only
                 g = tx.Tree.from_recursive_ast(a)
                 tx.sub_constants(g, fvars)
@@ -687,7 +728,7 @@ class GRSpec(LTL):
             logger.debug('current cache of ASTs:\n' +
                          pprint.pformat(self._ast) + 3 * '\n')
             logger.debug('check if: ' + str(x) + ', is in cache.')
-        if x in self._ast:
+        if x in self._ast and x not in self._unchecked:
             logger.debug(str(x) + ' is already in cache')
         else:
             logger.info('AST cache does not contain:\n\t' + str(x) +
@@ -700,25 +741,39 @@ class GRSpec(LTL):
 
         The AST resulting from each clause is stored
         in the C{dict} attribute C{ast}.
+        Clauses given as ASTs are not parsed, but
+        checked for undefined identifiers, as parsed clauses are.
         """
         logger.info('parsing ASTs to cache them...')
-        vardoms = dict(self.env_vars)
-        vardoms.update(self.sys_vars)
+        self._parse(self._parts)
+        # rm cached ASTs that correspond to deleted clauses
+        self._collect_cache_garbage(self._ast)
+        self._unchecked.intersection_update(self._ast)
+        logger.info('done parsing ASTs.\n')
+
+    def _parse(self, parts):
+        """Parse the clauses in C{parts} that are not cached.
+
+        Cached clauses that were given as ASTs are checked.
+        """
+        vardoms = None
         # parse new clauses and cache the resulting ASTs
-        for p in self._parts:
+        for p in parts:
             s = getattr(self, p)
             for x in s:
-                if x in self._ast:
-                    logger.debug(str(x) + ' is already in cache')
+                if x in self._ast and x not in self._unchecked:
                     continue
-                logger.debug('parse: ' + str(x))
-                tree = self.parser.parse(x)
+                if vardoms is None:
+                    vardoms = dict(self.env_vars)
+                    vardoms.update(self.sys_vars)
+                if x in self._ast:
+                    tree = self._ast[x]
+                else:
+                    tree = self.parser.parse(x)
                 g = tx.Tree.from_recursive_ast(tree)
                 tx.check_for_undefined_identifiers(g, vardoms)
                 self._ast[x] = tree
-        # rm cached ASTs that correspond to deleted clauses
-        self._collect_cache_garbage(self._ast)
-        logger.info('done parsing ASTs.\n')
+                self._unchecked.discard(x)
 
     def _collect_cache_garbage(self, cache):
         logger.info('collecting garbage from GRSpec cache...')
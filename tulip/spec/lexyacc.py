@@ -232,6 +232,9 @@ class Parser(object):
         """
         if debuglog is None:
             debuglog = logging.getLogger(PARSER_LOGGER)
+        # the tracing parser of `ply` is several times slower
+        if not debuglog.isEnabledFor(logging.DEBUG):
+            debuglog = False
         root = self.parser.parse(
             formula,
             lexer=self.lexer.lexer,
@@ -38,6 +38,7 @@
   - SPIN: http://spinroot.com/spin/Man/ltl.html
           http://spinroot.com/spin/Man/operators.html
   - python (Boolean formulas only)
+  - numpy (Boolean formulas over arrays)
 """
 import logging
 logger = logging.getLogger(__name__)
@@ -157,13 +158,45 @@ def make_python_nodes():
     return nodes
 
 
+def make_numpy_nodes():
+    """Boolean formulas over C{numpy} arrays.
+
+    Each variable names an array, so a formula is
+    evaluated at all indices at once.
+    The name C{numpy} must be bound to the module.
+    """
+    opmap = {'True': 'numpy.True_', 'False': 'numpy.False_',
+             '!': '~', '&': '&', '|': '|',
+             '^': '^', '=': '==', '!=': '!=',
+             '<': '<', '<=': '<=', '>=': '>=', '>': '>',
+             '+': '+', '-': '-'}
+    nodes = ast.make_fol_nodes(opmap)
+
+    class Imp(nodes.Binary):
+        def flatten(self, *arg, **kw):
+            return '((~ {l}) | {r})'.format(
+                l=self.operands[0].flatten(),
+                r=self.operands[1].flatten())
+
+    class BiImp(nodes.Binary):
+        def flatten(self, *arg, **kw):
+            return '({l} == {r})'.format(
+                l=self.operands[0].flatten(),
+                r=self.operands[1].flatten())
+
+    nodes.Imp = Imp
+    nodes.BiImp = BiImp
+    return nodes
+
+
 lang2nodes = {
     'jtlv': make_jtlv_nodes(),
     'gr1c': make_gr1c_nodes(),
     'slugs': make_slugs_nodes(),
     'promela': make_promela_nodes(),
     'smv': make_smv_nodes(),
-    'python': make_python_nodes()}
+    'python': make_python_nodes(),
+    'numpy': make_numpy_nodes()}
 
 
 def _to_jtlv(d):
@@ -208,6 +241,14 @@ def _jtlv_str(m, comment, prefix='[]<>'):
 def _to_gr1c(d):
     """Dump to gr1c specification string.
 
+    Cf. L{interfaces.gr1c}.
+    """
+    return ''.join(_gr1c_chunks(d))
+
+
+def _gr1c_chunks(d):
+    """Yield gr1c specification in pieces, one per clause.
+
     Cf. L{interfaces.gr1c}.
     """
     def _to_gr1c_print_vars(vardict):
@@ -226,19 +267,20 @@ def _to_gr1c(d):
         return output
 
     logger.info('translate to gr1c...')
-    output = (
-        'ENV:' + _to_gr1c_print_vars(d['env_vars']) + ';\n' +
-        'SYS:' + _to_gr1c_print_vars(d['sys_vars']) + ';\n' +
-
-        _gr1c_str(d['env_init'], 'ENVINIT', '') +
-        _gr1c_str(d['env_safety'], 'ENVTRANS', '[]') +
-        _gr1c_str(d['env_prog'], 'ENVGOAL', '[]<>') + '\n' +
-
-        _gr1c_str(d['sys_init'], 'SYSINIT', '') +
-        _gr1c_str(d['sys_safety'], 'SYSTRANS', '[]') +
-        _gr1c_str(d['sys_prog'], 'SYSGOAL', '[]<>')
-    )
-    return output
+    yield 'ENV:' + _to_gr1c_print_vars(d['env_vars']) + ';\n'
+    yield 'SYS:' + _to_gr1c_print_vars(d['sys_vars']) + ';\n'
+    parts = [
+        (d['env_init'], 'ENVINIT', ''),
+        (d['env_safety'], 'ENVTRANS', '[]'),
+        (d['env_prog'], 'ENVGOAL', '[]<>'),
+        (d['sys_init'], 'SYSINIT', ''),
+        (d['sys_safety'], 'SYSTRANS', '[]'),
+        (d['sys_prog'], 'SYSGOAL', '[]<>')]
+    for s, name, prefix in parts:
+        for chunk in _gr1c_str(s, name, prefix):
+            yield chunk
+        if name == 'ENVGOAL':
+            yield '\n'
 
 
 # currently also used in interfaces.jtlv
@@ -256,11 +298,12 @@ def convert_domain(dom):
 
 
 def _gr1c_str(s, name='SYSGOAL', prefix='[]<>'):
-    if not s:
-        return '{name}:;\n'.format(name=name)
-    f = '\n& '.join([
-        prefix + '({u})'.format(u=x) for x in s])
-    return '{name}: {f};\n'.format(name=name, f=f)
+    yield '{name}:'.format(name=name)
+    sep = ' '
+    for x in s:
+        yield '{sep}{prefix}({u})'.format(sep=sep, prefix=prefix, u=x)
+        sep = '\n& '
+    yield ';\n'
 
 
 def _to_slugs(d):
@@ -268,27 +311,38 @@ def _to_slugs(d):
 
     @type spec: L{GRSpec}.
     """
-    f = _slugs_str
-    return (
-        _format_slugs_vars(d['env_vars'], 'INPUT') +
-        _format_slugs_vars(d['sys_vars'], 'OUTPUT') +
+    return ''.join(_slugs_chunks(d))
 
-        f(d['env_safety'], 'ENV_TRANS') +
-        f(d['env_prog'], 'ENV_LIVENESS') +
-        f(d['env_init'], 'ENV_INIT', sep='&') +
 
-        f(d['sys_safety'], 'SYS_TRANS') +
-        f(d['sys_prog'], 'SYS_LIVENESS') +
-        f(d['sys_init'], 'SYS_INIT', sep='&')
-    )
+def _slugs_chunks(d):
+    """Yield structured slugs spec in pieces, one per clause."""
+    yield _format_slugs_vars(d['env_vars'], 'INPUT')
+    yield _format_slugs_vars(d['sys_vars'], 'OUTPUT')
+    parts = [
+        (d['env_safety'], 'ENV_TRANS', '\n'),
+        (d['env_prog'], 'ENV_LIVENESS', '\n'),
+        (d['env_init'], 'ENV_INIT', '&'),
+        (d['sys_safety'], 'SYS_TRANS', '\n'),
+        (d['sys_prog'], 'SYS_LIVENESS', '\n'),
+        (d['sys_init'], 'SYS_INIT', '&')]
+    for r, name, sep in parts:
+        for chunk in _slugs_str(r, name, sep):
+            yield chunk
 
 
 def _slugs_str(r, name, sep='\n'):
-    if not r:
-        return '[{name}]\n'.format(name=name)
+    yield '[{name}]\n'.format(name=name)
     sep = ' {sep} '.format(sep=sep)
-    f = sep.join(x for x in r if x)
-    return '[{name}]\n{f}\n\n'.format(name=name, f=f)
+    empty = True
+    first = True
+    for x in r:
+        empty = False
+        if not x:
+            continue
+        yield x if first else sep + x
+        first = False
+    if not empty:
+        yield '\n\n'
 
 
 def _format_slugs_vars(vardict, name):
@@ -307,6 +361,7 @@ def _format_slugs_vars(vardict, name):
 
 
 to_lang = {'jtlv': _to_jtlv, 'gr1c': _to_gr1c, 'slugs': _to_slugs}
+lang2chunks = {'gr1c': _gr1c_chunks, 'slugs': _slugs_chunks}
 
 
 def translate(spec, lang):
@@ -318,16 +373,51 @@ def translate(spec, lang):
     @return: spec formatted for input to tool
     @rtype: C{str}
     """
+    return to_lang[lang](_translate_parts(spec, lang))
+
+
+def write(spec, lang, f):
+    """Write spec in tool format to file-like C{f}.
+
+    Each clause is translated and written before
+    the next one, so the whole output is never in memory,
+    and a process reading from C{f} can start parsing
+    while the rest is translated.
+
+    @type spec: L{GRSpec}
+    @type lang: 'gr1c' or 'slugs'
+    @param f: has method C{write}, e.g., a pipe to a solver
+    """
+    if lang not in lang2chunks:
+        raise ValueError(
+            'streaming not supported for: {lang}'.format(lang=lang))
+    for chunk in lang2chunks[lang](_translate_parts(spec, lang, lazy=True)):
+        f.write(chunk)
+
+
+def _translate_parts(spec, lang, lazy=False):
+    """Return C{dict} of translated clauses per part of C{spec}.
+
+    @param lazy: if C{True}, then each part is an iterator
+        that translates each clause when requested.
+    """
     spec.check_syntax()
     spec.str_to_int()
     # pprint.pprint(spec._bool_int)
-    d = {p: [translate_ast(spec.ast(spec._bool_int[x]), lang).flatten(
-             env_vars=spec.env_vars, sys_vars=spec.sys_vars)
-         for x in getattr(spec, p)] for p in spec._parts}
+    d = {p: _translate_clauses(spec, getattr(spec, p), lang)
+         for p in spec._parts}
+    if not lazy:
+        d = {p: list(v) for p, v in d.iteritems()}
     # pprint.pprint(d)
     d['env_vars'] = spec.env_vars
     d['sys_vars'] = spec.sys_vars
-    return to_lang[lang](d)
+    return d
+
+
+def _translate_clauses(spec, clauses, lang):
+    for x in clauses:
+        yield translate_ast(spec.ast(spec._bool_int[x]), lang).flatten(
+            env_vars=spec.env_vars, sys_vars=spec.sys_vars)
 
 
 def translate_ast(tree, lang):
@@ -335,12 +425,12 @@ def translate_ast(tree, lang):
 
     @type tree: L{Nodes.Node}
     @type lang: 'gr1c' or 'slugs' or 'jtlv' or
-      'promela' or 'smv' or 'python'
+      'promela' or 'smv' or 'python' or 'numpy'
 
     @return: tree using AST nodes of C{lang}
     @rtype: L{FOL.Node}
     """
-    if lang == 'python':
+    if lang in {'python', 'numpy'}:
         return _ast_to_python(tree, lang2nodes[lang])
     else:
         return _ast_to_lang(tree, lang2nodes[lang])
@@ -34,12 +34,18 @@ from __future__ import absolute_import
 import logging
 logger = logging.getLogger(__name__)
 import copy
+import itertools
 import warnings
+import networkx as nx
+import numpy as np
 from tulip.transys import MealyMachine
 from tulip.transys import machines
 from tulip.transys.labeled_graphs import remove_deadends
 from tulip.spec import GRSpec
+from tulip.spec.ast import nodes as _ast
+from tulip.spec.parser import parse as _parse
 from tulip.interfaces import jtlv, gr1c
+from tulip.interfaces.strategy import Strategy
 
 
 _hl = '\n' + 60 * '-'
@@ -153,7 +159,8 @@ def iter2var(var, values):
     return domain
 
 
-def sys_to_spec(g, nodevar, ignore_initial, receptive=False):
+def sys_to_spec(g, nodevar, ignore_initial, receptive=False,
+                encoding='flat'):
     """Convert transition system to GR(1) fragment of LTL.
 
     The attribute `g.owner` defines who selects the next node.
@@ -174,6 +181,18 @@ def sys_to_spec(g, nodevar, ignore_initial, receptive=False):
     @type ignore_initial: `bool`
     @param receptive: if `True`, then add assumptions to
         ensure receptiveness at each node.
+    @param encoding: representation of transitions and labels:
+
+        - `'flat'`: one clause per node,
+          with a disjunct per outgoing edge.
+        - `'grouped'`: one clause per set of nodes with
+          the same outgoing edges (or the same label).
+          Sets of integer nodes are represented by ranges,
+          which results in much smaller formulas for
+          large transition systems.
+
+        Both encodings have the same semantics.
+    @type encoding: `str`
 
     @return: GR(1) formula representing `g`.
     @rtype: `GRSpec`
@@ -183,7 +202,7 @@ def sys_to_spec(g, nodevar, ignore_initial, receptive=False):
                 if k in g.env_vars}
     sys_vars = {k: v for k, v in g.vars.iteritems()
                 if k not in g.env_vars}
-    dom = _iter2var(g, nodevar)
+    dom = iter2var(nodevar, g.nodes())
     if g.owner == 'sys':
         sys_vars[nodevar] = dom
     elif g.owner == 'env':
@@ -198,27 +217,58 @@ def sys_to_spec(g, nodevar, ignore_initial, receptive=False):
     evars = dict(env_vars)
     p, _ = _prime_dict(evars)
     evars.update(p)
+    try:
+        f = _encodings[encoding]
+    except KeyError:
+        raise ValueError('unknown encoding: {e}'.format(e=encoding))
     # convert to logic
-    init = _init_from_ts(g.initial_nodes, nodevar, dvars, ignore_initial)
-    tmp_init, nodepred = _node_var_trans(g, nodevar, dvars)
+    init = f['init'](g.initial_nodes, nodevar, dvars, ignore_initial)
+    tmp_init, nodepred = f['node_var'](g, nodevar, dvars)
     if g.owner == 'sys':
         sys_init = init + tmp_init
-        sys_safe = _sys_trans(g, nodevar, dvars)
+        sys_safe = f['sys'](g, nodevar, dvars)
         sys_safe += nodepred
         env_init = list()
         if receptive:
-            env_safe = _env_trans_from_sys_ts(g, nodevar, dvars)
+            env_safe = f['env_from_sys'](g, nodevar, dvars)
         else:
             env_safe = list()
     elif g.owner == 'env':
         sys_init = list()
         sys_safe = list()
         env_init = init + tmp_init
-        env_safe = nodepred + _env_trans(g, nodevar, dvars)
-    return GRSpec(
+        env_safe = nodepred + f['env'](g, nodevar, dvars)
+    specs = GRSpec(
         sys_vars=sys_vars, env_vars=env_vars,
         env_init=env_init, sys_init=sys_init,
         env_safety=env_safe, sys_safety=sys_safe)
+    if logger.isEnabledFor(logging.INFO):
+        size = spec_size(specs)
+        logger.info(
+            '{encoding} encoding of {n} nodes: '
+            '{c} clauses, {k} characters'.format(
+                encoding=encoding, n=len(g),
+                c=sum(c for c, _ in size.itervalues()),
+                k=sum(k for _, k in size.itervalues())))
+    return specs
+
+
+def spec_size(specs):
+    """Return the size of each part of `specs`.
+
+    Useful for comparing encodings of transition systems,
+    see `sys_to_spec`.
+
+    @type specs: `GRSpec`
+
+    @return: map from each part, e.g., `'sys_safety'`, to
+        `(number of clauses, number of characters)`
+    @rtype: `dict`
+    """
+    return {
+        part: (len(getattr(specs, part)),
+               sum(len(x) for x in getattr(specs, part)))
+        for part in specs._parts}
 
 
 def _node_var_trans(g, nodevar, dvars):
@@ -231,12 +281,12 @@ def _node_var_trans(g, nodevar, dvars):
     for u, d in g.nodes_iter(data=True):
         pre = _assign(nodevar, u, dvars)
         r = _to_action(d, dvars)
-        if not r:
+        if r is None:
             continue
         # initial node vars
-        init.append('!({pre}) || ({r})'.format(pre=pre, r=r))
+        init.append(_or([_not(pre), r]))
         # transitions of node vars
-        trans.append('(X (({pre}) -> ({r})))'.format(pre=pre, r=r))
+        trans.append(_ast.Unary('X', _ast.Binary('->', pre, r)))
     return (init, trans)
 
 
@@ -252,7 +302,7 @@ def _init_from_ts(initial_nodes, nodevar, dvars, ignore_initial=False):
             '   so the spec becomes trivially False.\n'
             ' - assumption if this is an environment TS,\n'
             '   so the spec becomes trivially True.')
-    return [_disj(_assign(nodevar, u, dvars) for u in initial_nodes)]
+    return [_or(_assign(nodevar, u, dvars) for u in initial_nodes)]
 
 
 def _sys_trans(g, nodevar, dvars):
@@ -264,7 +314,7 @@ def _sys_trans(g, nodevar, dvars):
         # no successors ?
         if not g.succ.get(u):
             logger.debug('node: {u} is deadend !'.format(u=u))
-            sys_trans.append('({pre}) -> (X False)'.format(pre=pre))
+            sys_trans.append(_ast.Binary('->', pre, _next_false()))
             continue
         post = list()
         for u, v, d in g.edges_iter(u, data=True):
@@ -272,8 +322,7 @@ def _sys_trans(g, nodevar, dvars):
             t[_prime(nodevar)] = v
             r = _to_action(t, dvars)
             post.append(r)
-        c = '({pre}) -> ({post})'.format(pre=pre, post=_disj(post))
-        sys_trans.append(c)
+        sys_trans.append(_ast.Binary('->', pre, _or(post)))
     return sys_trans
 
 
@@ -302,16 +351,16 @@ def _env_trans_from_sys_ts(g, nodevar, dvars):
             # TODO: syntactic over-approximation not applied,
             # so primed sys vars not filtered out here to
             # derive guards
-            t = _to_action(d, denv)
+            t = _label(d, denv)
             if not t:
                 continue
             c.add(t)
         # no next env actions ?
         if not c:
             continue
-        post = _disj(c)
+        post = _or(_to_action(dict(t), denv) for t in sorted(c))
         pre = _assign(nodevar, u, dvars)
-        env_trans.append('(({pre}) -> ({post}))'.format(pre=pre, post=post))
+        env_trans.append(_ast.Binary('->', pre, post))
     return env_trans
 
 
@@ -328,7 +377,7 @@ def _env_trans(g, nodevar, dvars):
         pre = _assign(nodevar, u, dvars)
         # no successors ?
         if not g.succ.get(u):
-            env_trans.append('{pre} -> X(False)'.format(pre=pre))
+            env_trans.append(_ast.Binary('->', pre, _next_false()))
             warnings.warn(
                 'Environment dead-end found.\n'
                 'If sys can force env to dead-end,\n'
@@ -350,36 +399,249 @@ def _env_trans(g, nodevar, dvars):
             # what sys vars ?
             t = {k: v for k, v in d.iteritems()
                  if k not in g.env_vars}
-            r = _to_action(t, dvars)
-            sys.append(r)
+            sys.append(_label(t, dvars))
+        # avoid sys winning env by blocking all edges
+        post.append(_block(sys, dvars))
+        env_trans.append(_ast.Binary('->', pre, _or(post)))
+    return env_trans
+
+
+def _init_grouped(initial_nodes, nodevar, dvars, ignore_initial=False):
+    """Like `_init_from_ts`, using ranges for integer nodes."""
+    if ignore_initial or not initial_nodes:
+        # raises exception if no initial nodes
+        return _init_from_ts(initial_nodes, nodevar, dvars, ignore_initial)
+    return [_in_set(nodevar, initial_nodes, dvars)]
+
+
+def _node_var_trans_grouped(g, nodevar, dvars):
+    """Like `_node_var_trans`, one clause per label."""
+    init = list()
+    trans = list()
+    if not dvars:
+        return (init, trans)
+    labels = _group(
+        (_label(d, dvars), u) for u, d in g.nodes_iter(data=True))
+    for t, nodes in labels:
+        if not t:
+            continue
+        pre = _in_set(nodevar, nodes, dvars)
+        r = _to_action(dict(t), dvars)
+        init.append(_or([_not(pre), r]))
+        trans.append(_ast.Unary('X', _ast.Binary('->', pre, r)))
+    return (init, trans)
+
+
+def _sys_trans_grouped(g, nodevar, dvars):
+    """Like `_sys_trans`, one clause per set of outgoing edges."""
+    sys_trans = list()
+    for edges, nodes in _group_by_edges(g, dvars):
+        pre = _in_set(nodevar, nodes, dvars)
+        if edges is None:
+            logger.debug('deadends: {nodes}'.format(nodes=nodes))
+            sys_trans.append(_ast.Binary('->', pre, _next_false()))
+            continue
+        post = _post(edges, nodevar, dvars)
+        sys_trans.append(_ast.Binary('->', pre, post))
+    return sys_trans
+
+
+def _env_trans_from_sys_ts_grouped(g, nodevar, dvars):
+    """Like `_env_trans_from_sys_ts`, one clause per set of actions."""
+    denv = {k: v for k, v in dvars.iteritems() if k in g.env_vars}
+    env_trans = list()
+    actions = list()
+    for u in g.nodes_iter():
+        c = frozenset(
+            _label(d, denv) for _, _, d in g.edges_iter(u, data=True))
+        c = c - {tuple()}
+        if c:
+            actions.append((c, u))
+    for c, nodes in _group(actions):
+        pre = _in_set(nodevar, nodes, dvars)
+        post = _or(_to_action(dict(t), denv) for t in sorted(c))
+        env_trans.append(_ast.Binary('->', pre, post))
+    return env_trans
+
+
+def _env_trans_grouped(g, nodevar, dvars):
+    """Like `_env_trans`, one clause per set of outgoing edges."""
+    env_trans = list()
+    for edges, nodes in _group_by_edges(g, dvars):
+        pre = _in_set(nodevar, nodes, dvars)
+        if edges is None:
+            env_trans.append(_ast.Binary('->', pre, _next_false()))
+            warnings.warn(
+                'Environment dead-ends found: {nodes}\n'
+                'If sys can force env to dead-end,\n'
+                'then GR(1) assumption becomes False,\n'
+                'and spec trivially True.'.format(nodes=nodes))
+            continue
+        post = [_post(edges, nodevar, dvars)]
         # avoid sys winning env by blocking all edges
-        post.append(_conj_neg(sys))
-        env_trans.append('({pre}) -> ({post})'.format(
-            pre=pre, post=_disj(post)))
+        sys = set()
+        for u, _, d in g.out_edges_iter(nodes[0], data=True):
+            t = {k: v for k, v in d.iteritems()
+                 if k not in g.env_vars}
+            sys.add(_label(t, dvars))
+        post.append(_block(sorted(sys), dvars))
+        env_trans.append(_ast.Binary('->', pre, _or(post)))
     return env_trans
 
 
+def _group_by_edges(g, dvars):
+    """Return nodes grouped by their outgoing edges.
+
+    @return: `list` of `(edges, nodes)`, where `edges` is
+        a `frozenset` of pairs `(label, successors)`,
+        or `None` for nodes without successors.
+    """
+    keys = list()
+    for u in g.nodes_iter():
+        if not g.succ.get(u):
+            keys.append((None, u))
+            continue
+        edges = _group(
+            (_label(d, dvars), v)
+            for _, v, d in g.edges_iter(u, data=True))
+        keys.append((
+            frozenset((t, frozenset(v)) for t, v in edges), u))
+    return _group(keys)
+
+
+def _post(edges, nodevar, dvars):
+    """Return disjunction over `edges` of action and next node."""
+    pvar = _prime(nodevar)
+    c = list()
+    for t, nodes in sorted(edges, key=lambda x: (x[0], sorted(x[1]))):
+        c.append(_and([
+            _to_action(dict(t), dvars),
+            _in_set(pvar, nodes, dvars)]))
+    return _or(c)
+
+
+def _block(sys, dvars):
+    """Return conjunction of negated sys actions.
+
+    An empty action cannot be blocked, so then return `None`.
+
+    @param sys: `list` of labels, as returned by `_label`
+    """
+    if tuple() in sys:
+        return None
+    return _and(_not(_to_action(dict(t), dvars)) for t in sys)
+
+
+def _group(pairs):
+    """Return items grouped by key, in order of first appearance.
+
+    @param pairs: iterable of `(key, item)`
+    @rtype: `list` of `(key, list of items)`
+    """
+    groups = dict()
+    keys = list()
+    for k, x in pairs:
+        if k not in groups:
+            groups[k] = list()
+            keys.append(k)
+        groups[k].append(x)
+    return [(k, groups[k]) for k in keys]
+
+
+def _in_set(k, values, dvars):
+    """Return AST of membership of variable `k` in `values`.
+
+    For an integer variable, maximal ranges of consecutive values
+    are used, or the ranges not in `values`, if fewer.
+    For a string variable, a disjunction of equalities.
+
+    @type k: `str`
+    @type values: iterable of `int` or `str`
+    @type dvars: `dict`
+    """
+    dom = dvars[k]
+    if not isinstance(dom, tuple):
+        return _or(_assign(k, v, dvars) for v in values)
+    a, b = dom
+    ranges = _ranges(sorted(set(values)))
+    gaps = _complement(ranges, a, b)
+    if not gaps:
+        return _ast.Bool('True')
+    if len(gaps) < len(ranges):
+        return _not(_or(_range(k, x, a, b) for x in gaps))
+    return _or(_range(k, x, a, b) for x in ranges)
+
+
+def _ranges(values):
+    """Return maximal ranges `(min, max)` in sorted integers."""
+    ranges = list()
+    for x in values:
+        if ranges and ranges[-1][1] == x - 1:
+            ranges[-1][1] = x
+        else:
+            ranges.append([x, x])
+    return [tuple(x) for x in ranges]
+
+
+def _complement(ranges, a, b):
+    """Return ranges in `[a, b]` that are not in `ranges`."""
+    gaps = list()
+    low = a
+    for x, y in ranges:
+        if x > low:
+            gaps.append((low, x - 1))
+        low = y + 1
+    if low <= b:
+        gaps.append((low, b))
+    return gaps
+
+
+def _range(k, r, a, b):
+    """Return AST of `k` in range `r`, within domain `[a, b]`."""
+    x, y = r
+    if x == y:
+        return _ast.Comparator('=', _var(k), _ast.Num(str(x)))
+    c = list()
+    if x > a:
+        c.append(_ast.Comparator('>=', _var(k), _ast.Num(str(x))))
+    if y < b:
+        c.append(_ast.Comparator('<=', _var(k), _ast.Num(str(y))))
+    return _and(c)
+
+
+def _label(d, dvars):
+    """Return hashable label of the assignments in `d`.
+
+    @return: sorted `tuple` of items of `d` that
+        are in `dvars`, or `"formula"`
+    """
+    return tuple(sorted(
+        (k, v) for k, v in d.iteritems()
+        if k in dvars or k == 'formula'))
+
+
 def _to_action(d, dvars):
-    """Return `str` conjoining assignments and `"formula"` in `d`.
+    """Return AST conjoining assignments and `"formula"` in `d`.
 
     @param d: (partial) mapping from variables in `dvars`
         to values in their range, defined by `dvars`
     @type d: `dict`
     @type dvars: `dict`
+
+    @return: AST, or `None` if `d` contains no assignments
     """
     c = list()
     if 'formula' in d:
-        c.append(d['formula'])
+        c.append(_parse(d['formula']))
     for k, v in d.iteritems():
         if k not in dvars:
             continue
-        s = _assign(k, v, dvars)
-        c.append(s)
-    return _conj(c)
+        c.append(_assign(k, v, dvars))
+    return _and(c)
 
 
 def _assign(k, v, dvars):
-    """Return `str` of equality of variable `k` to value `v`.
+    """Return AST of equality of variable `k` to value `v`.
 
     @type k: `str`
     @type v: `str` or `int`
@@ -387,14 +649,77 @@ def _assign(k, v, dvars):
     """
     dom = dvars[k]
     if isinstance(dom, tuple):
-        s = '{k} = {v}'.format(k=k, v=v)
+        return _ast.Comparator('=', _var(k), _ast.Num(str(v)))
     elif isinstance(dom, (set, list)):
-        s = '{k} = "{v}"'.format(k=k, v=v)
+        return _ast.Comparator('=', _var(k), _ast.Str(v))
     elif dom in {'bool', 'boolean'}:
-        s = '{k} <-> {v}'.format(k=k, v=v)
+        if isinstance(v, basestring):
+            v = v.lower() == 'true'
+        return _var(k) if v else _not(_var(k))
     else:
         raise Exception('domain is: {dom}'.format(dom=dom))
-    return _pstr(s)
+
+
+# Formulas are built as trees of `tulip.spec.ast.nodes`,
+# so `GRSpec` need not parse them.
+# A node occurs at most once in each tree, but
+# different trees can share nodes, see `tulip.spec.ast.make_nodes`.
+
+def _var(k):
+    """Return AST of variable `k`, or `X k` if `k` is primed."""
+    if k.endswith("'"):
+        return _ast.Unary('X', _ast.Var(k[:-1]))
+    return _ast.Var(k)
+
+
+def _not(x):
+    return _ast.Unary('!', x)
+
+
+def _next_false():
+    return _ast.Unary('X', _ast.Bool('False'))
+
+
+def _and(operands):
+    return _balanced('&', operands)
+
+
+def _or(operands):
+    return _balanced('|', operands)
+
+
+def _balanced(op, operands):
+    """Return balanced tree of binary `op` over `operands`.
+
+    Balanced trees avoid deep recursion for long disjunctions.
+    Operands that are `None` are skipped.
+
+    @return: AST, or `None` if no operands
+    """
+    c = [x for x in operands if x is not None]
+    if not c:
+        return None
+    while len(c) > 1:
+        r = [_ast.Binary(op, x, y) for x, y in zip(c[::2], c[1::2])]
+        if len(c) % 2:
+            r.append(c[-1])
+        c = r
+    return c[0]
+
+
+_encodings = {
+    'flat': dict(
+        init=_init_from_ts,
+        node_var=_node_var_trans,
+        sys=_sys_trans,
+        env_from_sys=_env_trans_from_sys_ts,
+        env=_env_trans),
+    'grouped': dict(
+        init=_init_grouped,
+        node_var=_node_var_trans_grouped,
+        sys=_sys_trans_grouped,
+        env_from_sys=_env_trans_from_sys_ts_grouped,
+        env=_env_trans_grouped)}
 
 
 def build_dependent_var_table(fts, statevar):
@@ -452,7 +777,8 @@ def map_ap_to_states(fts):
     return table
 
 
-def synthesize_many(specs, ts=None, ignore_init=None, solver='gr1c'):
+def synthesize_many(specs, ts=None, ignore_init=None, solver='gr1c',
+                    encoding='flat'):
     """Synthesize from logic specs and multiple transition systems.
 
     The transition systems are composed synchronously, i.e.,
@@ -507,12 +833,14 @@ def synthesize_many(specs, ts=None, ignore_init=None, solver='gr1c'):
 
     @param solver: `'gr1c'` or `'jtlv'`
     @type solver: `str`
+
+    @param encoding: see `sys_to_spec`
     """
     assert isinstance(ts, dict)
     for name, t in ts.iteritems():
         ignore = name in ignore_init
         statevar = name
-        specs |= sys_to_spec(t, statevar, ignore)
+        specs |= sys_to_spec(t, statevar, ignore, encoding=encoding)
     if solver == 'gr1c':
         ctrl = gr1c.synthesize(specs)
     elif solver == 'jtlv':
@@ -535,7 +863,7 @@ def synthesize_many(specs, ts=None, ignore_init=None, solver='gr1c'):
 
 def synthesize(option, specs, env=None, sys=None,
                ignore_env_init=False, ignore_sys_init=False,
-               rm_deadends=True):
+               rm_deadends=True, encoding='flat', cache=None):
     """Function to call the appropriate synthesis tool on the specification.
 
     The states of the transition system can be either:
@@ -586,6 +914,12 @@ def synthesize(option, specs, env=None, sys=None,
     @type ignore_env_init: `bool`
     @param rm_deadends: return a strategy that contains no terminal states.
     @type rm_deadends: `bool`
+    @param encoding: of `env` and `sys` in logic, see `sys_to_spec`
+    @type encoding: `str`
+    @param cache: if given, then return the strategy stored for
+        the same solver input, if any, without calling the solver,
+        and store the strategies computed.
+    @type cache: `interfaces.cache.SynthesisCache`
 
     @return: If spec is realizable,
         then return a Mealy machine implementing the strategy.
@@ -593,14 +927,8 @@ def synthesize(option, specs, env=None, sys=None,
     @rtype: `MealyMachine` or `None`
     """
     specs = _spec_plus_sys(specs, env, sys, ignore_env_init,
-                           ignore_sys_init)
-    if option == 'gr1c':
-        strategy = gr1c.synthesize(specs)
-    elif option == 'jtlv':
-        strategy = jtlv.synthesize(specs)
-    else:
-        raise Exception('Undefined synthesis option. ' +
-                        'Current options are "jtlv" and "gr1c"')
+                           ignore_sys_init, encoding)
+    strategy = _cached(option, specs, cache, 'synthesize')
     ctrl = strategy2mealy(strategy, specs)
     try:
         logger.debug('Mealy machine has: n = ' +
@@ -618,29 +946,64 @@ def synthesize(option, specs, env=None, sys=None,
 
 
 def is_realizable(option, specs, env=None, sys=None,
-                  ignore_env_init=False, ignore_sys_init=False):
+                  ignore_env_init=False, ignore_sys_init=False,
+                  encoding='flat', cache=None):
     """Check realizability.
 
     For details, see `synthesize`.
     """
     specs = _spec_plus_sys(
         specs, env, sys,
-        ignore_env_init, ignore_sys_init)
+        ignore_env_init, ignore_sys_init, encoding)
+    r = _cached(option, specs, cache, 'realizable')
+    if r:
+        logger.debug('is realizable')
+    else:
+        logger.debug('is not realizable')
+    return r
+
+
+def _cached(option, specs, cache, operation):
+    """Return result of `operation` by solver `option`.
+
+    If `cache` is `None`, then call the solver.
+    Otherwise, look up the result in `cache`,
+    and call the solver only if it is missing.
+
+    @param operation: `'synthesize'` or `'realizable'`
+    @type cache: `interfaces.cache.SynthesisCache` or `None`
+    """
     if option == 'gr1c':
-        r = gr1c.check_realizable(specs)
+        solver = gr1c
     elif option == 'jtlv':
-        r = jtlv.check_realizable(specs)
+        solver = jtlv
     else:
         raise Exception('Undefined synthesis option. ' +
                         'Current options are "jtlv" and "gr1c"')
-    if r:
-        logger.debug('is realizable')
+    if operation == 'synthesize':
+        f = solver.synthesize
     else:
-        logger.debug('is not realizable')
+        f = solver.check_realizable
+    if cache is None:
+        return f(specs)
+    key, translated = cache.key_and_input(
+        option, specs, operation=operation)
+    try:
+        r = cache.load(key)
+    except KeyError:
+        # the solver reads the input that was hashed
+        r = f(specs, translated=translated)
+        # counterexamples are not stored
+        if r is None or isinstance(r, (bool, nx.DiGraph, Strategy)):
+            cache.dump(key, r)
+    finally:
+        if hasattr(translated, 'close'):
+            translated.close()
     return r
 
 
-def _spec_plus_sys(specs, env, sys, ignore_env_init, ignore_sys_init):
+def _spec_plus_sys(specs, env, sys, ignore_env_init, ignore_sys_init,
+                   encoding='flat'):
     if sys is not None:
         assert sys.owner == 'sys'
         if hasattr(sys, 'state_varname'):
@@ -649,7 +1012,8 @@ def _spec_plus_sys(specs, env, sys, ignore_env_init, ignore_sys_init):
             logger.info('sys.state_varname undefined. '
                         'Will use the default variable name: "loc".')
             statevar = 'loc'
-        sys_formula = sys_to_spec(sys, statevar, ignore_sys_init)
+        sys_formula = sys_to_spec(sys, statevar, ignore_sys_init,
+                                  encoding=encoding)
         specs = specs | sys_formula
         logger.debug('sys TS:\n' + str(sys_formula.pretty()) + _hl)
     if env is not None:
@@ -660,7 +1024,8 @@ def _spec_plus_sys(specs, env, sys, ignore_env_init, ignore_sys_init):
             logger.info('env.state_varname undefined. '
                         'Will use the default variable name: "eloc".')
             statevar = 'eloc'
-        env_formula = sys_to_spec(env, statevar, ignore_env_init)
+        env_formula = sys_to_spec(env, statevar, ignore_env_init,
+                                  encoding=encoding)
         specs = specs | env_formula
         logger.debug('env TS:\n' + str(env_formula.pretty()) + _hl)
     logger.info('Overall Spec:\n' + str(specs.pretty()) + _hl)
@@ -699,58 +1064,140 @@ def strategy2mealy(A, spec):
         k: v for k, v in sys_vars.iteritems()
         if isinstance(v, list)})
     mach.add_nodes_from(A)
+    log_edges = logger.isEnabledFor(logging.DEBUG)
+    nodes, keys, states = _state_matrix(A)
+    # edges into a node share its label,
+    # and nodes with the same values share the label dict
+    labels = _node_labels(A, nodes, states, str_vars)
     # transitions labeled with I/O
-    for u in A:
-        for v in A.successors_iter(u):
-            d = A.node[v]['state']
-            d = _int2str(d, str_vars)
-            mach.add_edge(u, v, **d)
-
-            logger.info('node: {v}, state: {d}'.format(v=v, d=d))
+    mach.add_edges_from(
+        (u, v, labels[v]) for u in A for v in A.successors_iter(u))
+    if log_edges:
+        for u, v, d in mach.edges_iter(data=True):
+            logger.debug('edge: {u} -> {v}, label: {d}'.format(
+                u=u, v=v, d=d))
     # special initial state, for first reaction
     initial_state = 'Sinit'
     mach.add_node(initial_state)
     mach.initial_nodes.add(initial_state)
+    # Mealy reaction to initial env input
+    for u in _initial_nodes(A, spec, nodes, keys, states):
+        mach.add_edge(initial_state, u, attr_dict=labels[u])
+        if log_edges:
+            logger.debug('found initial state: {u}'.format(u=u))
+    if mach.succ.get('Sinit'):
+        return mach
+    import pprint
+    raise Exception(
+        'The machine obtained from the strategy '
+        'does not have any initial states !\n'
+        'The strategy is:\n'
+        'vertices:' + pprint.pformat(A.nodes(data=True)) + 2 * '\n' +
+        'edges:\n' + str(A.edges()) + 2 * '\n' +
+        'and the machine:\n' + str(mach) + 2 * '\n' +
+        'and the specification is:\n' + str(spec.pretty()) + 2 * '\n')
+
+
+def _state_matrix(A):
+    """Return nodes, variables and integer array of values of `A`.
+
+    Row `i` of the array contains the values at `nodes[i]`,
+    in the order of variables.
+    If some value is not an integer, then return `None` as array.
+
+    @type A: `Strategy` or `networkx.DiGraph`
+    @rtype: `(list, list, numpy.ndarray)`
+    """
+    if isinstance(A, Strategy):
+        return A.ids.tolist(), A.variables, A.states
+    nodes = A.nodes()
+    u = nodes[0]
     # fix an ordering for keys
     # because tuple(dict.iteritems()) is not safe:
     # https://docs.python.org/2/library/stdtypes.html#dict.items
-    u = next(iter(A))
-    keys = A.node[u]['state'].keys()
-    # to store tuples of dict values for fast search
+    keys = list(A.node[u]['state'])
+    rows = [[A.node[v]['state'][k] for k in keys] for v in nodes]
+    if not all(isinstance(x, (int, long)) for r in rows for x in r):
+        return nodes, keys, None
+    return nodes, keys, np.array(rows, dtype=int).reshape(
+        len(nodes), len(keys))
+
+
+def _node_labels(A, nodes, states, str_vars):
+    """Return `dict` that maps each node to its edge label.
+
+    Nodes with the same values are mapped to the same `dict`,
+    so `_int2str` is called once per distinct valuation.
+    """
+    labels = dict()
+    interned = dict()
+    if states is None:
+        for u in nodes:
+            d = A.node[u]['state']
+            labels[u] = _int2str(d, str_vars)
+        return labels
+    for u, row in itertools.izip(nodes, states.tolist()):
+        vals = tuple(row)
+        d = interned.get(vals)
+        if d is None:
+            d = _int2str(A.node[u]['state'], str_vars)
+            interned[vals] = d
+        labels[u] = d
+    return labels
+
+
+def _initial_nodes(A, spec, nodes, keys, states):
+    """Return nodes of `A` that satisfy the initial condition of `spec`.
+
+    Of the nodes with the same values, only the first is returned,
+    to avoid spurious nondeterminism wrt the memory of the machine.
+    If `states` is an array, then the initial condition
+    is evaluated at all rows at once.
+    """
+    if states is None:
+        return _initial_nodes_loop(A, spec, nodes, keys)
+    dvars = dict(spec.env_vars)
+    dvars.update(spec.sys_vars)
+    values = dict()
+    for j, k in enumerate(keys):
+        col = states[:, j]
+        if dvars.get(k) == 'boolean':
+            col = col != 0
+        values[k] = col
+    isinit = spec.compile_init(no_str=True, vectorized=True)
+    r = eval(isinit, {'numpy': np}, values)
+    # `r` is a scalar if the formula contains no variables
+    mask = np.ones(len(nodes), dtype=bool) & r
+    rows = np.flatnonzero(mask)
+    if not len(rows):
+        return []
+    if not states.shape[1]:
+        return [nodes[rows[0]]]
+    # first node of each distinct valuation, in order
+    sat = np.ascontiguousarray(states[rows])
+    view = sat.view(np.dtype((np.void, sat.dtype.itemsize * sat.shape[1])))
+    _, first = np.unique(view, return_index=True)
+    return [nodes[i] for i in rows[np.sort(first)].tolist()]
+
+
+def _initial_nodes_loop(A, spec, nodes, keys):
+    """Evaluate the initial condition at each node of `A`."""
     isinit = spec.compile_init(no_str=True)
-    # Mealy reaction to initial env input
     init_valuations = set()
+    r = list()
     tmp = dict()
-    for u, d in A.nodes_iter(data=True):
-        var_values = d['state']
+    for u in nodes:
+        var_values = A.node[u]['state']
         vals = tuple(var_values[k] for k in keys)
-        logger.debug(
-            'machine vertex: {u}, has var values: {v}'.format(
-                u=u, v=var_values))
         # already an initial valuation ?
         if vals in init_valuations:
             continue
-        # add edge: Sinit -> u ?
         tmp.update(var_values)
         if not eval(isinit, tmp):
             continue
-        label = _int2str(var_values, str_vars)
-        mach.add_edge(initial_state, u, **label)
-        # remember variable values to avoid
-        # spurious non-determinism wrt the machine's memory
         init_valuations.add(vals)
-        logger.debug('found initial state: {u}'.format(u=u))
-    if mach.succ.get('Sinit'):
-        return mach
-    import pprint
-    raise Exception(
-        'The machine obtained from the strategy '
-        'does not have any initial states !\n'
-        'The strategy is:\n'
-        'vertices:' + pprint.pformat(A.nodes(data=True)) + 2 * '\n' +
-        'edges:\n' + str(A.edges()) + 2 * '\n' +
-        'and the machine:\n' + str(mach) + 2 * '\n' +
-        'and the specification is:\n' + str(spec.pretty()) + 2 * '\n')
+        r.append(u)
+    return r
 
 
 def _int2str(label, str_vars):
@@ -82,6 +82,51 @@ def create_machine_ports(spc_vars):
     return ports
 
 
+def _invalidates(name):
+    """Return method C{name} that also discards the reaction index."""
+    method = getattr(SystemGraph, name)
+
+    def f(self, *arg, **kw):
+        self._reactions = None
+        return method(self, *arg, **kw)
+    f.__name__ = name
+    f.__doc__ = method.__doc__
+    return f
+
+
+class _ReactionIndex(object):
+    """Transitions of a L{MealyMachine}, by state and input valuation.
+
+    Attributes:
+
+      - C{ports}: C{tuple} of input ports, order of values in keys
+      - C{inputs}, C{outputs}: C{set}s of ports when built
+      - C{table}: maps C{(state, values)} to C{list} of C{(next, label)}
+        where C{values} is a C{tuple} of input values
+        and C{label} the edge label
+      - C{moves}: maps each state to C{list} of C{(next, label)}
+    """
+
+    def __init__(self, mealy):
+        self.ports = tuple(mealy.inputs)
+        self.inputs = frozenset(mealy.inputs)
+        self.outputs = frozenset(mealy.outputs)
+        self.table = dict()
+        self.moves = dict()
+        for u, v, d in mealy.edges_iter(data=True):
+            key = (u, self.key(d))
+            self.table.setdefault(key, list()).append((v, d))
+            self.moves.setdefault(u, list()).append((v, d))
+
+    def key(self, d):
+        """Return C{tuple} of values of input ports in C{dict} C{d}."""
+        return tuple(d.get(k, _missing) for k in self.ports)
+
+
+# input port absent from label
+_missing = object()
+
+
 class Transducer(SystemGraph):
     """Sequential Transducer, i.e., a letter-to-letter function.
 
@@ -345,12 +390,41 @@ class MealyMachine(Transducer):
     ====
     valuation: assignment of values to each port
 
+    Reactions
+    =========
+    L{reaction} and the runs look up transitions in an index
+    from states and input valuations to edges,
+    built at the first reaction.
+    Adding or removing edges or nodes, and changing the
+    input or output ports, causes the index to be rebuilt.
+    Outputs are read from the edge labels at each reaction,
+    so they can be changed in place,
+    but inputs in edge labels should not be changed in place.
+
     Reference
     =========
     U{[M55]
     <http://tulip-control.sourceforge.net/doc/bibliography.html#m55>}
     """
 
+    def __init__(self):
+        self._reactions = None
+        super(MealyMachine, self).__init__()
+
+    add_edge = _invalidates('add_edge')
+    add_edges_from = _invalidates('add_edges_from')
+    remove_edge = _invalidates('remove_edge')
+    remove_edges_from = _invalidates('remove_edges_from')
+    remove_node = _invalidates('remove_node')
+    remove_nodes_from = _invalidates('remove_nodes_from')
+    clear = _invalidates('clear')
+
+    def __getstate__(self):
+        # copies and pickles rebuild the index when needed
+        d = dict(self.__dict__)
+        d['_reactions'] = None
+        return d
+
     def __str__(self):
         """Get informal string representation."""
         s = (
@@ -422,21 +496,34 @@ class MealyMachine(Transducer):
           where C{outputs}: C{{'port_name': port_value, ...}}
         """
         # match only inputs (explicit valuations, not symbolic)
-        enabled_trans = [
-            (i, j, d)
-            for i, j, d in self.edges_iter([from_state], data=True)
-            if project_dict(d, self.inputs) == inputs]
+        index = self._reaction_index()
+        if all(k in self.inputs for k in inputs):
+            key = (from_state, index.key(inputs))
+            enabled_trans = index.table.get(key, ())
+        else:
+            enabled_trans = ()
         # must be deterministic
         try:
-            ((_, next_state, attr_dict), ) = enabled_trans
+            ((next_state, attr_dict), ) = enabled_trans
         except ValueError:
             raise Exception(
                 'must be input-deterministic, '
                 'found enabled transitions: '
-                '{t}'.format(t=enabled_trans))
+                '{t}'.format(t=[(from_state, j, d)
+                                for j, d in enabled_trans]))
         outputs = project_dict(attr_dict, self.outputs)
         return (next_state, outputs)
 
+    def _reaction_index(self):
+        """Return L{_ReactionIndex}, building it if needed."""
+        index = self._reactions
+        if (index is None or
+                self.inputs.viewkeys() != index.inputs or
+                self.outputs.viewkeys() != index.outputs):
+            index = _ReactionIndex(self)
+            self._reactions = index
+        return index
+
     def run(self, from_state=None, input_sequences=None):
         """Guided or interactive run.
 
@@ -612,13 +699,13 @@ def random_run(mealy, from_state=None, N=10):
         state = next(iter(mealy.initial_nodes))
     else:
         state = from_state
+    moves = mealy._reaction_index().moves
     states_seq = []
     output_seqs = {k: list() for k in mealy.outputs}
     for i in xrange(N):
-        trans = mealy.out_edges(state)
+        trans = moves.get(state, ())
         # choose next transition
-        selected_trans = choice(trans)
-        _, new_state, attr_dict = selected_trans
+        new_state, attr_dict = choice(trans)
         # extend execution trace
         states_seq.append(new_state)
         # extend output traces
@@ -648,27 +735,30 @@ def interactive_run(mealy, from_state=None):
         state = next(iter(mealy.initial_nodes))
     else:
         state = from_state
-    while True:
+    while state is not None:
         print('\n Current state: ' + str(state))
-        if _interactive_run_step(mealy) is None:
-            break
+        state = _interactive_run_step(mealy, state)
 
 
 def _interactive_run_step(mealy, state):
+    """Return next state selected by user, or C{None} to stop."""
     if state is None:
         raise Exception('Current state is None')
     # note: the spaghettiness of previous version was caused
     #   by interactive simulation allowing both output-non-determinism
     #   and implementing spawning (which makes sense only for generators,
     #   *not* for transducers)
-    trans = mealy.out_edges(state)
+    trans = [
+        (state, v, d)
+        for v, d in mealy._reaction_index().moves.get(state, ())]
     if not trans:
         print('Stop: no outgoing transitions.')
         return None
     while True:
         try:
             selected_trans = _select_transition(mealy, trans)
-        except:
+            break
+        except (ValueError, IndexError):
             print('Selection not recognized. Please try again.')
     if selected_trans is None:
         return None
@@ -680,7 +770,7 @@ def _interactive_run_step(mealy, state):
         ', to state: ' + str(to_state) + '\n' +
         'given inputs: ' + str(inputs) + '\n' +
         'reacting with outputs: ' + str(outputs))
-    return True
+    return to_state
 
 
 def _select_transition(mealy, trans):
@@ -868,6 +958,199 @@ def strip_ports(mealy, names):
     return new
 
 
+def minimize(mealy):
+    """Return equivalent Mealy machine with fewest states.
+
+    Two states are merged if they have the same label
+    and, for each edge label (valuation of inputs and outputs),
+    both have an edge with that label to merged states, or neither.
+    The result is the quotient by the coarsest such bisimulation.
+    It reacts as C{mealy} to all input sequences,
+    producing the same outputs.
+
+    Each state of the result is named after a state in its class,
+    preferring initial states, so C{'Sinit'} of a synthesized
+    controller remains its initial state.
+    Unreachable states are not removed.
+
+    Partition refinement as in Hopcroft's algorithm,
+    in time M{O(m log n)} for M{m} edges and M{n} states.
+    Edges are not completed with a sink state,
+    so all initial classes are splitters.
+
+    Reference
+    =========
+    Hopcroft J.E.
+      "An n log n algorithm for minimizing states in a finite automaton"
+      Theory of Machines and Computations, pp.189--196, 1971
+
+    Beal M.-P., Crochemore M.
+      "Minimizing incomplete automata"
+      Finite-State Methods and Natural Language Processing, 2008
+
+    @type mealy: L{MealyMachine}
+
+    @raise ValueError: if some state has two edges with
+        the same label to different states.
+        A machine that is deterministic in its inputs,
+        as required by L{MealyMachine.reaction}, has none.
+
+    @rtype: L{MealyMachine}
+    """
+    nodes = mealy.nodes()
+    index = dict((u, i) for i, u in enumerate(nodes))
+    n = len(nodes)
+    # pred[j]: (label, i) for each edge i -> j
+    pred = [list() for _ in xrange(n)]
+    labels = dict()
+    succ = [dict() for _ in xrange(n)]
+    for u, v, d in mealy.edges_iter(data=True):
+        a = labels.setdefault(_freeze(d), len(labels))
+        i = index[u]
+        j = index[v]
+        if a in succ[i]:
+            if succ[i][a] != j:
+                raise ValueError(
+                    'state {u} has edges with the same label '
+                    'to {v} and {w}: {d}'.format(
+                        u=u, v=nodes[succ[i][a]], w=v, d=d))
+            continue
+        succ[i][a] = j
+        pred[j].append((a, i))
+    # initial partition by state label
+    classes = dict()
+    for i, u in enumerate(nodes):
+        classes.setdefault(_freeze(mealy.node[u]), list()).append(i)
+    p = _Partition(n, classes.values())
+    # no sink state, so each initial class is a splitter
+    waiting = list(xrange(len(p.first)))
+    while waiting:
+        b = waiting.pop()
+        splitter = p.elements(b)
+        sources = dict()
+        for j in splitter:
+            for a, i in pred[j]:
+                sources.setdefault(a, list()).append(i)
+        for block in sources.itervalues():
+            for i in block:
+                p.mark(i)
+            # the new block is the smaller part, so it suffices
+            # whether or not the old block is waiting
+            waiting.extend(new for _, new in p.split())
+    # name each class after a state in it
+    initial = mealy.initial_nodes
+    rep = dict()
+    for i, u in enumerate(nodes):
+        b = p.block[i]
+        if b not in rep or (u in initial and nodes[rep[b]] not in initial):
+            rep[b] = i
+    rep = [nodes[rep[p.block[i]]] for i in xrange(n)]
+    new = MealyMachine()
+    new.state_vars.update(mealy.state_vars)
+    new.inputs.update(mealy.inputs)
+    new.outputs.update(mealy.outputs)
+    new.initial_nodes.update(rep[index[u]] for u in initial)
+    for i, u in enumerate(nodes):
+        if rep[i] != u:
+            continue
+        new.add_node(u, attr_dict=mealy.node[u])
+    for i, u in enumerate(nodes):
+        if rep[i] != u:
+            continue
+        seen = set()
+        for _, v, d in mealy.edges_iter(u, data=True):
+            a = _freeze(d)
+            if a in seen:
+                continue
+            seen.add(a)
+            new.add_edge(u, rep[index[v]], attr_dict=d)
+    return new
+
+
+class _Partition(object):
+    """Refinable partition of C{0..n-1}.
+
+    The elements of block C{b} are C{elems[first[b]:end[b]]},
+    those marked are C{elems[first[b]:mid[b]]}.
+    """
+
+    def __init__(self, n, blocks):
+        self.elems = list()
+        self.block = [None] * n
+        self.first = list()
+        self.end = list()
+        self.mid = list()
+        for b, x in enumerate(blocks):
+            self.first.append(len(self.elems))
+            self.mid.append(len(self.elems))
+            self.elems.extend(x)
+            self.end.append(len(self.elems))
+            for i in x:
+                self.block[i] = b
+        self.loc = [None] * n
+        for k, i in enumerate(self.elems):
+            self.loc[i] = k
+        self.touched = list()
+
+    def elements(self, b):
+        return self.elems[self.first[b]:self.end[b]]
+
+    def mark(self, i):
+        b = self.block[i]
+        k = self.loc[i]
+        m = self.mid[b]
+        if k < m:
+            return
+        if m == self.first[b]:
+            self.touched.append(b)
+        # swap to marked part
+        j = self.elems[m]
+        self.elems[k] = j
+        self.loc[j] = k
+        self.elems[m] = i
+        self.loc[i] = m
+        self.mid[b] = m + 1
+
+    def split(self):
+        """Split touched blocks into marked and unmarked parts.
+
+        @return: C{(old, new)} for each block split,
+            the smaller part is the new block
+        """
+        r = list()
+        for b in self.touched:
+            first, mid, end = self.first[b], self.mid[b], self.end[b]
+            self.mid[b] = first
+            if mid == end:
+                continue
+            c = len(self.first)
+            if mid - first <= end - mid:
+                self.first.append(first)
+                self.end.append(mid)
+                self.first[b] = mid
+            else:
+                self.first.append(mid)
+                self.end.append(end)
+                self.end[b] = mid
+            self.mid[b] = self.first[b]
+            self.mid.append(self.first[c])
+            for i in self.elems[self.first[c]:self.end[c]]:
+                self.block[i] = c
+            r.append((b, c))
+        self.touched = list()
+        return r
+
+
+def _freeze(d):
+    """Return hashable key of C{dict} C{d}."""
+    items = tuple(sorted(d.iteritems()))
+    try:
+        hash(items)
+    except TypeError:
+        return repr(items)
+    return items
+
+
 def _join(d, keys, sep=': ', itemsep='\n'):
     return itemsep.join(
         '{k}{sep}{v}'.format(k=k, sep=sep, v=v)